@@ -0,0 +1,181 @@
+"""
+Throughput and latency of the item list endpoint under concurrent clients,
+served by gunicorn sync workers (WSGI) and by uvicorn workers (ASGI).
+
+Run with:
+
+    python -m pytest benchmarks/bench_asgi_concurrency.py -s
+
+Both servers run the project against a throwaway SQLite database with the
+same number of workers. The WSGI run hits the DRF view, the ASGI run hits
+its async counterpart under /api/async/.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("gunicorn")
+pytest.importorskip("uvicorn")
+
+ROOT = Path(__file__).resolve().parent.parent
+CONCURRENCY = [50, 100, 250, 500]
+REQUESTS_PER_CLIENT = 4
+WORKERS = 4
+ITEMS = 50
+
+SEED = f"""
+from rest_framework.authtoken.models import Token
+from shopping_list.models import ShoppingItem, ShoppingList, User
+
+shopping_list = ShoppingList.objects.create(name="Groceries")
+ShoppingItem.objects.bulk_create(
+    ShoppingItem(shopping_list=shopping_list, name=f"item {{index}}", purchased=False)
+    for index in range({ITEMS})
+)
+for index in range({max(CONCURRENCY)}):
+    user = User.objects.create_user(f"user{{index}}")
+    shopping_list.members.add(user)
+    print(Token.objects.create(user=user).key)
+print(shopping_list.pk)
+"""
+
+SERVERS = {
+    "wsgi": ["core.wsgi:application"],
+    "asgi": ["core.asgi:application", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+PATHS = {
+    "wsgi": "/api/shopping-lists/{pk}/shopping-items/",
+    "asgi": "/api/async/shopping-lists/{pk}/shopping-items/",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+@pytest.fixture(scope="module")
+def environment(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("asgi")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'db.sqlite3'}",
+        "CACHE_LOCATION": str(tmp_path / "cache"),
+        "SECRET_KEY": "benchmark",
+        "DJANGO_ALLOWED_HOSTS": "127.0.0.1",
+        "DJANGO_SETTINGS_MODULE": "core.settings",
+    }
+
+    def manage(*args):
+        return subprocess.run(
+            [sys.executable, "manage.py", *args],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    manage("migrate", "--no-input")
+    *tokens, shopping_list_id = manage("shell", "-c", SEED).split()
+
+    return env, tokens, shopping_list_id
+
+
+async def fetch(port, path, token):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Authorization: Token {token}\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    return int(response.split(b" ", 2)[1])
+
+
+async def run_clients(port, path, tokens):
+    latencies = []
+    errors = 0
+
+    async def client(token):
+        nonlocal errors
+        for _ in range(REQUESTS_PER_CLIENT):
+            started = time.perf_counter()
+            try:
+                status_code = await fetch(port, path, token)
+            except OSError:
+                status_code = None
+            latencies.append(time.perf_counter() - started)
+            errors += status_code != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(token) for token in tokens))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors,
+    }
+
+
+@pytest.mark.parametrize("server", SERVERS)
+def test_concurrent_clients(environment, server):
+    env, tokens, shopping_list_id = environment
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            *SERVERS[server],
+            "--workers",
+            str(WORKERS),
+            "--bind",
+            f"127.0.0.1:{port}",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        wait_for_port(port)
+        path = PATHS[server].format(pk=shopping_list_id)
+        for clients in CONCURRENCY:
+            result = asyncio.run(run_clients(port, path, tokens[:clients]))
+            print(
+                f"\n{server} with {clients} clients: "
+                f"{result['requests_per_second']:.0f} requests/s, "
+                f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                f"{result['errors']} errors"
+            )
+    finally:
+        process.terminate()
+        process.wait()
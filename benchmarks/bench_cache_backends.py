@@ -0,0 +1,53 @@
+"""
+Throughput of SharedMemoryCache against Django's LocMemCache and FileBasedCache.
+
+Run with:
+
+    python -m pytest benchmarks/bench_cache_backends.py -s
+"""
+
+import time
+
+import pytest
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from shopping_list.cache_backends import SharedMemoryCache
+
+ITERATIONS = 1000
+VALUE = {"results": [{"id": index, "name": f"Item {index}"} for index in range(10)]}
+
+
+def create_backends(tmp_path):
+    return {
+        "locmem": LocMemCache("bench", {"OPTIONS": {"MAX_ENTRIES": ITERATIONS * 2}}),
+        "filebased": FileBasedCache(
+            str(tmp_path / "filebased"), {"OPTIONS": {"MAX_ENTRIES": ITERATIONS * 2}}
+        ),
+        "shared_memory": SharedMemoryCache(
+            str(tmp_path / "shared_memory"), {"OPTIONS": {"SLOTS": ITERATIONS * 2}}
+        ),
+    }
+
+
+def ops_per_second(operation):
+    started = time.perf_counter()
+    for index in range(ITERATIONS):
+        operation(index)
+
+    return ITERATIONS / (time.perf_counter() - started)
+
+
+@pytest.mark.parametrize("backend", ["locmem", "filebased", "shared_memory"])
+def test_cache_backend_throughput(tmp_path, backend):
+    cache = create_backends(tmp_path)[backend]
+    cache.add("counter", 0)
+
+    set_rate = ops_per_second(lambda index: cache.set(f"key-{index}", VALUE))
+    get_rate = ops_per_second(lambda index: cache.get(f"key-{index}"))
+    incr_rate = ops_per_second(lambda index: cache.incr("counter"))
+
+    print(
+        f"\n{backend}: set {set_rate:,.0f}/s, get {get_rate:,.0f}/s, "
+        f"incr {incr_rate:,.0f}/s"
+    )
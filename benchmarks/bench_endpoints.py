@@ -0,0 +1,481 @@
+"""
+Latency, queries and allocations of every endpoint in shopping_list/urls.py,
+against seeded datasets of different shapes.
+
+Run with:
+
+    python -m pytest benchmarks/bench_endpoints.py -s
+
+Environment variables:
+
+    BENCHMARK_SCALE       multiplies the size of every dataset (default 1)
+    BENCHMARK_ITERATIONS  timed requests per endpoint (default 50)
+    BENCHMARK_TIME_LIMIT  seconds after which an endpoint stops being timed,
+                          once it has 5 samples (default 10)
+    BENCHMARK_REPORT      path of the JSON report (default benchmark-report.json)
+
+The report holds one entry per dataset and endpoint, so the reports of two
+commits can be compared entry by entry. Writes commit, so the work they defer
+until then is measured too, and the database is restored from a snapshot (and
+the caches cleared) after every write, so every request sees the same dataset.
+Restoring uses the SQLite backup API, so writes are only benchmarked on SQLite.
+"""
+
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+from unittest import mock
+
+import django
+import pytest
+from django.core.cache import caches
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import SimpleRateThrottle
+
+from shopping_list import urls
+from shopping_list.api.authentication import token_cache
+from shopping_list.models import ShoppingItem, ShoppingList, User
+from shopping_list.seeding import PRODUCTS, DatasetGenerator, SeedOptions
+
+ROOT = Path(__file__).resolve().parent.parent
+SCALE = float(os.environ.get("BENCHMARK_SCALE", 1))
+ITERATIONS = int(os.environ.get("BENCHMARK_ITERATIONS", 50))
+TIME_LIMIT = float(os.environ.get("BENCHMARK_TIME_LIMIT", 10))
+MIN_SAMPLES = 5
+REPORT = Path(os.environ.get("BENCHMARK_REPORT", ROOT / "benchmark-report.json"))
+WARMUP = 3
+BATCH_SIZE = 5000
+PASSWORD = "benchmark-password"
+
+# Every shape is seeded for its own user, on top of the shapes seeded before it.
+SHAPES = {
+    # A user with thousands of small lists.
+    "many_lists": {"lists": 2000, "items_per_list": 5, "members_per_list": 2},
+    # One list with tens of thousands of items.
+    "huge_list": {"lists": 1, "items_per_list": 20000, "members_per_list": 1},
+    # One list shared by a thousand users.
+    "many_members": {"lists": 1, "items_per_list": 50, "members_per_list": 1000},
+}
+
+# URL names that are not benchmarked, with the reason why.
+SKIPPED = {
+    "async-change-feed": "the event stream never ends",
+}
+
+
+@dataclass
+class Dataset:
+    shape: str
+    user: User
+    token: str
+    shopping_list: ShoppingList
+    shopping_item: ShoppingItem
+    members: list
+    outsiders: list
+    counts: dict
+    snapshot: Optional[sqlite3.Connection] = None
+
+
+@dataclass
+class Endpoint:
+    url_name: str
+    method: str = "get"
+    args: Callable = lambda dataset: []
+    data: Optional[Callable] = None
+    query: dict = field(default_factory=dict)
+    content_type: str = "application/json"
+
+
+def list_args(dataset):
+    return [dataset.shopping_list.pk]
+
+
+def item_args(dataset):
+    return [dataset.shopping_list.pk, dataset.shopping_item.pk]
+
+
+def import_records(dataset):
+    return [
+        {"type": "list", "id": "imported", "name": "Imported list"},
+        *(
+            {
+                "type": "item",
+                "shopping_list": "imported",
+                "name": f"{PRODUCTS[index % len(PRODUCTS)]} {index}",
+            }
+            for index in range(100)
+        ),
+    ]
+
+
+ENDPOINTS = [
+    Endpoint(
+        "api_token_auth",
+        "post",
+        data=lambda dataset: {"username": dataset.user.username, "password": PASSWORD},
+    ),
+    Endpoint("rest_framework:login"),
+    Endpoint("rest_framework:logout", "post"),
+    Endpoint("schema"),
+    Endpoint("swagger-ui"),
+    Endpoint("shopping-item-changes"),
+    Endpoint("export-shopping-data"),
+    Endpoint(
+        "export-shopping-data", query={"file_format": "csv", "compression": "gzip"}
+    ),
+    Endpoint(
+        "import-shopping-data",
+        "post",
+        data=import_records,
+        content_type="application/x-ndjson",
+    ),
+    Endpoint("search-shopping-items", query={"search": "apples"}),
+    Endpoint("all-shopping-lists"),
+    Endpoint("all-shopping-lists", "post", data=lambda dataset: {"name": "New list"}),
+    Endpoint("shopping-list-detail", args=list_args),
+    Endpoint(
+        "shopping-list-detail",
+        "put",
+        args=list_args,
+        data=lambda dataset: {"name": "Renamed list"},
+    ),
+    Endpoint("shopping-list-detail", "delete", args=list_args),
+    Endpoint(
+        "shopping-list-add-members",
+        "put",
+        args=list_args,
+        data=lambda dataset: {"members": [user.pk for user in dataset.outsiders]},
+    ),
+    Endpoint(
+        "shopping-list-remove-members",
+        "put",
+        args=list_args,
+        data=lambda dataset: {"members": [user.pk for user in dataset.members[:10]]},
+    ),
+    Endpoint("list-add-shopping-item", args=list_args),
+    Endpoint(
+        "list-add-shopping-item",
+        "post",
+        args=list_args,
+        data=lambda dataset: {"name": "New item", "purchased": False},
+    ),
+    Endpoint("shopping-item-detail", args=item_args),
+    Endpoint(
+        "shopping-item-detail",
+        "put",
+        args=item_args,
+        data=lambda dataset: {"name": "Renamed item", "purchased": True},
+    ),
+    Endpoint("shopping-item-detail", "delete", args=item_args),
+    Endpoint("async-search-shopping-items", query={"search": "apples"}),
+    Endpoint("async-all-shopping-lists"),
+    Endpoint(
+        "async-all-shopping-lists", "post", data=lambda dataset: {"name": "New list"}
+    ),
+    Endpoint("async-shopping-list-detail", args=list_args),
+    Endpoint(
+        "async-shopping-list-detail",
+        "put",
+        args=list_args,
+        data=lambda dataset: {"name": "Renamed list"},
+    ),
+    Endpoint("async-shopping-list-detail", "delete", args=list_args),
+    Endpoint("async-list-add-shopping-item", args=list_args),
+    Endpoint(
+        "async-list-add-shopping-item",
+        "post",
+        args=list_args,
+        data=lambda dataset: {"name": "New item", "purchased": False},
+    ),
+    Endpoint("async-shopping-item-detail", args=item_args),
+    Endpoint(
+        "async-shopping-item-detail",
+        "put",
+        args=item_args,
+        data=lambda dataset: {"name": "Renamed item", "purchased": True},
+    ),
+    Endpoint("async-shopping-item-detail", "delete", args=item_args),
+]
+
+datasets = {}
+results = []
+
+
+def url_names(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from url_names(pattern.url_patterns, pattern.namespace or namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f"{namespace}:{pattern.name}" if namespace else pattern.name
+
+
+def scaled(count):
+    return max(int(count * SCALE), 1)
+
+
+def seed(shape, lists, items_per_list, members_per_list):
+    lists, items_per_list = scaled(lists), scaled(items_per_list)
+    # Always share the list with someone, so members can be removed.
+    members_per_list = max(scaled(members_per_list), 2)
+    generator = DatasetGenerator(
+        SeedOptions(
+            seed=list(SHAPES).index(shape),
+            lists=lists,
+            items=lists * items_per_list,
+            list_size_skew=None,
+            batch_size=BATCH_SIZE,
+        )
+    )
+
+    user = User.objects.create_user(f"{shape}-owner", password=PASSWORD)
+    token = Token.objects.create(user=user)
+    generator.insert(
+        User,
+        (User(username=f"{shape}-user-{index}") for index in range(members_per_list)),
+    )
+    generator.insert(
+        User, (User(username=f"{shape}-outsider-{index}") for index in range(10))
+    )
+    users = list(
+        User.objects.filter(username__startswith=f"{shape}-user-").order_by("pk")
+    )
+    outsiders = list(User.objects.filter(username__startswith=f"{shape}-outsider-"))
+    list_ids = [generator.uuid() for _ in range(lists)]
+    generator.insert(
+        ShoppingList,
+        (
+            ShoppingList(id=list_id, name=f"{shape} list {index}")
+            for index, list_id in enumerate(list_ids)
+        ),
+    )
+
+    members = [user] + users[: members_per_list - 1]
+    Membership = ShoppingList.members.through
+    generator.insert(
+        Membership,
+        (
+            Membership(user=member, shoppinglist_id=list_id)
+            for list_id in list_ids
+            for member in members
+        ),
+    )
+    generator.insert_values(
+        ShoppingItem,
+        ["id", "shopping_list", "name", "purchased", "updated_at"],
+        generator.shopping_items(list_ids),
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    shopping_list = ShoppingList.objects.get(pk=list_ids[0])
+    return Dataset(
+        shape=shape,
+        user=user,
+        token=token.key,
+        shopping_list=shopping_list,
+        shopping_item=ShoppingItem.objects.filter(shopping_list=shopping_list)
+        .order_by("purchased", "id")
+        .first(),
+        members=members[1:],
+        outsiders=outsiders,
+        counts={
+            "lists": lists,
+            "items": lists * items_per_list,
+            "memberships": lists * len(members),
+        },
+    )
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+    token_cache.clear()
+
+
+@pytest.fixture(scope="module", params=SHAPES)
+def dataset(request, django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        dataset = seed(request.param, **SHAPES[request.param])
+        if connection.vendor == "sqlite":
+            dataset.snapshot = sqlite3.connect(":memory:")
+            connection.connection.backup(dataset.snapshot)
+    datasets[dataset.shape] = dataset.counts
+    clear_caches()
+
+    yield dataset
+
+    if dataset.snapshot is not None:
+        dataset.snapshot.close()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def report():
+    yield
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    REPORT.write_text(
+        json.dumps(
+            {
+                "commit": commit,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "scale": SCALE,
+                "iterations": ITERATIONS,
+                "datasets": datasets,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    print(f"\nbenchmark report written to {REPORT}")
+
+
+@pytest.fixture(autouse=True)
+def unthrottled():
+    # Every endpoint is called more often than the user throttles allow.
+    rates = {scope: "1000000/second" for scope in SimpleRateThrottle.THROTTLE_RATES}
+    with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, rates):
+        yield
+
+
+def encode(endpoint, data):
+    if endpoint.content_type == "application/x-ndjson":
+        return "".join(json.dumps(record) + "\n" for record in data)
+
+    return json.dumps(data)
+
+
+def send(client, endpoint, url, data):
+    response = getattr(client, endpoint.method)(
+        url, data, content_type=endpoint.content_type
+    )
+    if response.streaming:
+        # Streamed bodies are only produced as they are read.
+        for _ in response.streaming_content:
+            pass
+
+    return response
+
+
+def restore(dataset):
+    # Undo a committed write, and whatever the caches learned from it.
+    dataset.snapshot.backup(connection.connection)
+    clear_caches()
+
+
+def test_every_url_is_benchmarked():
+    benchmarked = {endpoint.url_name for endpoint in ENDPOINTS}
+
+    assert set(url_names(urls.urlpatterns)) == benchmarked | set(SKIPPED)
+
+
+READS = [endpoint for endpoint in ENDPOINTS if endpoint.method == "get"]
+WRITES = [endpoint for endpoint in ENDPOINTS if endpoint.method != "get"]
+
+
+def endpoint_id(endpoint):
+    return f"{endpoint.method}-{endpoint.url_name}"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("endpoint", READS, ids=map(endpoint_id, READS))
+def test_read_endpoint(dataset, endpoint):
+    benchmark(dataset, endpoint, reset=lambda: None)
+
+
+@pytest.mark.parametrize("endpoint", WRITES, ids=map(endpoint_id, WRITES))
+def test_write_endpoint(dataset, endpoint, django_db_blocker):
+    if dataset.snapshot is None:
+        pytest.skip("restoring the dataset after writes needs SQLite")
+
+    with django_db_blocker.unblock():
+        try:
+            benchmark(dataset, endpoint, reset=lambda: restore(dataset))
+        finally:
+            restore(dataset)
+
+
+def benchmark(dataset, endpoint, reset):
+    client = Client(HTTP_AUTHORIZATION=f"Token {dataset.token}")
+    url = reverse(endpoint.url_name, args=endpoint.args(dataset))
+    if endpoint.method == "get":
+        data = endpoint.query
+    else:
+        data = encode(endpoint, endpoint.data(dataset)) if endpoint.data else None
+
+    for _ in range(WARMUP):
+        response = send(client, endpoint, url, data)
+        reset()
+        assert response.status_code < 400, response.content
+
+    latencies = []
+    deadline = time.perf_counter() + TIME_LIMIT
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        send(client, endpoint, url, data)
+        latencies.append((time.perf_counter() - started) * 1000)
+        reset()
+        if len(latencies) >= MIN_SAMPLES and time.perf_counter() > deadline:
+            break
+
+    # The test client resets the query log when a request starts, so start from
+    # an empty log for the capture to line up with it.
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        send(client, endpoint, url, data)
+    reset()
+    query_count = len(queries)
+
+    tracemalloc.start()
+    try:
+        send(client, endpoint, url, data)
+        allocated, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    reset()
+
+    latencies.sort()
+    result = {
+        "dataset": dataset.shape,
+        "endpoint": endpoint.url_name,
+        "method": endpoint.method.upper(),
+        "status": response.status_code,
+        "samples": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+        "queries": query_count,
+        "allocated_kib": round(allocated / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+    results.append(result)
+
+    print(
+        f"\n{dataset.shape} {result['method']} {endpoint.url_name}: "
+        f"{result['samples']} samples, p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+        f"{result['queries']} queries, peak {result['peak_kib']:.0f} KiB"
+    )
@@ -0,0 +1,100 @@
+"""
+Rows per second imported through the NDJSON import endpoint, against creating
+the same lists and items with one POST per row.
+
+Run with:
+
+    python -m pytest benchmarks/bench_import.py -s
+
+Every list gets ITEMS_PER_LIST items, so the row counts include lists,
+memberships and items. The per-row baseline is only run on the smaller sizes.
+"""
+
+import json
+import time
+from unittest import mock
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from shopping_list.models import ShoppingItem, User
+
+ITEMS_PER_LIST = 50
+ROWS = [1000, 10000, 100000]
+BASELINE_MAX_ROWS = 1000
+
+
+def records(rows):
+    lists = max(rows // (ITEMS_PER_LIST + 2), 1)
+    for list_index in range(lists):
+        yield {"type": "list", "id": f"list-{list_index}", "name": f"List {list_index}"}
+        for index in range(ITEMS_PER_LIST):
+            yield {
+                "type": "item",
+                "shopping_list": f"list-{list_index}",
+                "name": f"Item {index}",
+                "purchased": index % 3 == 0,
+            }
+
+
+def import_rows(client, rows):
+    body = "".join(json.dumps(record) + "\n" for record in records(rows))
+    response = client.post(
+        reverse("import-shopping-data"), body, content_type="application/x-ndjson"
+    )
+    assert response.status_code == 200, response.data
+    assert response.data["error_count"] == 0
+
+    return sum(response.data["created"].values())
+
+
+def post_rows(client, rows):
+    created = 0
+    shopping_list = None
+    for record in records(rows):
+        if record["type"] == "list":
+            response = client.post(
+                reverse("all-shopping-lists"), {"name": record["name"]}, format="json"
+            )
+            shopping_list = response.data["id"]
+            # The list and its creator's membership.
+            created += 2
+        else:
+            client.post(
+                reverse("list-add-shopping-item", args=[shopping_list]),
+                {"name": record["name"], "purchased": record["purchased"]},
+                format="json",
+            )
+            created += 1
+
+    return created
+
+
+@pytest.fixture(autouse=True)
+def unthrottled():
+    rates = {scope: "1000000/second" for scope in SimpleRateThrottle.THROTTLE_RATES}
+    with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, rates):
+        yield
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("rows", ROWS)
+def test_rows_per_second(rows):
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(f"importer-{rows}"))
+
+    started = time.perf_counter()
+    imported = import_rows(client, rows)
+    import_rate = imported / (time.perf_counter() - started)
+    message = f"\n{imported} rows: import {import_rate:.0f} rows/s"
+
+    if rows <= BASELINE_MAX_ROWS:
+        ShoppingItem.objects.all().delete()
+        started = time.perf_counter()
+        posted = post_rows(client, rows)
+        post_rate = posted / (time.perf_counter() - started)
+        message += f", one POST per row {post_rate:.0f} rows/s ({import_rate / post_rate:.1f}x)"
+
+    print(message)
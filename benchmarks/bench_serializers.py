@@ -0,0 +1,64 @@
+"""
+CPU time per row of the item list responses, serialized by ShoppingItemSerializer
+from model instances and by its ValuesPlan from `.values()` rows.
+
+Run with:
+
+    python -m pytest benchmarks/bench_serializers.py -s
+
+Both paths include fetching the rows and rendering them to JSON.
+"""
+
+import time
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from shopping_list.api.serializers import ShoppingItemSerializer, ValuesPlan
+from shopping_list.models import ShoppingItem, ShoppingList
+
+ROWS = [50, 500, 5000]
+REPEAT = 5
+
+
+def serializer_path(queryset):
+    data = ShoppingItemSerializer(queryset, many=True).data
+    return JSONRenderer().render(data)
+
+
+def values_plan_path(queryset):
+    plan = ValuesPlan.for_serializer(ShoppingItemSerializer)
+    return JSONRenderer().render(plan.serialize(plan.values(queryset)))
+
+
+def cpu_per_row(path, queryset, rows):
+    path(queryset.all())
+
+    best = float("inf")
+    for _ in range(REPEAT):
+        started = time.process_time()
+        path(queryset.all())
+        best = min(best, time.process_time() - started)
+
+    return best / rows * 1_000_000
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("rows", ROWS)
+def test_cpu_per_row(rows):
+    shopping_list = ShoppingList.objects.create(name="Groceries")
+    ShoppingItem.objects.bulk_create(
+        ShoppingItem(shopping_list=shopping_list, name=f"Item {index}", purchased=False)
+        for index in range(rows)
+    )
+    queryset = ShoppingItem.objects.filter(shopping_list=shopping_list)
+
+    assert serializer_path(queryset) == values_plan_path(queryset)
+
+    before = cpu_per_row(serializer_path, queryset, rows)
+    after = cpu_per_row(values_plan_path, queryset, rows)
+
+    print(
+        f"\n{rows} rows: serializer {before:.1f} us/row, "
+        f"values plan {after:.1f} us/row ({before / after:.1f}x)"
+    )
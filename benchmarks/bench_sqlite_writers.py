@@ -0,0 +1,186 @@
+"""
+Throughput, latency and errors of concurrent writers against SQLite, served by
+gunicorn workers with SQLite's defaults and with the tuned connection settings
+of core/settings.py.
+
+Run with:
+
+    python -m pytest benchmarks/bench_sqlite_writers.py -s
+
+Every client adds items to its own shopping list and reads them back, so the
+workers' writes only contend on the database itself. Errors are requests that
+did not succeed, such as a 500 for "database is locked".
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("gunicorn")
+
+ROOT = Path(__file__).resolve().parent.parent
+CONCURRENCY = [8, 32, 128]
+REQUESTS_PER_CLIENT = 10
+WORKERS = 8
+
+SEED = f"""
+from rest_framework.authtoken.models import Token
+from shopping_list.models import ShoppingList, User
+
+for index in range({max(CONCURRENCY)}):
+    user = User.objects.create_user(f"writer{{index}}")
+    shopping_list = ShoppingList.objects.create(name=f"List {{index}}")
+    shopping_list.members.add(user)
+    print(Token.objects.create(user=user).key, shopping_list.pk)
+"""
+
+SETTINGS = {
+    # What SQLite and Python's sqlite3 module do by default, with a new
+    # connection for every request.
+    "defaults": {
+        "CONN_MAX_AGE": "0",
+        "SQLITE_JOURNAL_MODE": "delete",
+        "SQLITE_SYNCHRONOUS": "full",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "SQLITE_BUSY_TIMEOUT": "5000",
+    },
+    "tuned": {},
+}
+
+
+@pytest.fixture(params=SETTINGS)
+def environment(request, tmp_path):
+    env = {
+        **os.environ,
+        **SETTINGS[request.param],
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'db.sqlite3'}",
+        "CACHE_LOCATION": str(tmp_path / "cache"),
+        "SECRET_KEY": "benchmark",
+        "DJANGO_ALLOWED_HOSTS": "127.0.0.1",
+        "DJANGO_SETTINGS_MODULE": "core.settings",
+    }
+
+    def manage(*args):
+        return subprocess.run(
+            [sys.executable, "manage.py", *args],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    manage("migrate", "--no-input")
+    lines = manage("shell", "-c", SEED).splitlines()
+
+    return request.param, env, [line.split() for line in lines]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def send(port, method, path, token, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Authorization: Token {token}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    return int(response.split(b" ", 2)[1])
+
+
+async def run_clients(port, clients, run):
+    latencies = []
+    errors = 0
+
+    async def client(token, shopping_list_id):
+        nonlocal errors
+        path = f"/api/shopping-lists/{shopping_list_id}/shopping-items/"
+        for index in range(REQUESTS_PER_CLIENT):
+            name = f"Item {run}-{index}"
+            body = json.dumps({"name": name, "purchased": False}).encode()
+            for method, expected in [("POST", 201), ("GET", 200)]:
+                started = time.perf_counter()
+                try:
+                    status_code = await send(port, method, path, token, body)
+                except OSError:
+                    status_code = None
+                latencies.append(time.perf_counter() - started)
+                errors += status_code != expected
+                body = b""
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(*client_args) for client_args in clients))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors,
+    }
+
+
+def test_concurrent_writers(environment):
+    name, env, clients = environment
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "core.wsgi:application",
+            "--workers",
+            str(WORKERS),
+            "--bind",
+            f"127.0.0.1:{port}",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        wait_for_port(port)
+        # Let every worker boot and open its connection before measuring.
+        asyncio.run(run_clients(port, clients[: WORKERS * 2], "warmup"))
+        for concurrency in CONCURRENCY:
+            result = asyncio.run(run_clients(port, clients[:concurrency], concurrency))
+            print(
+                f"\n{name} with {concurrency} clients: "
+                f"{result['requests_per_second']:.0f} requests/s, "
+                f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                f"{result['errors']} errors"
+            )
+    finally:
+        process.terminate()
+        process.wait()
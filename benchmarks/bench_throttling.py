@@ -0,0 +1,57 @@
+"""
+Per-request overhead of the user throttles.
+
+Run with:
+
+    python -m pytest benchmarks/bench_throttling.py -s
+
+Compares DRF's history-list UserRateThrottle with SlidingWindowRateThrottle,
+for a fresh user and for one whose daily history is almost full.
+"""
+
+import time
+from unittest import mock
+
+import pytest
+from django.core.cache import caches
+from rest_framework.throttling import UserRateThrottle
+
+from shopping_list.api.throttling import SlidingWindowRateThrottle
+
+ITERATIONS = 2000
+
+
+class HistoryDailyThrottle(UserRateThrottle):
+    scope = "bench_history"
+    rate = "1000000/day"
+
+
+class SlidingWindowDailyThrottle(SlidingWindowRateThrottle):
+    scope = "bench_sliding"
+    rate = "1000000/day"
+
+
+def measure(throttle_class, request, prefill):
+    caches["default"].clear()
+    for _ in range(prefill):
+        throttle_class().allow_request(request, None)
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        throttle_class().allow_request(request, None)
+
+    return (time.perf_counter() - started) / ITERATIONS * 1_000_000
+
+
+@pytest.mark.parametrize("prefill", [0, 999])
+def test_throttle_overhead(prefill):
+    request = mock.Mock(user=mock.Mock(pk=1, is_authenticated=True))
+
+    history = measure(HistoryDailyThrottle, request, prefill)
+    sliding = measure(SlidingWindowDailyThrottle, request, prefill)
+
+    print(
+        f"\nthrottle overhead with {prefill} prior requests: "
+        f"history list {history:.1f} us/request, "
+        f"sliding window {sliding:.1f} us/request"
+    )
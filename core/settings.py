@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import hashlib
 import os
+import tempfile
 from pathlib import Path
 
 import dj_database_url
@@ -60,6 +62,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "shopping_list.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -103,7 +106,69 @@ DATABASES = {
     }
 }
 
-DATABASES["default"] = dj_database_url.config(default="sqlite:///db.sqlite3")
+# Connections are kept open for CONN_MAX_AGE seconds and checked before being
+# reused, instead of opening one per request. Under ASGI (marked by core/asgi.py)
+# sync code runs in threads whose connections would be left open, so as Django
+# recommends they are closed after every request, unless ASGI_CONN_MAX_AGE is set.
+if os.environ.get("DJANGO_SERVER_INTERFACE") == "asgi":
+    DATABASE_CONN_MAX_AGE = int(os.environ.get("ASGI_CONN_MAX_AGE", default=0))
+else:
+    DATABASE_CONN_MAX_AGE = int(os.environ.get("CONN_MAX_AGE", default=60))
+
+DATABASES["default"] = dj_database_url.config(
+    default="sqlite:///db.sqlite3",
+    conn_max_age=DATABASE_CONN_MAX_AGE,
+    conn_health_checks=bool(int(os.environ.get("CONN_HEALTH_CHECKS", default=1))),
+)
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# writer and writers wait up to the busy timeout (ms) for each other, instead
+# of failing with "database is locked". Pragmas set to None keep SQLite's defaults.
+SHOPPING_LIST_SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", default="wal"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", default="normal"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024)),
+    # Negative sizes are in KiB.
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", default=-64 * 1024)),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", default=5000)),
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# One memory-mapped table shared by every gunicorn worker on the host, so
+# throttling and cached responses are consistent across workers. Deployments
+# using different databases must not share it, so by default both the file
+# and the key prefix are derived from the database, with SQLite files by their
+# absolute path. The file lives in a directory only this user can access.
+
+DATABASE_IDENTITY = {
+    key: DATABASES["default"].get(key, "") for key in ["ENGINE", "HOST", "PORT", "NAME"]
+}
+if DATABASE_IDENTITY["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASE_IDENTITY["NAME"] = os.path.realpath(DATABASE_IDENTITY["NAME"])
+
+DATABASE_DIGEST = hashlib.sha256(
+    "{ENGINE}:{HOST}:{PORT}:{NAME}".format_map(DATABASE_IDENTITY).encode()
+).hexdigest()[:16]
+
+CACHES = {
+    "default": {
+        "BACKEND": "shopping_list.cache_backends.SharedMemoryCache",
+        "LOCATION": os.environ.get(
+            "CACHE_LOCATION",
+            default=os.path.join(
+                tempfile.gettempdir(),
+                f"shopping_list-{os.geteuid()}",
+                f"cache-{DATABASE_DIGEST}",
+            ),
+        ),
+        "KEY_PREFIX": os.environ.get("CACHE_KEY_PREFIX", default=DATABASE_DIGEST),
+        "OPTIONS": {
+            "SLOTS": int(os.environ.get("CACHE_SLOTS", default=16384)),
+            "SLOT_SIZE": int(os.environ.get("CACHE_SLOT_SIZE", default=4096)),
+        },
+    }
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -156,12 +221,12 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "shopping_list.api.renderers.TimedJSONRenderer",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework.authentication.SessionAuthentication",
+        "shopping_list.api.authentication.CachedTokenAuthentication",
+        "shopping_list.api.authentication.TimedSessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -0,0 +1,377 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from shopping_list import feed, membership
+from shopping_list.api.authentication import CachedTokenAuthentication
+from shopping_list.api.filters import FullTextSearchFilter
+from shopping_list.api.pagination import (
+    SearchKeysetPagination,
+    ShoppingItemKeysetPagination,
+    ShoppingListKeysetPagination,
+)
+from shopping_list.api.serializers import (
+    ShoppingItemSerializer,
+    ShoppingListSerializer,
+    ValuesPlan,
+)
+from shopping_list.models import ShoppingItem, ShoppingList
+from shopping_list.timing import phase
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    with phase("serialize"):
+        return JsonResponse(
+            data, status=status, headers=headers, encoder=JSONEncoder, safe=False
+        )
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for Django's async ORM under an ASGI server.
+
+    DRF views are sync only, so this keeps DRF's parsers, serializers,
+    throttles and error format, but authenticates, checks permissions and
+    queries the database without leaving the event loop.
+    """
+
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    token_authentication_class = CachedTokenAuthentication
+    settings = api_settings
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # CSRF is enforced for session authenticated requests only, as in DRF.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await self.authenticate(request)
+            self.request = Request(
+                request, parsers=[parser() for parser in self.parser_classes]
+            )
+            self.request.user = user
+            self.check_throttles(self.request)
+            return await super().dispatch(self.request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        with phase("auth"):
+            return await self.authenticate_user(request)
+
+    async def authenticate_user(self, request):
+        result = await self.token_authentication_class().aauthenticate(request)
+        if result is not None:
+            return result[0]
+
+        user = await request.auser()
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        if request.method not in SAFE_METHODS:
+            SessionAuthentication().enforce_csrf(request)
+
+        return user
+
+    def check_throttles(self, request):
+        durations = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            if not throttle.allow_request(request, self):
+                durations.append(throttle.wait())
+
+        if durations:
+            durations = [duration for duration in durations if duration is not None]
+            raise exceptions.Throttled(max(durations, default=None))
+
+    def handle_exception(self, exc):
+        """
+        Turns `exc` into a response through DRF's `EXCEPTION_HANDLER`, as
+        APIView.handle_exception does, and re-raises what it doesn't handle.
+        """
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            exc.auth_header = self.token_authentication_class.keyword
+
+        context = {
+            "view": self,
+            "args": self.args,
+            "kwargs": self.kwargs,
+            "request": getattr(self, "request", None),
+        }
+        response = self.settings.EXCEPTION_HANDLER(exc, context)
+        if response is None:
+            raise exc
+
+        headers = {
+            name: value
+            for name, value in response.items()
+            if name.lower() != "content-type"
+        }
+        return json_response(
+            response.data, status=response.status_code, headers=headers
+        )
+
+    def check_superuser_or_member(self, is_member):
+        if not (is_member or self.request.user.is_superuser):
+            raise exceptions.PermissionDenied()
+
+    async def check_shopping_list_access(self, shopping_list_id):
+        if await membership.ais_member(self.request.user, shopping_list_id):
+            return
+
+        if not await ShoppingList.objects.filter(pk=shopping_list_id).aexists():
+            raise Http404
+        self.check_superuser_or_member(False)
+
+    def get_serializer_context(self):
+        return {"request": self.request, "view": self}
+
+
+class AsyncListAddShoppingList(AsyncAPIView):
+
+    def get_queryset(self):
+        queryset = ShoppingList.objects.filter(members=self.request.user)
+
+        return ShoppingListSerializer.setup_eager_loading(queryset)
+
+    async def get(self, request):
+        paginator = ShoppingListKeysetPagination()
+        page = await paginator.apaginate_queryset(self.get_queryset(), request, self)
+        serializer = ShoppingListSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+
+        return json_response(paginator.get_paginated_data(serializer.data))
+
+    async def post(self, request):
+        serializer = ShoppingListSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+
+        shopping_list = await ShoppingList.objects.acreate(**serializer.validated_data)
+        await shopping_list.members.aadd(request.user)
+        shopping_list = await self.get_queryset().aget(pk=shopping_list.pk)
+        serializer = ShoppingListSerializer(
+            shopping_list, context=self.get_serializer_context()
+        )
+
+        return json_response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncShoppingListDetail(AsyncAPIView):
+
+    async def get_object(self, pk):
+        queryset = membership.annotate_membership(
+            ShoppingList.objects.all(), self.request.user
+        )
+        queryset = ShoppingListSerializer.setup_eager_loading(queryset)
+        try:
+            shopping_list = await queryset.aget(pk=pk)
+        except ShoppingList.DoesNotExist:
+            raise Http404
+
+        self.check_superuser_or_member(shopping_list.is_member)
+        return shopping_list
+
+    async def get(self, request, pk):
+        shopping_list = await self.get_object(pk)
+        serializer = ShoppingListSerializer(
+            shopping_list, context=self.get_serializer_context()
+        )
+
+        return json_response(serializer.data)
+
+    async def put(self, request, pk, partial=False):
+        shopping_list = await self.get_object(pk)
+        serializer = ShoppingListSerializer(
+            shopping_list,
+            data=request.data,
+            partial=partial,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+
+        for attr, value in serializer.validated_data.items():
+            setattr(shopping_list, attr, value)
+        await shopping_list.asave()
+
+        return json_response(serializer.data)
+
+    async def patch(self, request, pk):
+        return await self.put(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        shopping_list = await self.get_object(pk)
+        await shopping_list.adelete()
+
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncListAddShoppingItem(AsyncAPIView):
+
+    async def get(self, request, pk):
+        await self.check_shopping_list_access(pk)
+
+        plan = ValuesPlan.for_serializer(ShoppingItemSerializer)
+        paginator = ShoppingItemKeysetPagination()
+        queryset = plan.values(ShoppingItem.objects.filter(shopping_list_id=pk))
+        page = await paginator.apaginate_queryset(queryset, request, self)
+
+        return json_response(paginator.get_paginated_data(plan.serialize(page)))
+
+    async def post(self, request, pk):
+        await self.check_shopping_list_access(pk)
+
+        serializer = ShoppingItemSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+
+        # The serializer turns a unique constraint violation into a validation error,
+        # which needs a savepoint, and Django has no async transactions yet.
+        await sync_to_async(serializer.save)(shopping_list_id=pk)
+
+        return json_response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncShoppingItemDetail(AsyncAPIView):
+
+    async def get_object(self, pk, item_pk):
+        queryset = membership.annotate_membership(
+            ShoppingItem.objects.filter(shopping_list_id=pk),
+            self.request.user,
+            shopping_list_field="shopping_list_id",
+        )
+        try:
+            shopping_item = await queryset.aget(pk=item_pk)
+        except ShoppingItem.DoesNotExist:
+            raise Http404
+
+        self.check_superuser_or_member(shopping_item.is_member)
+        return shopping_item
+
+    async def get(self, request, pk, item_pk):
+        shopping_item = await self.get_object(pk, item_pk)
+        serializer = ShoppingItemSerializer(
+            shopping_item, context=self.get_serializer_context()
+        )
+
+        return json_response(serializer.data)
+
+    async def put(self, request, pk, item_pk, partial=False):
+        shopping_item = await self.get_object(pk, item_pk)
+        serializer = ShoppingItemSerializer(
+            shopping_item,
+            data=request.data,
+            partial=partial,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.save)()
+
+        return json_response(serializer.data)
+
+    async def patch(self, request, pk, item_pk):
+        return await self.put(request, pk, item_pk, partial=True)
+
+    async def delete(self, request, pk, item_pk):
+        shopping_item = await self.get_object(pk, item_pk)
+        await shopping_item.adelete()
+
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncSearchShoppingItems(AsyncAPIView):
+
+    async def get(self, request):
+        users_shopping_lists = ShoppingList.objects.filter(members=request.user)
+        queryset = ShoppingItem.objects.filter(shopping_list__in=users_shopping_lists)
+        queryset = FullTextSearchFilter().filter_queryset(request, queryset, self)
+
+        plan = ValuesPlan.for_serializer(ShoppingItemSerializer)
+        paginator = SearchKeysetPagination()
+        page = await paginator.apaginate_queryset(plan.values(queryset), request, self)
+
+        return json_response(paginator.get_paginated_data(plan.serialize(page)))
+
+
+class StreamingNotSupported(exceptions.APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = "Event streams are only served under ASGI."
+    default_code = "not_implemented"
+
+
+class AsyncChangeFeed(AsyncAPIView):
+    """
+    Server-Sent Events stream of changes to the shopping lists of the user.
+
+    Each event carries its log id, so `EventSource` resumes after a dropped
+    connection by sending `Last-Event-ID` (or `?last_event_id=` on first connect).
+    Events are kept for `SHOPPING_LIST_EVENT_RETENTION` seconds, clients away for
+    longer catch up with the changes endpoint.
+
+    Under WSGI the response would be read to its end before anything is sent,
+    and the stream never ends, so it is refused there.
+    """
+
+    heartbeat = 15
+    retry = 3000
+
+    def get_last_event_id(self, request):
+        last_event_id = request.headers.get(
+            "Last-Event-ID", request.query_params.get("last_event_id")
+        )
+        if last_event_id is None:
+            return None
+
+        try:
+            return int(last_event_id)
+        except ValueError:
+            raise exceptions.ValidationError({"last_event_id": ["Invalid event id."]})
+
+    async def get(self, request):
+        if not isinstance(request._request, ASGIRequest):
+            raise StreamingNotSupported()
+
+        after_id = self.get_last_event_id(request)
+        response = StreamingHttpResponse(
+            self.stream(request.user, after_id), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+
+        return response
+
+    async def stream(self, user, after_id):
+        yield f"retry: {self.retry}\n\n"
+
+        async for events in feed.get_broker().listen(after_id, self.heartbeat, user):
+            if not events:
+                yield ": keep-alive\n\n"
+
+            for event in events:
+                if event.recipient_id == user.pk or await membership.ais_member(
+                    user, event.shopping_list_id
+                ):
+                    yield self.format_event(event)
+
+    def format_event(self, event):
+        data = json.dumps(
+            {"shopping_list": event.shopping_list_id, **event.data}, cls=JSONEncoder
+        )
+        return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n"
@@ -0,0 +1,246 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.authentication import SessionScheme
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    SessionAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+from shopping_list.timing import phase
+
+
+class TokenCache:
+    """
+    Two-tier cache of authenticated (user, token) pairs keyed by token key:
+    a size and TTL bounded in-process LRU, in front of a shared Django cache
+    (`SHOPPING_LIST_TOKEN_CACHE_SHARED`, the "default" one unless set).
+
+    Invalidating a key replaces its generation in the shared cache, which every
+    hit of either tier is checked against, so revoked tokens stop working in all
+    workers at once. With `SHOPPING_LIST_TOKEN_CACHE_SHARED = None`, invalidation
+    only reaches the current process, and other workers keep revoked tokens for
+    up to the TTL.
+    """
+
+    key_prefix = "shopping_list:token"
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(settings, "SHOPPING_LIST_TOKEN_CACHE_MAX_SIZE", 1024)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "SHOPPING_LIST_TOKEN_CACHE_TTL", 60)
+
+    @property
+    def shared_cache(self):
+        alias = getattr(settings, "SHOPPING_LIST_TOKEN_CACHE_SHARED", "default")
+        return caches[alias] if alias else None
+
+    def shared_key(self, key):
+        return f"{self.key_prefix}:{key}"
+
+    def generation_key(self, key):
+        return f"{self.key_prefix}-generation:{key}"
+
+    def get(self, key):
+        """
+        Returns the cached value of `key`, or None, and the generation to
+        `set` a value loaded after this call with.
+        """
+        now = time.monotonic()
+        entry = self._get_local(key, now)
+        shared_cache = self.shared_cache
+        if shared_cache is None:
+            return (entry[2] if entry is not None else None), None
+
+        if entry is not None:
+            return self._check_local(
+                key, entry, shared_cache.get(self.generation_key(key))
+            )
+
+        return self._load_shared(
+            key,
+            shared_cache.get_many([self.shared_key(key), self.generation_key(key)]),
+            now,
+        )
+
+    async def aget(self, key):
+        now = time.monotonic()
+        entry = self._get_local(key, now)
+        shared_cache = self.shared_cache
+        if shared_cache is None:
+            return (entry[2] if entry is not None else None), None
+
+        if entry is not None:
+            return self._check_local(
+                key, entry, await shared_cache.aget(self.generation_key(key))
+            )
+
+        return self._load_shared(
+            key,
+            await shared_cache.aget_many(
+                [self.shared_key(key), self.generation_key(key)]
+            ),
+            now,
+        )
+
+    def _get_local(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _check_local(self, key, entry, current):
+        _, generation, value = entry
+        if current == generation:
+            return value, generation
+        with self._lock:
+            self._entries.pop(key, None)
+        return None, current
+
+    def _load_shared(self, key, values, now):
+        generation = values.get(self.generation_key(key))
+        stored = values.get(self.shared_key(key))
+        # A value loaded before the last invalidation has an older generation.
+        if stored is None or stored[0] != generation:
+            return None, generation
+
+        self._store(key, stored[1], generation, now)
+        return stored[1], generation
+
+    def set(self, key, value, generation=None):
+        self._store(key, value, generation, time.monotonic())
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            shared_cache.set(self.shared_key(key), (generation, value), self.ttl)
+
+    async def aset(self, key, value, generation=None):
+        self._store(key, value, generation, time.monotonic())
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            await shared_cache.aset(self.shared_key(key), (generation, value), self.ttl)
+
+    def _store(self, key, value, generation, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl, generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None and keys:
+            # Outlives every entry stored before it, which expire within the TTL.
+            shared_cache.set_many(
+                {self.generation_key(key): uuid.uuid4().hex for key in keys}, self.ttl
+            )
+            shared_cache.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that skips the token and user lookup for recently seen tokens.
+    """
+
+    def authenticate(self, request):
+        with phase("auth"):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        cached, generation = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached, generation)
+
+        user, token = cached
+        # Every request gets its own user instance, as it would from the database.
+        return copy.copy(user), token
+
+    async def aauthenticate(self, request):
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) == 1:
+            msg = _("Invalid token header. No credentials provided.")
+            raise exceptions.AuthenticationFailed(msg)
+        elif len(auth) > 2:
+            msg = _("Invalid token header. Token string should not contain spaces.")
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            msg = _(
+                "Invalid token header. Token string should not contain invalid characters."
+            )
+            raise exceptions.AuthenticationFailed(msg)
+
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        cached, generation = await token_cache.aget(key)
+        if cached is None:
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related("user").aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+            cached = token.user, token
+            await token_cache.aset(key, cached, generation)
+
+        user, token = cached
+        return copy.copy(user), token
+
+
+class TimedSessionAuthentication(SessionAuthentication):
+    """
+    SessionAuthentication that reports its time as the `auth` phase of the request.
+    """
+
+    def authenticate(self, request):
+        with phase("auth"):
+            return super().authenticate(request)
+
+
+class TimedSessionScheme(SessionScheme):
+    # drf-spectacular only matches SessionAuthentication itself, not subclasses.
+    target_class = TimedSessionAuthentication
@@ -0,0 +1,17 @@
+from rest_framework import filters
+
+from shopping_list.search import get_search_backend
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Same `?search=` parameter as SearchFilter, but served by the indexed search
+    backend of the current database, with results ranked best match first.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        return get_search_backend(queryset.db).search(queryset, " ".join(search_terms))
@@ -0,0 +1,335 @@
+import itertools
+import json
+import time
+import uuid
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from shopping_list import feed, interactions, membership
+from shopping_list.api.serializers import (
+    DUPLICATE_ITEM_MESSAGE,
+    ImportItemSerializer,
+    ImportListSerializer,
+    ImportMemberSerializer,
+    is_duplicate_item_error,
+)
+from shopping_list.models import ChangeEvent, ListJoin, ShoppingItem, ShoppingList, User
+
+
+class ShoppingDataImport:
+    """
+    Imports NDJSON records in the format of shopping_list.export into the
+    shopping lists of `user`:
+
+        {"type": "list", "id": "groceries", "name": "Groceries"}
+        {"type": "member", "shopping_list": "groceries", "name": "alice"}
+        {"type": "item", "shopping_list": "groceries", "name": "Milk", "purchased": false}
+
+    Imported lists always get a new ID, their `id` only identifies them to the
+    records that follow. Records can also refer to existing lists of the user
+    by their UUID.
+
+    Member records name the user to add by username, or by `email`, and are
+    only imported with `members`; otherwise they are ignored.
+
+    Records are validated and written `batch_size` at a time, each batch in
+    its own transaction with one `bulk_create` per table, so neither memory
+    nor transactions grow with the size of the import. Invalid records are
+    skipped and reported by line number, the others are imported.
+    """
+
+    batch_size = 1000
+    max_errors = 100
+
+    record_serializers = {
+        "list": ImportListSerializer,
+        "member": ImportMemberSerializer,
+        "item": ImportItemSerializer,
+    }
+
+    def __init__(self, user, members=False):
+        self.user = user
+        self.members = members
+        self.serializers = {
+            record_type: serializer_class()
+            for record_type, serializer_class in self.record_serializers.items()
+        }
+        # References to the lists imported so far, or found among the user's.
+        self.shopping_lists = {}
+        self.created = Counter(lists=0, memberships=0, items=0)
+        self.errors = []
+        self.error_count = 0
+
+    def run(self, lines):
+        started = time.perf_counter()
+        records = self.parse(lines)
+        # The lists of every batch are touched with one UPDATE at the end.
+        with interactions.coalesce_touches():
+            while batch := list(itertools.islice(records, self.batch_size)):
+                self.import_batch(batch)
+        duration = time.perf_counter() - started
+
+        self.errors.sort(key=lambda error: error["line"])
+        return {
+            "created": dict(self.created),
+            "errors": self.errors,
+            "error_count": self.error_count,
+            "rows_per_second": round(sum(self.created.values()) / duration, 1),
+        }
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def parse(self, lines):
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.add_error(line_number, {"non_field_errors": ["Invalid JSON."]})
+                continue
+
+            record_type = record.get("type") if isinstance(record, dict) else None
+            if record_type not in self.serializers:
+                self.add_error(
+                    line_number,
+                    {"type": [f"Must be one of: {', '.join(self.serializers)}."]},
+                )
+                continue
+            if record_type == "member" and not self.members:
+                continue
+
+            try:
+                data = self.serializers[record_type].run_validation(record)
+            except serializers.ValidationError as error:
+                self.add_error(line_number, error.detail)
+                continue
+
+            yield line_number, record_type, data
+
+    def import_batch(self, batch):
+        try:
+            errors, references = self.write_batch(batch)
+        except IntegrityError as error:
+            if not is_duplicate_item_error(error):
+                raise
+            # Someone else added one of the names since the check, which sees it now.
+            errors, references = self.write_batch(batch)
+
+        self.shopping_lists.update(references)
+        for line_number, line_errors in errors:
+            self.add_error(line_number, line_errors)
+
+    def write_batch(self, batch):
+        errors = []
+        references = {}
+
+        with transaction.atomic():
+            shopping_lists = []
+            for line_number, record_type, data in batch:
+                if record_type != "list":
+                    continue
+                reference = data.get("id")
+                if reference in self.shopping_lists or reference in references:
+                    errors.append(
+                        (line_number, {"id": ["Duplicate shopping list id."]})
+                    )
+                    continue
+                shopping_list = ShoppingList(name=data["name"])
+                shopping_lists.append(shopping_list)
+                if reference is not None:
+                    references[reference] = shopping_list.pk
+
+            references.update(self.find_shopping_lists(batch, references))
+            records = []
+            for line_number, record_type, data in batch:
+                if record_type == "list":
+                    continue
+                reference = data["shopping_list"]
+                shopping_list_id = self.shopping_lists.get(
+                    reference, references.get(reference)
+                )
+                if shopping_list_id is None:
+                    errors.append(
+                        (line_number, {"shopping_list": ["Unknown shopping list."]})
+                    )
+                    continue
+                records.append((line_number, record_type, data, shopping_list_id))
+
+            members = [
+                (shopping_list.pk, self.user.pk) for shopping_list in shopping_lists
+            ]
+            members += self.new_members(records, errors)
+            shopping_items = self.new_shopping_items(records, errors)
+
+            Membership = ShoppingList.members.through
+            ShoppingList.objects.bulk_create(shopping_lists)
+            Membership.objects.bulk_create(
+                Membership(shoppinglist_id=shopping_list_id, user_id=user_id)
+                for shopping_list_id, user_id in members
+            )
+            ShoppingItem.objects.bulk_create(shopping_items)
+
+            # bulk_create sends no signals, so do what their receivers would.
+            membership.invalidate({user_id for _, user_id in members})
+            membership.invalidate_members(
+                {shopping_list_id for shopping_list_id, _ in members}
+            )
+            ListJoin.objects.bulk_create(
+                ListJoin(shopping_list_id=shopping_list_id, recipient_id=user_id)
+                for shopping_list_id, user_id in members
+            )
+            feed.record(
+                [
+                    ChangeEvent(
+                        shopping_list_id=shopping_list_id,
+                        recipient_id=user_id,
+                        kind=feed.MEMBER_ADDED,
+                        data={"user": user_id},
+                    )
+                    for shopping_list_id, user_id in members
+                ]
+                + [
+                    feed.item_event(feed.ITEM_CREATED, shopping_item)
+                    for shopping_item in shopping_items
+                ]
+            )
+            touched = {shopping_list_id for shopping_list_id, _ in members}
+            touched.update(
+                shopping_item.shopping_list_id for shopping_item in shopping_items
+            )
+            if touched:
+                interactions.touch(*touched)
+
+        self.created.update(
+            lists=len(shopping_lists),
+            memberships=len(members),
+            items=len(shopping_items),
+        )
+        return errors, references
+
+    def find_shopping_lists(self, batch, references):
+        """
+        Resolves the references of the batch that are not imported lists to the
+        user's existing lists, in one query.
+        """
+        shopping_list_ids = {}
+        for _, record_type, data in batch:
+            reference = data.get("shopping_list")
+            if (
+                record_type == "list"
+                or reference in self.shopping_lists
+                or reference in references
+            ):
+                continue
+            try:
+                shopping_list_ids[uuid.UUID(reference)] = reference
+            except ValueError:
+                pass
+
+        if not shopping_list_ids:
+            return {}
+
+        return {
+            shopping_list_ids[pk]: pk
+            for pk in ShoppingList.objects.filter(
+                members=self.user, pk__in=shopping_list_ids
+            ).values_list("pk", flat=True)
+        }
+
+    def new_members(self, records, errors):
+        member_records = [
+            (line_number, data, shopping_list_id)
+            for line_number, record_type, data, shopping_list_id in records
+            if record_type == "member"
+        ]
+        if not member_records:
+            return []
+
+        usernames = {data["name"] for _, data, _ in member_records if "name" in data}
+        emails = {data["email"] for _, data, _ in member_records if "email" in data}
+        user_ids = {}
+        for pk, username, email in User.objects.filter(
+            Q(username__in=usernames) | Q(email__in=emails)
+        ).values_list("pk", "username", "email"):
+            if username in usernames:
+                user_ids[("name", username)] = pk
+            if email in emails:
+                # Emails are not unique, so one shared by several users is rejected.
+                key = ("email", email)
+                user_ids[key] = None if key in user_ids else pk
+
+        # Importing a list's members again, or the user's own membership, is fine.
+        members = set(
+            ShoppingList.members.through.objects.filter(
+                shoppinglist_id__in={
+                    shopping_list_id for *_, shopping_list_id in member_records
+                },
+                user_id__in={pk for pk in user_ids.values() if pk is not None},
+            ).values_list("shoppinglist_id", "user_id")
+        )
+        members.update(
+            (shopping_list_id, self.user.pk) for *_, shopping_list_id in records
+        )
+
+        new_members = []
+        for line_number, data, shopping_list_id in member_records:
+            field = "name" if "name" in data else "email"
+            key = (field, data[field])
+            user_id = user_ids.get(key)
+            if user_id is None:
+                if key in user_ids:
+                    message = "More than one user has this email."
+                else:
+                    message = "Unknown user."
+                errors.append((line_number, {field: [message]}))
+                continue
+            if (shopping_list_id, user_id) not in members:
+                members.add((shopping_list_id, user_id))
+                new_members.append((shopping_list_id, user_id))
+
+        return new_members
+
+    def new_shopping_items(self, records, errors):
+        items = [
+            (line_number, data, shopping_list_id)
+            for line_number, record_type, data, shopping_list_id in records
+            if record_type == "item"
+        ]
+        if not items:
+            return []
+
+        unpurchased_names = set(
+            ShoppingItem.objects.filter(
+                shopping_list_id__in={
+                    shopping_list_id for *_, shopping_list_id in items
+                },
+                name__in={data["name"] for _, data, _ in items},
+                purchased=False,
+            ).values_list("shopping_list_id", "name")
+        )
+
+        shopping_items = []
+        for line_number, data, shopping_list_id in items:
+            key = (shopping_list_id, data["name"])
+            if not data["purchased"]:
+                if key in unpurchased_names:
+                    errors.append((line_number, {"name": [DUPLICATE_ITEM_MESSAGE]}))
+                    continue
+                unpurchased_names.add(key)
+            shopping_items.append(
+                ShoppingItem(
+                    shopping_list_id=shopping_list_id,
+                    name=data["name"],
+                    purchased=data["purchased"],
+                )
+            )
+
+        return shopping_items
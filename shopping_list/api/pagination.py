@@ -1,7 +1,423 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import copy
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ValidationError as APIValidationError
+from rest_framework.pagination import (
+    BasePagination,
+    PageNumberPagination,
+    _positive_int,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LargerResultsSetPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a fixed, unique, composite ordering.
+
+    Unlike PageNumberPagination it never runs a COUNT(*) and never uses OFFSET:
+    every page is a `WHERE (ordering) > (last row)` query, so deep pages cost
+    the same as the first one. Cursors are opaque to clients.
+    """
+
+    ordering = None
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.get_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.get_page([row async for row in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_ordering_fields(queryset)
+
+        self.reverse, self.position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.get_order_by(self.reverse))
+        if self.position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(self.position, self.reverse)
+            )
+
+        return queryset[: self.page_size + 1]
+
+    def get_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+            has_next, has_previous = self.position is not None, has_more
+        else:
+            has_next, has_previous = has_more, self.position is not None
+
+        self.next_position = self.get_position(rows[-1]) if has_next and rows else None
+        self.previous_position = (
+            self.get_position(rows[0]) if has_previous and rows else None
+        )
+
+        return rows
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset):
+        return self.ordering
+
+    def get_ordering_fields(self, queryset):
+        fields = []
+        for name in self.get_ordering(queryset):
+            name, descending = name.lstrip("-"), name.startswith("-")
+            if name in queryset.query.annotations:
+                # The output field of an annotation is unbound, so name a copy.
+                field = copy.copy(queryset.query.annotations[name].output_field)
+                field.set_attributes_from_name(name)
+            else:
+                field = queryset.model._meta.get_field(name)
+            fields.append((field, descending))
+
+        return fields
+
+    def get_order_by(self, reverse):
+        return [
+            f"{'-' if descending != reverse else ''}{field.name}"
+            for field, descending in self.fields
+        ]
+
+    def get_keyset_filter(self, position, reverse):
+        # (a, b, c) > (x, y, z) is expanded to
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        # so it works on every database and can use a composite index.
+        conditions = []
+        for index, (field, descending) in enumerate(self.fields):
+            lookup = "lt" if descending != reverse else "gt"
+            equal = [
+                Q(**{previous.attname: position[previous_index]})
+                for previous_index, (previous, _) in enumerate(self.fields[:index])
+            ]
+            seek = Q(**{f"{field.attname}__{lookup}": position[index]})
+            conditions.append(reduce(and_, equal + [seek]))
+
+        return reduce(or_, conditions)
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[field.attname] for field, _ in self.fields]
+
+        return [getattr(row, field.attname) for field, _ in self.fields]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            values = payload["v"]
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [
+                field.to_python(value) for (field, _), value in zip(self.fields, values)
+            ]
+            return bool(payload["r"]), position
+        except (
+            binascii.Error,
+            KeyError,
+            TypeError,
+            UnicodeEncodeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        values = [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in position
+        ]
+        values = [
+            value if isinstance(value, (bool, int, float, str)) else str(value)
+            for value in values
+        ]
+        payload = json.dumps({"r": int(reverse), "v": values}, separators=(",", ":"))
+        encoded = urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class ShoppingItemKeysetPagination(KeysetPagination):
+    ordering = ("purchased", "name", "id")
+
+
+class ShoppingListKeysetPagination(KeysetPagination):
+    ordering = ("-last_interaction", "id")
+
+
+class SearchKeysetPagination(ShoppingItemKeysetPagination):
+    """
+    Keeps search results best match first, in the order of the search backend.
+    Without a search term, items are paged like on the item lists.
+    """
+
+    search_ordering = ("search_rank", "name", "id")
+
+    def get_ordering(self, queryset):
+        if "search_rank" in queryset.query.annotations:
+            return self.search_ordering
+
+        return self.ordering
+
+
+class KeysetPaginationMixin:
+    # Lets a view opt into `keyset_pagination_class` with `?pagination=cursor`
+    # (or by following a cursor link), keeping `pagination_class` as the default.
+
+    keyset_pagination_class = None
+    pagination_mode_query_param = "pagination"
+
+    def uses_keyset_pagination(self):
+        request = getattr(self, "request", None)
+        if self.keyset_pagination_class is None or request is None:
+            return False
+
+        query_params = request.query_params
+        return (
+            query_params.get(self.pagination_mode_query_param) == "cursor"
+            or KeysetPagination.cursor_query_param in query_params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.uses_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+
+        return super().paginator
+
+
+def get_sync_retention():
+    """Seconds for which delta sync keeps the history of deletions and joins."""
+    return getattr(settings, "SHOPPING_LIST_SYNC_RETENTION", 30 * 24 * 60 * 60)
+
+
+class DeltaSyncPagination:
+    """
+    Pages through rows changed after a sync token, one ordered stream per kind
+    of row (e.g. items by `updated_at`, tombstones by `deleted_at`).
+
+    The token holds the (timestamp, id) position reached in every stream, so a
+    sync that stops half way resumes exactly where it got to. Timestamps are
+    taken before their transaction commits, so a new sync reads again the rows
+    of the last `window` seconds before each position, which clients apply
+    idempotently. Tokens older than the history kept for `retention` seconds
+    start over with a full sync, flagged by `reset`.
+    """
+
+    page_size = 500
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    token_query_param = "since"
+    invalid_token_message = "Invalid sync token."
+
+    def __init__(self, request):
+        self.now = timezone.now()
+        self.page_size = self.get_page_size(request)
+        self.positions, self.resume, synced_at = self.decode_token(request)
+        self.reset = synced_at is not None and synced_at < self.now - timedelta(
+            seconds=self.retention
+        )
+        if self.reset:
+            self.positions, self.resume = {}, False
+        self.has_more = False
+
+    @property
+    def window(self):
+        return getattr(settings, "SHOPPING_LIST_SYNC_WINDOW", 30)
+
+    @property
+    def retention(self):
+        return get_sync_retention()
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_token(self, request):
+        encoded = request.query_params.get(self.token_query_param)
+        if not encoded:
+            return {}, False, None
+
+        try:
+            token = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            if not isinstance(token, dict):
+                raise ValueError
+            positions = token["positions"]
+            synced_at = parse_datetime(token["synced_at"])
+            if not isinstance(positions, dict) or synced_at is None:
+                raise ValueError
+            return positions, bool(token.get("resume")), synced_at
+        except (binascii.Error, UnicodeEncodeError, ValueError, KeyError, TypeError):
+            self.invalid_token()
+
+    def invalid_token(self):
+        raise APIValidationError({self.token_query_param: [self.invalid_token_message]})
+
+    def paginate_stream(self, name, queryset, timestamp_field, changed_since=None):
+        """
+        `timestamp_field` can be an annotation of `queryset`. `changed_since`
+        optionally maps a timestamp to a filter narrowing `queryset` to the rows
+        changed since then, where the filter on `timestamp_field` can't use an index.
+        """
+        if timestamp_field in queryset.query.annotations:
+            timestamp_output = queryset.query.annotations[timestamp_field].output_field
+        else:
+            timestamp_output = queryset.model._meta.get_field(timestamp_field)
+        fields = [timestamp_output, queryset.model._meta.pk]
+
+        position = self.positions.get(name)
+        if position is not None:
+            try:
+                timestamp, pk = [
+                    field.to_python(value) for field, value in zip(fields, position)
+                ]
+            except (TypeError, ValueError, ValidationError):
+                self.invalid_token()
+            if not self.resume:
+                timestamp -= timedelta(seconds=self.window)
+            queryset = queryset.filter(
+                Q(**{f"{timestamp_field}__gt": timestamp})
+                | Q(**{timestamp_field: timestamp, "pk__gt": pk})
+            )
+            if changed_since is not None:
+                queryset = queryset.filter(changed_since(timestamp))
+
+        rows = list(queryset.order_by(timestamp_field, "pk")[: self.page_size + 1])
+        if len(rows) > self.page_size:
+            self.has_more = True
+            rows = rows[: self.page_size]
+
+        if rows:
+            last = rows[-1]
+            self.positions[name] = [
+                getattr(last, timestamp_field).isoformat(),
+                last.pk if isinstance(last.pk, int) else str(last.pk),
+            ]
+
+        return rows
+
+    def get_token(self):
+        token = {
+            "positions": self.positions,
+            "resume": self.has_more,
+            "synced_at": self.now.isoformat(),
+        }
+        payload = json.dumps(token, separators=(",", ":"))
+        return urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.token_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The token returned by the previous sync.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Maximum number of rows of each kind to return.",
+                "schema": {"type": "integer"},
+            },
+        ]
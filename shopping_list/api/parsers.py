@@ -0,0 +1,14 @@
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline delimited JSON. `request.data` is an iterator over the lines of the
+    body, read from the request stream as they are consumed, so bodies of any
+    size can be processed without holding them in memory.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter(stream.readline, b"")
@@ -1,6 +1,6 @@
 from rest_framework import permissions
 
-from shopping_list.models import ShoppingList
+from shopping_list import membership
 
 
 class ShoppingListMembersOnly(permissions.BasePermission):
@@ -10,7 +10,7 @@ class ShoppingListMembersOnly(permissions.BasePermission):
         if request.user.is_superuser:
             return True
 
-        if request.user in obj.members.all():
+        if membership.is_member(request.user, obj.pk):
             return True
 
         return False
@@ -23,7 +23,11 @@ class ShoppingItemShoppingListMembersOnly(permissions.BasePermission):
         if request.user.is_superuser:
             return True
 
-        if request.user in obj.shopping_list.members.all():
+        is_member = getattr(obj, "is_member", None)
+        if is_member is None:
+            is_member = membership.is_member(request.user, obj.shopping_list_id)
+
+        if is_member:
             return True
 
         return False
@@ -32,11 +36,12 @@ class ShoppingItemShoppingListMembersOnly(permissions.BasePermission):
 class AllShoppingItemsShoppingListMembersOnly(permissions.BasePermission):
 
     def has_permission(self, request, view):
+        shopping_list = view.get_shopping_list()
+
         if request.user.is_superuser:
             return True
 
-        current_shopping_list = ShoppingList.objects.get(pk=view.kwargs.get("pk"))
-        if request.user in current_shopping_list.members.all():
+        if shopping_list.is_member:
             return True
 
         return False
@@ -0,0 +1,13 @@
+from rest_framework.renderers import JSONRenderer
+
+from shopping_list.timing import phase
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that reports its time as the `serialize` phase of the request.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
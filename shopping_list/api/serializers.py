@@ -1,8 +1,103 @@
+import functools
+from contextlib import contextmanager
 from typing import List, TypedDict
 
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
-from shopping_list.models import ShoppingItem, ShoppingList, User
+from shopping_list import export, feed, interactions
+from shopping_list.models import (
+    UNIQUE_UNPURCHASED_ITEM_NAME,
+    ShoppingItem,
+    ShoppingList,
+    Tombstone,
+    User,
+)
+
+
+class ValuesPlan:
+    """
+    Read-only serialization of `.values()` rows for a ModelSerializer, compiled once
+    per class from its declared fields, without building model instances or going
+    through every field for every row. The output is the same as `serializer.data`.
+
+    Only fields that read one model column are supported.
+    """
+
+    # Fields whose representation is the database value itself, or a value
+    # the JSON encoder renders the same way (UUIDs and related primary keys).
+    passthrough_fields = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.FloatField,
+        serializers.IntegerField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.names = []
+        self.columns = []
+        self.converters = {}
+
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                model_field = None
+            if (
+                model_field is None
+                or not model_field.concrete
+                or model_field.many_to_many
+            ):
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name} does not read a model column."
+                )
+
+            self.names.append(name)
+            self.columns.append(model_field.attname)
+            if not self.is_passthrough(field):
+                self.converters[name] = field.to_representation
+
+        self.rows_are_output = not self.converters and self.names == self.columns
+
+    @classmethod
+    @functools.cache
+    def for_serializer(cls, serializer_class):
+        return cls(serializer_class)
+
+    def is_passthrough(self, field):
+        if isinstance(field, serializers.UUIDField):
+            return field.uuid_format == "hex_verbose"
+
+        return isinstance(field, self.passthrough_fields)
+
+    def values(self, queryset):
+        # Annotations are kept for keyset cursors (e.g. `search_rank`), and left
+        # out of the output by `serialize`.
+        return queryset.values(*self.columns, *queryset.query.annotations)
+
+    def serialize(self, rows):
+        if self.rows_are_output:
+            rows = list(rows)
+            if not rows or len(rows[0]) == len(self.columns):
+                return rows
+
+        fields = list(zip(self.names, self.columns))
+        rows = [{name: row[column] for name, column in fields} for row in rows]
+        for name, to_representation in self.converters.items():
+            for row in rows:
+                if row[name] is not None:
+                    row[name] = to_representation(row[name])
+
+        return rows
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -13,6 +108,78 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username"]
 
 
+DUPLICATE_ITEM_MESSAGE = "There's already this item on the list"
+
+
+def is_duplicate_item_error(error):
+    # PostgreSQL names the violated constraint, SQLite lists its columns.
+    message = str(error)
+    return (
+        UNIQUE_UNPURCHASED_ITEM_NAME in message
+        or f"{ShoppingItem._meta.db_table}.name" in message
+    )
+
+
+class ShoppingItemListSerializer(serializers.ListSerializer):
+
+    max_items = 1000
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", self.max_items)
+        super().__init__(*args, **kwargs)
+
+    def create(self, validated_data):
+        if not validated_data:
+            return []
+
+        shopping_list = validated_data[0]["shopping_list"]
+        errors = self.get_duplicate_errors(shopping_list, validated_data)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        try:
+            with transaction.atomic():
+                shopping_items = ShoppingItem.objects.bulk_create(
+                    [ShoppingItem(**attrs) for attrs in validated_data]
+                )
+                # bulk_create sends no post_save, so touch the list once for the batch.
+                interactions.touch(shopping_list.pk)
+                feed.record(
+                    [
+                        feed.item_event(feed.ITEM_CREATED, shopping_item)
+                        for shopping_item in shopping_items
+                    ]
+                )
+        except IntegrityError as error:
+            # Someone else added one of the names since the check above.
+            if not is_duplicate_item_error(error):
+                raise
+            raise serializers.ValidationError(
+                self.get_duplicate_errors(shopping_list, validated_data)
+            )
+
+        return shopping_items
+
+    def get_duplicate_errors(self, shopping_list, validated_data):
+        names = {attrs["name"] for attrs in validated_data}
+        unpurchased_names = set(
+            ShoppingItem.objects.filter(
+                shopping_list=shopping_list, name__in=names, purchased=False
+            ).values_list("name", flat=True)
+        )
+
+        errors = []
+        for attrs in validated_data:
+            if attrs["name"] in unpurchased_names:
+                errors.append({"name": [DUPLICATE_ITEM_MESSAGE]})
+            else:
+                errors.append({})
+            if not attrs["purchased"]:
+                unpurchased_names.add(attrs["name"])
+
+        return errors
+
+
 class ShoppingItemSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -20,19 +187,30 @@ class ShoppingItemSerializer(serializers.ModelSerializer):
         model = ShoppingItem
         fields = ["id", "name", "purchased"]
         read_only_fields = ("id",)
+        list_serializer_class = ShoppingItemListSerializer
 
     def create(self, validated_data, **kwargs):
 
-        validated_data["shopping_list_id"] = self.context["request"].parser_context[
-            "kwargs"
-        ]["pk"]
+        with self.translate_duplicate_error():
+            return super(ShoppingItemSerializer, self).create(validated_data)
+
+    def update(self, instance, validated_data):
 
-        if ShoppingList.objects.get(
-            id=self.context["request"].parser_context["kwargs"]["pk"]
-        ).shopping_items.filter(name=validated_data["name"], purchased=False):
-            raise serializers.ValidationError("There's already this item on the list")
+        with self.translate_duplicate_error():
+            return super(ShoppingItemSerializer, self).update(instance, validated_data)
 
-        return super(ShoppingItemSerializer, self).create(validated_data)
+    @contextmanager
+    def translate_duplicate_error(self):
+        # The unique constraint is the duplicate check: one INSERT, and
+        # correct under concurrent requests. The savepoint keeps an outer
+        # transaction usable after the violation.
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError as error:
+            if not is_duplicate_item_error(error):
+                raise
+            raise serializers.ValidationError(DUPLICATE_ITEM_MESSAGE)
 
 
 class UnpurchasedItem(TypedDict):
@@ -41,6 +219,8 @@ class UnpurchasedItem(TypedDict):
 
 class ShoppingListSerializer(serializers.ModelSerializer):
 
+    UNPURCHASED_ITEMS_PREVIEW = 3
+
     members = UserSerializer(many=True, read_only=True)
     unpurchased_items = serializers.SerializerMethodField()
 
@@ -49,35 +229,207 @@ class ShoppingListSerializer(serializers.ModelSerializer):
         model = ShoppingList
         fields = ["id", "name", "unpurchased_items", "members"]
 
+    @classmethod
+    def unpurchased_items_queryset(cls):
+        return (
+            ShoppingItem.objects.filter(purchased=False)
+            .only("id", "name", "shopping_list_id")
+            .order_by("name", "id")
+        )
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Prefetches members and the unpurchased items preview, so a page of shopping lists
+        costs the same number of queries however many lists or items there are.
+        The preview is sliced in the database (Django uses a window function for this).
+        """
+        return queryset.prefetch_related(
+            Prefetch(
+                "members",
+                queryset=User.objects.only(*UserSerializer.Meta.fields),
+            ),
+            Prefetch(
+                "shopping_items",
+                queryset=cls.unpurchased_items_queryset()[
+                    : cls.UNPURCHASED_ITEMS_PREVIEW
+                ],
+                to_attr="unpurchased_items_preview",
+            ),
+        )
+
     def get_unpurchased_items(self, obj) -> List[UnpurchasedItem]:
-        return [
-            {"name": shopping_item.name}
-            for shopping_item in obj.shopping_items.filter(purchased=False)
-        ][:3]
+        shopping_items = getattr(obj, "unpurchased_items_preview", None)
+        if shopping_items is None:
+            shopping_items = self.unpurchased_items_queryset().filter(
+                shopping_list=obj
+            )[: self.UNPURCHASED_ITEMS_PREVIEW]
+
+        return [{"name": shopping_item.name} for shopping_item in shopping_items]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Looks up all the primary keys of a to-many relation in one `IN` query,
+    instead of one query per key.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+
+        pks = []
+        for item in data:
+            if child.pk_field is not None:
+                item = child.pk_field.to_internal_value(item)
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                child.fail("incorrect_type", data_type=type(item).__name__)
+
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail("does_not_exist", pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return BulkManyRelatedField(**list_kwargs)
 
 
 class AddMemberSerializer(serializers.ModelSerializer):
 
+    serializer_related_field = BulkPrimaryKeyRelatedField
+
     class Meta:
         model = ShoppingList
         fields = ["members"]
 
     def update(self, instance, validated_data):
-        for member in validated_data["members"]:
-            instance.members.add(member)
-            instance.save()
+        instance.members.add(*validated_data["members"])
+        interactions.touch(instance.pk)
 
         return instance
 
 
 class RemoveMemberSerializer(serializers.ModelSerializer):
+
+    serializer_related_field = BulkPrimaryKeyRelatedField
+
     class Meta:
         model = ShoppingList
         fields = ["members"]
 
     def update(self, instance, validated_data):
-        for member in validated_data["members"]:
-            instance.members.remove(member)
-            instance.save()
+        instance.members.remove(*validated_data["members"])
+        interactions.touch(instance.pk)
 
         return instance
+
+
+class ShoppingItemChangeSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ShoppingItem
+        fields = ["id", "shopping_list", "name", "purchased", "updated_at"]
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+
+    type = serializers.CharField(source="object_type")
+    id = serializers.UUIDField(source="object_id")
+    shopping_list = serializers.UUIDField(source="shopping_list_id")
+
+    class Meta:
+        model = Tombstone
+        fields = ["type", "id", "shopping_list", "deleted_at"]
+
+
+class ChangesSerializer(serializers.Serializer):
+
+    items = ShoppingItemChangeSerializer(many=True)
+    deleted = TombstoneSerializer(many=True)
+    token = serializers.CharField()
+    has_more = serializers.BooleanField()
+    reset = serializers.BooleanField()
+
+
+class ExportParametersSerializer(serializers.Serializer):
+
+    file_format = serializers.ChoiceField(
+        choices=list(export.CONTENT_TYPES), default="ndjson"
+    )
+    compression = serializers.ChoiceField(choices=["gzip"], required=False)
+
+
+class ImportListSerializer(serializers.ModelSerializer):
+
+    # Only identifies the list to the other records of the import.
+    id = serializers.CharField(max_length=100, required=False)
+
+    class Meta:
+        model = ShoppingList
+        fields = ["id", "name"]
+
+
+class ImportParametersSerializer(serializers.Serializer):
+
+    # Member records add other users to the imported lists, so they are opt-in.
+    members = serializers.BooleanField(default=False)
+
+
+class ImportMemberSerializer(serializers.Serializer):
+
+    shopping_list = serializers.CharField(max_length=100)
+    # The username, as in the export, or else the email of the member.
+    name = serializers.CharField(max_length=150, required=False)
+    email = serializers.EmailField(required=False)
+
+    def validate(self, attrs):
+        if ("name" in attrs) == ("email" in attrs):
+            raise serializers.ValidationError("Give either the name or the email.")
+        return attrs
+
+
+class ImportItemSerializer(serializers.ModelSerializer):
+
+    shopping_list = serializers.CharField(max_length=100)
+    purchased = serializers.BooleanField(default=False)
+
+    class Meta:
+        model = ShoppingItem
+        fields = ["shopping_list", "name", "purchased"]
+        # Duplicates are checked for a whole batch by the import.
+        validators = []
+
+
+class ImportErrorSerializer(serializers.Serializer):
+
+    line = serializers.IntegerField()
+    errors = serializers.DictField()
+
+
+class ImportReportSerializer(serializers.Serializer):
+
+    created = serializers.DictField(child=serializers.IntegerField())
+    errors = ImportErrorSerializer(many=True)
+    error_count = serializers.IntegerField()
+    rows_per_second = serializers.FloatField()
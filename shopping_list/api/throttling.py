@@ -1,9 +1,85 @@
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework.throttling import UserRateThrottle
 
 
-class MinuteRateThrottle(UserRateThrottle):
+class SlidingWindowRateThrottle(UserRateThrottle):
+    """
+    Sliding window counter: two fixed-window counters per user, the previous one
+    weighted by how much of it still overlaps the sliding window.
+
+    State is O(1) per user and is only ever changed with atomic add/incr/decr, so
+    any cache shared by all workers (`SHOPPING_LIST_THROTTLE_CACHE`) enforces one
+    limit across processes, unlike the per-request timestamp history of
+    SimpleRateThrottle.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "SHOPPING_LIST_THROTTLE_CACHE", "default")]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        elapsed = self.now - window * self.duration
+
+        previous_key = f"{self.key}:{window - 1}"
+        current_key = f"{self.key}:{window}"
+        # Count the request first and judge it by the requests counted before
+        # it, so concurrent requests can't all pass on the same reading.
+        current = self.increment(current_key)
+        previous = self.cache.get(previous_key, 0)
+
+        weight = 1 - elapsed / self.duration
+        if previous * weight + (current - 1) >= self.num_requests:
+            # Rejected requests don't count.
+            self.decrement(current_key)
+            self.wait_seconds = self.get_wait(previous, current - 1, elapsed)
+            return self.throttle_failure()
+
+        return True
+
+    def increment(self, key):
+        # Counters outlive their own window so they can act as `previous` in the next one.
+        if self.cache.add(key, 1, self.duration * 2):
+            return 1
+
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, 1, self.duration * 2)
+            return 1
+
+    def decrement(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+    def get_wait(self, previous, current, elapsed):
+        if current >= self.num_requests:
+            # Only the next window can bring the estimate below the limit,
+            # once enough of this window's requests have slid out of it.
+            remaining = self.duration - elapsed
+            return remaining + self.duration * (1 - self.num_requests / current)
+
+        wait = self.duration * (1 - (self.num_requests - current) / previous) - elapsed
+        return max(wait, 0)
+
+    def wait(self):
+        return getattr(self, "wait_seconds", None)
+
+
+class MinuteRateThrottle(SlidingWindowRateThrottle):
     scope = "user_minute"
 
 
-class DailyRateThrottle(UserRateThrottle):
+class DailyRateThrottle(SlidingWindowRateThrottle):
     scope = "user_day"
@@ -1,9 +1,26 @@
-from drf_spectacular.utils import extend_schema
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import filters, generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from shopping_list.api.pagination import LargerResultsSetPagination
+from shopping_list import export, membership
+from shopping_list.api.conditional import ConditionalGetMixin
+from shopping_list.api.filters import FullTextSearchFilter
+from shopping_list.api.importer import ShoppingDataImport
+from shopping_list.api.pagination import (
+    DeltaSyncPagination,
+    KeysetPaginationMixin,
+    LargerResultsSetPagination,
+    SearchKeysetPagination,
+    ShoppingItemKeysetPagination,
+    ShoppingListKeysetPagination,
+)
+from shopping_list.api.parsers import NDJSONParser
 from shopping_list.api.permissions import (
     AllShoppingItemsShoppingListMembersOnly,
     ShoppingItemShoppingListMembersOnly,
@@ -11,18 +28,28 @@ from shopping_list.api.permissions import (
 )
 from shopping_list.api.serializers import (
     AddMemberSerializer,
+    ChangesSerializer,
+    ExportParametersSerializer,
+    ImportParametersSerializer,
+    ImportReportSerializer,
     RemoveMemberSerializer,
+    ShoppingItemChangeSerializer,
     ShoppingItemSerializer,
     ShoppingListSerializer,
+    TombstoneSerializer,
+    ValuesPlan,
 )
-from shopping_list.models import ShoppingItem, ShoppingList
+from shopping_list.models import ListJoin, ShoppingItem, ShoppingList, Tombstone
+from shopping_list.response_cache import shopping_lists_cache
 
 
 @extend_schema(
     summary="List all the shopping lists.",
     description="Returns the list of all shopping lists user is a member of. Each shopping list includes a few unpurchased shopping items. Users can add a new shopping list.",
 )
-class ListAddShoppingList(generics.ListCreateAPIView):
+class ListAddShoppingList(
+    ConditionalGetMixin, KeysetPaginationMixin, generics.ListCreateAPIView
+):
     """
     Returns the list of all shopping lists user is a member of. Each shopping list includes a few unpurchased shopping items.
     Users can add a new shopping list.
@@ -30,6 +57,7 @@ class ListAddShoppingList(generics.ListCreateAPIView):
 
     queryset = ShoppingList.objects.all()
     serializer_class = ShoppingListSerializer
+    keyset_pagination_class = ShoppingListKeysetPagination
 
     def perform_create(self, serializer):
 
@@ -37,19 +65,81 @@ class ListAddShoppingList(generics.ListCreateAPIView):
         shopping_list.members.add(self.request.user)
         return shopping_list
 
+    def get_conditional_state(self):
+        state = ShoppingList.objects.filter(members=self.request.user).aggregate(
+            last_modified=Max("last_interaction"), count=Count("pk")
+        )
+        return state["last_modified"], state["count"]
+
+    def list(self, request, *args, **kwargs):
+        def build_response_data():
+            return super(ListAddShoppingList, self).list(request, *args, **kwargs).data
+
+        data, hit = shopping_lists_cache.get_or_set(
+            request.user.pk, request.get_full_path(), build_response_data
+        )
+
+        return Response(data, headers={"X-Cache": "HIT" if hit else "MISS"})
+
     def get_queryset(self):
-        return ShoppingList.objects.filter(members=self.request.user).order_by(
+        queryset = ShoppingList.objects.filter(members=self.request.user).order_by(
             "-last_interaction"
         )
 
+        return self.get_serializer_class().setup_eager_loading(queryset)
 
-class ShoppingListDetail(generics.RetrieveUpdateDestroyAPIView):
+
+class ShoppingListDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ShoppingList.objects.all()
     serializer_class = ShoppingListSerializer
     permission_classes = [ShoppingListMembersOnly]
 
+    def get_conditional_state(self):
+        queryset = ShoppingList.objects.filter(pk=self.kwargs["pk"])
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(members=self.request.user)
+
+        last_modified = queryset.values_list("last_interaction", flat=True).first()
+        if last_modified is None:
+            return None
+
+        return last_modified, None
+
+
+class ShoppingListScopedMixin:
+    # Resolves the shopping list from the URL together with the requesting user's membership,
+    # in one query, and attaches it to the items created through the view.
+
+    def get_shopping_list(self):
+        if not hasattr(self, "_shopping_list"):
+            queryset = membership.annotate_membership(
+                ShoppingList.objects.all(), self.request.user
+            )
+            self._shopping_list = get_object_or_404(queryset, pk=self.kwargs["pk"])
+
+        return self._shopping_list
 
-class AddShoppingItem(generics.CreateAPIView):
+    def perform_create(self, serializer):
+        serializer.save(shopping_list=self.get_shopping_list())
+
+
+class ValuesListMixin:
+    # Lists `.values()` rows serialized by the ValuesPlan of the serializer class,
+    # instead of model instances through the serializer. Everything else, including
+    # writes and the schema, still goes through the serializer.
+
+    def list(self, request, *args, **kwargs):
+        plan = ValuesPlan.for_serializer(self.get_serializer_class())
+        queryset = plan.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.serialize(page))
+
+        return Response(plan.serialize(queryset))
+
+
+class AddShoppingItem(ShoppingListScopedMixin, generics.CreateAPIView):
     queryset = ShoppingItem.objects.all()
     serializer_class = ShoppingItemSerializer
     permission_classes = [AllShoppingItemsShoppingListMembersOnly]
@@ -61,14 +151,37 @@ class ShoppingItemDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [ShoppingItemShoppingListMembersOnly]
     lookup_url_kwarg = "item_pk"
 
+    def get_queryset(self):
+        queryset = ShoppingItem.objects.filter(shopping_list_id=self.kwargs["pk"])
+
+        return membership.annotate_membership(
+            queryset, self.request.user, shopping_list_field="shopping_list_id"
+        )
 
-class ListAddShoppingItem(generics.ListCreateAPIView):
+
+class ListAddShoppingItem(
+    ConditionalGetMixin,
+    ShoppingListScopedMixin,
+    KeysetPaginationMixin,
+    ValuesListMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = ShoppingItemSerializer
     permission_classes = [AllShoppingItemsShoppingListMembersOnly]
     pagination_class = LargerResultsSetPagination
+    keyset_pagination_class = ShoppingItemKeysetPagination
     filter_backends = (filters.OrderingFilter,)
     ordering_fields = ["name", "purchased"]
 
+    def get_conditional_state(self):
+        return self.get_shopping_list().last_interaction, None
+
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get("data"), list):
+            kwargs["many"] = True
+
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
         shopping_list = self.kwargs["pk"]
         queryset = ShoppingItem.objects.filter(shopping_list=shopping_list).order_by(
@@ -110,13 +223,131 @@ class ShoppingListRemoveMembers(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SearchShoppingItems(generics.ListAPIView):
+class SearchShoppingItems(KeysetPaginationMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = ShoppingItemSerializer
+    keyset_pagination_class = SearchKeysetPagination
     search_fields = ["name"]
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (FullTextSearchFilter,)
 
     def get_queryset(self):
         users_shopping_lists = ShoppingList.objects.filter(members=self.request.user)
         queryset = ShoppingItem.objects.filter(shopping_list__in=users_shopping_lists)
 
         return queryset
+
+
+class ShoppingItemChanges(APIView):
+    """
+    Returns the shopping items created or updated, and the items and lists deleted,
+    since the `since` token of the previous sync. Without a token everything is returned.
+    Keep calling with the returned token while `has_more` is true. When `reset` is
+    true the token had expired, so everything is returned and local data not in it
+    should be dropped.
+    """
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(DeltaSyncPagination.token_query_param, str),
+            OpenApiParameter(DeltaSyncPagination.page_size_query_param, int),
+        ],
+        responses=ChangesSerializer,
+    )
+    def get(self, request, format=None):
+        paginator = DeltaSyncPagination(request)
+        shopping_lists = ShoppingList.objects.filter(members=request.user)
+        joins = ListJoin.objects.filter(recipient_id=request.user.pk)
+
+        # Items of a list the user joined are sent as of the join, in full.
+        joined_at = (
+            joins.filter(shopping_list_id=OuterRef("shopping_list_id"))
+            .order_by("-joined_at")
+            .values("joined_at")[:1]
+        )
+        shopping_items = paginator.paginate_stream(
+            "items",
+            ShoppingItem.objects.filter(shopping_list__in=shopping_lists).annotate(
+                synced_at=Greatest(
+                    "updated_at", Coalesce(Subquery(joined_at), "updated_at")
+                )
+            ),
+            "synced_at",
+            changed_since=lambda timestamp: Q(updated_at__gte=timestamp)
+            | Q(
+                shopping_list_id__in=joins.filter(joined_at__gte=timestamp).values(
+                    "shopping_list_id"
+                )
+            ),
+        )
+        # A list the user left or lost is dropped, unless they are a member again.
+        tombstones = paginator.paginate_stream(
+            "deleted",
+            Tombstone.objects.filter(
+                Q(object_type=Tombstone.ITEM, shopping_list_id__in=shopping_lists)
+                | Q(object_type=Tombstone.LIST, recipient_id=request.user.pk)
+                & ~Q(shopping_list_id__in=shopping_lists)
+            ),
+            "deleted_at",
+        )
+
+        return Response(
+            {
+                "items": ShoppingItemChangeSerializer(shopping_items, many=True).data,
+                "deleted": TombstoneSerializer(tombstones, many=True).data,
+                "token": paginator.get_token(),
+                "has_more": paginator.has_more,
+                "reset": paginator.reset,
+            }
+        )
+
+
+class ExportShoppingData(APIView):
+    """
+    Streams every shopping list the user is a member of, their members and their
+    items, as NDJSON or CSV, optionally gzipped.
+    """
+
+    @extend_schema(
+        parameters=[ExportParametersSerializer], responses=OpenApiTypes.BINARY
+    )
+    def get(self, request, format=None):
+        parameters = ExportParametersSerializer(data=request.query_params)
+        parameters.is_valid(raise_exception=True)
+        file_format = parameters.validated_data["file_format"]
+        compression = parameters.validated_data.get("compression")
+
+        filename = f"shopping-lists.{file_format}"
+        content_type = export.CONTENT_TYPES[file_format]
+        if compression == "gzip":
+            filename += ".gz"
+            content_type = "application/gzip"
+
+        return StreamingHttpResponse(
+            export.export(request.user, file_format, compression),
+            content_type=content_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+
+class ImportShoppingData(APIView):
+    """
+    Imports shopping lists, members and items from an NDJSON body, one record
+    per line in the format of the export. The body is parsed as it is read and
+    written in batches. Invalid lines are skipped and reported by line number.
+    Member records are only imported with `members=true`.
+    """
+
+    parser_classes = [NDJSONParser]
+
+    @extend_schema(
+        parameters=[ImportParametersSerializer],
+        request=OpenApiTypes.BINARY,
+        responses=ImportReportSerializer,
+    )
+    def post(self, request, format=None):
+        parameters = ImportParametersSerializer(data=request.query_params)
+        parameters.is_valid(raise_exception=True)
+        report = ShoppingDataImport(
+            request.user, members=parameters.validated_data["members"]
+        ).run(request.data)
+
+        return Response(report)
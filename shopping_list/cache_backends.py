@@ -0,0 +1,383 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+MAGIC = b"SLCACHE1"
+FILE_HEADER = struct.Struct("<8sIII")
+FILE_HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<16sdIBB")
+SLOT_HEADER_SIZE = 32
+
+EMPTY, USED = 0, 1
+
+
+class SharedMemoryTable:
+    """
+    Fixed-size, set-associative hash table in a memory-mapped file.
+
+    Every key hashes to a set of `ways` slots. Each set is guarded by a
+    byte-range lock on the file (between processes) and a striped thread
+    lock (within a process). When a set is full, a per-set clock hand
+    evicts the first slot whose reference bit is clear.
+    """
+
+    thread_lock_stripes = 64
+
+    def __init__(self, path, slots, slot_size, ways):
+        self.path = path
+        self.ways = ways
+        self.sets = max(slots // ways, 1)
+        self.slot_size = slot_size
+        self.capacity = slot_size - SLOT_HEADER_SIZE
+        self.hands_offset = FILE_HEADER_SIZE
+        self.slots_offset = FILE_HEADER_SIZE + self.sets
+        self.size = self.slots_offset + self.sets * self.ways * self.slot_size
+        self.thread_locks = [threading.Lock() for _ in range(self.thread_lock_stripes)]
+        self.pid = os.getpid()
+        self.open()
+
+    def open(self):
+        # Values are unpickled, so a file anyone else could have written to
+        # would let them run code in this process.
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            stat = os.fstat(self.fd)
+            if stat.st_uid != os.geteuid() or stat.st_mode & 0o022:
+                raise ImproperlyConfigured(
+                    f"The cache file {self.path} must be owned and only be "
+                    "writable by the user running the server."
+                )
+            header = FILE_HEADER.pack(MAGIC, self.sets, self.ways, self.slot_size)
+            size = stat.st_size
+            if size == 0:
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, header, 0)
+            elif size != self.size or os.pread(self.fd, FILE_HEADER.size, 0) != header:
+                # Other processes may have the file mapped, and resizing it
+                # under them kills them with SIGBUS on their next access.
+                raise ImproperlyConfigured(
+                    f"The cache file {self.path} has a different layout than "
+                    f"SLOTS={self.sets * self.ways}, SLOT_SIZE={self.slot_size} and "
+                    f"WAYS={self.ways}. Use another LOCATION, or remove the file "
+                    "once no process uses it."
+                )
+            self.map = mmap.mmap(self.fd, self.size)
+        except BaseException:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            raise
+        fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+    def lock(self, set_index):
+        return _SetLock(self, set_index)
+
+    def slot_offset(self, set_index, way):
+        return self.slots_offset + (set_index * self.ways + way) * self.slot_size
+
+    def read_slot(self, offset):
+        return SLOT_HEADER.unpack_from(self.map, offset)
+
+    def locate(self, digest):
+        return int.from_bytes(digest[:8], "little") % self.sets
+
+    def find(self, set_index, digest, now):
+        """
+        Returns the offset of the live slot holding `digest`, or None. Must hold the set lock.
+        """
+        for way in range(self.ways):
+            offset = self.slot_offset(set_index, way)
+            slot_digest, expires_at, _, state, _ = self.read_slot(offset)
+            if state != USED or slot_digest != digest:
+                continue
+            if expires_at and expires_at <= now:
+                self.map[offset + SLOT_HEADER.size - 2] = EMPTY
+                return None
+            return offset
+
+        return None
+
+    def victim(self, set_index, now):
+        """
+        Picks the slot to write a new key into. Must hold the set lock.
+        """
+        for way in range(self.ways):
+            offset = self.slot_offset(set_index, way)
+            _, expires_at, _, state, _ = self.read_slot(offset)
+            if state != USED or (expires_at and expires_at <= now):
+                return offset
+
+        hand_offset = self.hands_offset + set_index
+        hand = self.map[hand_offset] % self.ways
+        while True:
+            offset = self.slot_offset(set_index, hand)
+            hand = (hand + 1) % self.ways
+            if self.map[offset + SLOT_HEADER.size - 1]:
+                self.map[offset + SLOT_HEADER.size - 1] = 0
+                continue
+
+            self.map[hand_offset] = hand
+            return offset
+
+    def read(self, offset):
+        _, _, length, _, _ = self.read_slot(offset)
+        self.map[offset + SLOT_HEADER.size - 1] = 1
+        start = offset + SLOT_HEADER_SIZE
+        return self.map[start : start + length]
+
+    def write(self, offset, digest, payload, expires_at):
+        start = offset + SLOT_HEADER_SIZE
+        self.map[start : start + len(payload)] = payload
+        SLOT_HEADER.pack_into(
+            self.map, offset, digest, expires_at or 0.0, len(payload), USED, 1
+        )
+
+    def expire(self, offset, expires_at):
+        slot_digest, _, length, state, referenced = self.read_slot(offset)
+        SLOT_HEADER.pack_into(
+            self.map, offset, slot_digest, expires_at or 0.0, length, state, referenced
+        )
+
+    def remove(self, offset):
+        self.map[offset + SLOT_HEADER.size - 2] = EMPTY
+
+    def clear(self):
+        # Only the state byte of each slot has to be reset, not the whole file.
+        slots = self.sets * self.ways
+        with _TableLock(self):
+            self.map[self.slots_offset + SLOT_HEADER.size - 2 :: self.slot_size] = (
+                bytes(slots)
+            )
+
+
+class _SetLock:
+
+    def __init__(self, table, set_index):
+        self.table = table
+        self.set_index = set_index
+        self.thread_lock = table.thread_locks[set_index % len(table.thread_locks)]
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            fcntl.lockf(
+                self.table.fd,
+                fcntl.LOCK_EX,
+                1,
+                self.table.slots_offset + self.set_index,
+            )
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.lockf(
+                self.table.fd,
+                fcntl.LOCK_UN,
+                1,
+                self.table.slots_offset + self.set_index,
+            )
+        finally:
+            self.thread_lock.release()
+
+
+class _TableLock:
+
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        for thread_lock in self.table.thread_locks:
+            thread_lock.acquire()
+        fcntl.lockf(self.table.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(self.table.fd, fcntl.LOCK_UN)
+        for thread_lock in reversed(self.table.thread_locks):
+            thread_lock.release()
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(path, slots, slot_size, ways):
+    # Django creates a cache instance per thread; every thread of a process
+    # shares one mapping, and a forked worker maps the file again.
+    key = (path, slots, slot_size, ways)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None or table.pid != os.getpid():
+            table = _tables[key] = SharedMemoryTable(path, slots, slot_size, ways)
+
+        return table
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    Cache shared by every process on the host through a memory-mapped file.
+
+        CACHES = {
+            "default": {
+                "BACKEND": "shopping_list.cache_backends.SharedMemoryCache",
+                "LOCATION": "/var/cache/shopping_list/cache",
+                "OPTIONS": {"SLOTS": 16384, "SLOT_SIZE": 4096, "WAYS": 8},
+            }
+        }
+
+    The file holds SLOTS * SLOT_SIZE bytes. Values that do not fit into a
+    slot once pickled are not cached, and `set` returns False for them.
+    `incr`/`decr` and `add` are atomic across processes. Every process
+    using a file must use the same options, and run as the user owning it.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.table = get_table(
+            location,
+            int(options.get("SLOTS", 16384)),
+            int(options.get("SLOT_SIZE", 4096)),
+            int(options.get("WAYS", 8)),
+        )
+
+    def digest(self, key, version):
+        key = self.make_and_validate_key(key, version=version)
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key, default=None, version=None):
+        digest = self.digest(key, version)
+        table = self.table
+        set_index = table.locate(digest)
+
+        with table.lock(set_index):
+            offset = table.find(set_index, digest, time.time())
+            if offset is None:
+                return default
+            payload = table.read(offset)
+
+        return pickle.loads(payload)
+
+    def _store(self, key, value, timeout, version, only_if_missing):
+        digest = self.digest(key, version)
+        payload = pickle.dumps(value, self.pickle_protocol)
+        expires_at = self.get_backend_timeout(timeout)
+        table = self.table
+        set_index = table.locate(digest)
+        now = time.time()
+
+        with table.lock(set_index):
+            offset = table.find(set_index, digest, now)
+            if offset is not None and only_if_missing:
+                return False
+            if len(payload) > table.capacity:
+                if offset is not None:
+                    table.remove(offset)
+                return False
+            if offset is None:
+                offset = table.victim(set_index, now)
+            table.write(offset, digest, payload, expires_at)
+
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(key, value, timeout, version, only_if_missing=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(key, value, timeout, version, only_if_missing=False)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        digest = self.digest(key, version)
+        table = self.table
+        set_index = table.locate(digest)
+
+        with table.lock(set_index):
+            offset = table.find(set_index, digest, time.time())
+            if offset is None:
+                return False
+            table.expire(offset, self.get_backend_timeout(timeout))
+
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        digest = self.digest(key, version)
+        table = self.table
+        set_index = table.locate(digest)
+
+        with table.lock(set_index):
+            offset = table.find(set_index, digest, time.time())
+            if offset is None:
+                raise ValueError("Key '%s' not found" % key)
+
+            _, expires_at, _, _, _ = table.read_slot(offset)
+            value = pickle.loads(table.read(offset)) + delta
+            payload = pickle.dumps(value, self.pickle_protocol)
+            if len(payload) > table.capacity:
+                table.remove(offset)
+            else:
+                table.write(offset, digest, payload, expires_at)
+
+        return value
+
+    def delete(self, key, version=None):
+        digest = self.digest(key, version)
+        table = self.table
+        set_index = table.locate(digest)
+
+        with table.lock(set_index):
+            offset = table.find(set_index, digest, time.time())
+            if offset is None:
+                return False
+            table.remove(offset)
+
+        return True
+
+    def has_key(self, key, version=None):
+        digest = self.digest(key, version)
+        table = self.table
+        set_index = table.locate(digest)
+
+        with table.lock(set_index):
+            return table.find(set_index, digest, time.time()) is not None
+
+    def clear(self):
+        self.table.clear()
+
+    # The table is plain memory, so the async API calls straight into the
+    # sync methods instead of hopping to a thread like BaseCache does.
+
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.add(key, value, timeout, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.set(key, value, timeout, version)
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.touch(key, timeout, version)
+
+    async def aincr(self, key, delta=1, version=None):
+        return self.incr(key, delta, version)
+
+    async def adelete(self, key, version=None):
+        return self.delete(key, version)
+
+    async def ahas_key(self, key, version=None):
+        return self.has_key(key, version)
+
+    async def aclear(self):
+        return self.clear()
@@ -0,0 +1,31 @@
+from django.conf import settings
+
+# Applied in this order: the busy timeout first, so that switching the journal
+# mode waits for other connections instead of failing.
+SQLITE_PRAGMAS = [
+    "busy_timeout",
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+]
+
+
+def get_sqlite_pragmas():
+    return getattr(settings, "SHOPPING_LIST_SQLITE_PRAGMAS", {})
+
+
+def configure_connection(connection):
+    """
+    Applies `SHOPPING_LIST_SQLITE_PRAGMAS` to a new SQLite connection. Other
+    databases are configured through `DATABASES` alone.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = get_sqlite_pragmas()
+    with connection.cursor() as cursor:
+        for name in SQLITE_PRAGMAS:
+            value = pragmas.get(name)
+            if value is not None:
+                cursor.execute(f"PRAGMA {name} = {value}")
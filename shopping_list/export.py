@@ -0,0 +1,112 @@
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from shopping_list.models import ShoppingItem, ShoppingList
+
+FIELDS = ["type", "id", "shopping_list", "name", "purchased", "updated_at"]
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+
+def records(user, chunk_size=CHUNK_SIZE):
+    """
+    Yields every shopping list `user` is a member of, then their members, then
+    their items, reading each with a server-side iterator.
+    """
+    shopping_lists = ShoppingList.objects.filter(members=user)
+    Membership = ShoppingList.members.through
+
+    for id, name, last_interaction in (
+        shopping_lists.order_by("pk")
+        .values_list("id", "name", "last_interaction")
+        .iterator(chunk_size)
+    ):
+        yield {"type": "list", "id": id, "name": name, "updated_at": last_interaction}
+
+    # Members are identified by username, as their IDs are local to this database.
+    for shopping_list, username in (
+        Membership.objects.filter(shoppinglist__in=shopping_lists.values("pk"))
+        .order_by("shoppinglist", "user")
+        .values_list("shoppinglist", "user__username")
+        .iterator(chunk_size)
+    ):
+        yield {"type": "member", "shopping_list": shopping_list, "name": username}
+
+    for id, shopping_list, name, purchased, updated_at in (
+        ShoppingItem.objects.filter(shopping_list__in=shopping_lists.values("pk"))
+        .order_by("shopping_list", "updated_at")
+        .values_list("id", "shopping_list", "name", "purchased", "updated_at")
+        .iterator(chunk_size)
+    ):
+        yield {
+            "type": "item",
+            "id": id,
+            "shopping_list": shopping_list,
+            "name": name,
+            "purchased": purchased,
+            "updated_at": updated_at,
+        }
+
+
+def ndjson_lines(records):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for record in records:
+        yield encoder.encode(record) + "\n"
+
+
+def csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def encoded(lines, buffer_size=BUFFER_SIZE):
+    """
+    Joins `lines` into UTF-8 chunks of about `buffer_size` bytes, so the response
+    is not written one row at a time.
+    """
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+
+    yield compressor.flush()
+
+
+def export(user, file_format="ndjson", compression=None):
+    """
+    Returns an iterator over the bytes of everything `user` can access, in
+    `file_format` and optionally gzipped, whose memory use does not grow with
+    the size of the account.
+    """
+    lines = {"ndjson": ndjson_lines, "csv": csv_lines}[file_format](records(user))
+    chunks = encoded(lines)
+    if compression == "gzip":
+        chunks = gzipped(chunks)
+
+    return chunks
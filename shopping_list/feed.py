@@ -0,0 +1,234 @@
+import asyncio
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Q
+from django.utils.module_loading import import_string
+
+from shopping_list.models import ChangeEvent, ShoppingList
+
+ITEM_CREATED = "item.created"
+ITEM_UPDATED = "item.updated"
+ITEM_DELETED = "item.deleted"
+LIST_UPDATED = "list.updated"
+LIST_DELETED = "list.deleted"
+MEMBER_ADDED = "member.added"
+MEMBER_REMOVED = "member.removed"
+
+
+def get_retention():
+    """Seconds for which events are kept to be replayed."""
+    return getattr(settings, "SHOPPING_LIST_EVENT_RETENTION", 7 * 24 * 60 * 60)
+
+
+def item_event(kind, shopping_item):
+    data = {"id": shopping_item.pk}
+    if kind != ITEM_DELETED:
+        data.update(name=shopping_item.name, purchased=shopping_item.purchased)
+
+    return ChangeEvent(
+        shopping_list_id=shopping_item.shopping_list_id, kind=kind, data=data
+    )
+
+
+def record(events, using=DEFAULT_DB_ALIAS):
+    """
+    Stores `events` in the current transaction and publishes them once it commits.
+    """
+    if len(events) == 1:
+        # A plain INSERT, as bulk_create opens a transaction of its own.
+        events[0].save(using=using)
+    else:
+        events = ChangeEvent.objects.using(using).bulk_create(events)
+    if events:
+        transaction.on_commit(lambda: get_broker().publish(events), using=using)
+
+    return events
+
+
+async def latest_event_id():
+    latest = await ChangeEvent.objects.aaggregate(latest=Max("id"))
+    return latest["latest"] or 0
+
+
+class InProcessEventBroker:
+    """
+    Fans committed events out to the change feeds open in this process.
+
+    Events written by other processes are only seen on replay, so deployments
+    with several workers should use PollingEventBroker.
+    """
+
+    batch_size = 500
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def publish(self, events):
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, events)
+            except RuntimeError:
+                # The loop of a dropped connection has already been closed.
+                pass
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    async def replay(self, after_id, user=None):
+        """
+        Yields the stored events after `after_id`, in batches, only those
+        concerning `user` if given.
+        """
+        queryset = ChangeEvent.objects.all()
+        if user is not None:
+            queryset = queryset.filter(
+                Q(
+                    shopping_list_id__in=ShoppingList.members.through.objects.filter(
+                        user_id=user.pk
+                    ).values("shoppinglist_id")
+                )
+                | Q(recipient_id=user.pk)
+            )
+
+        while True:
+            batch = queryset.filter(id__gt=after_id)[: self.batch_size]
+            events = [event async for event in batch]
+            if not events:
+                return
+            yield events
+            after_id = events[-1].id
+
+    async def listen(self, after_id=None, timeout=None, user=None):
+        """
+        Yields lists of events newer than `after_id` (by default, the latest stored
+        one), replaying stored events first, only those concerning `user` if given.
+        Live events are not filtered. Yields an empty list after `timeout` seconds
+        without events, so callers can send heartbeats.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        # Subscribe before reading the backlog, so nothing committed in between is missed.
+        self.subscribe(subscriber)
+        try:
+            if after_id is None:
+                after_id = await latest_event_id()
+            # Events can be published out of id order, so the live ones are told
+            # apart from the replayed ones by id, not by position.
+            replayed = set()
+            async for events in self.replay(after_id, user):
+                replayed.update(event.id for event in events)
+                yield events
+
+            queue = subscriber[1]
+            while True:
+                try:
+                    events = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield []
+                    continue
+
+                events = [
+                    event
+                    for event in events
+                    if event.id > after_id and event.id not in replayed
+                ]
+                if events:
+                    yield events
+        finally:
+            self.unsubscribe(subscriber)
+
+
+class PollingEventBroker(InProcessEventBroker):
+    """
+    Reads new events from the database every `SHOPPING_LIST_EVENT_POLL_INTERVAL`
+    seconds, so writes from every process reach every feed. One poller runs per
+    event loop while it has subscribers, however many feeds are open.
+
+    Ids are allocated before transactions commit, so an event can appear after
+    events with higher ids. The ids skipped by a poll are read again by the
+    following ones, for `SHOPPING_LIST_EVENT_GAP_WINDOW` seconds, after which
+    they are taken to belong to rolled back transactions.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pollers = {}
+
+    @property
+    def interval(self):
+        return getattr(settings, "SHOPPING_LIST_EVENT_POLL_INTERVAL", 1.0)
+
+    @property
+    def gap_window(self):
+        return getattr(settings, "SHOPPING_LIST_EVENT_GAP_WINDOW", 30)
+
+    def publish(self, events):
+        # Committed events are picked up from the database by the pollers.
+        pass
+
+    def subscribe(self, subscriber):
+        super().subscribe(subscriber)
+        loop = subscriber[0]
+        if loop not in self.pollers:
+            self.pollers[loop] = loop.create_task(self.poll(loop))
+
+    def has_subscribers(self, loop):
+        with self.lock:
+            return any(subscriber[0] is loop for subscriber in self.subscribers)
+
+    async def poll(self, loop):
+        try:
+            after_id = await latest_event_id()
+            # The ids below after_id not read yet, with when they were skipped.
+            gaps = {}
+            while self.has_subscribers(loop):
+                await asyncio.sleep(self.interval)
+                if gaps:
+                    events = [
+                        event async for event in ChangeEvent.objects.filter(id__in=gaps)
+                    ]
+                    for event in events:
+                        del gaps[event.id]
+                    if events:
+                        super().publish(events)
+
+                async for events in self.replay(after_id):
+                    now = time.monotonic()
+                    for event in events:
+                        gaps.update(dict.fromkeys(range(after_id + 1, event.id), now))
+                        after_id = event.id
+                    super().publish(events)
+
+                expired = time.monotonic() - self.gap_window
+                gaps = {
+                    id: skipped for id, skipped in gaps.items() if skipped > expired
+                }
+        finally:
+            del self.pollers[loop]
+
+
+@functools.cache
+def load_broker(path):
+    return import_string(path)()
+
+
+def get_broker():
+    return load_broker(
+        getattr(
+            settings,
+            "SHOPPING_LIST_EVENT_BROKER",
+            "shopping_list.feed.InProcessEventBroker",
+        )
+    )
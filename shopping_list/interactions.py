@@ -0,0 +1,100 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from shopping_list.models import ShoppingList
+
+_local = threading.local()
+
+# Sent with `shopping_list_ids` after their last_interaction has been bumped.
+shopping_lists_touched = Signal()
+
+
+class TouchBatch:
+    """
+    Shopping list IDs waiting for one `UPDATE ... SET last_interaction` on commit.
+
+    Every touch registers the flush again, as a rolled back savepoint drops the
+    callbacks registered inside it, and only the first flush to run writes.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.shopping_list_ids = set()
+        self.pending = True
+
+    def add(self, shopping_list_ids):
+        self.shopping_list_ids.update(shopping_list_ids)
+        transaction.on_commit(self.flush, using=self.using)
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.pending = False
+        if not self.shopping_list_ids:
+            return
+
+        ShoppingList.objects.using(self.using).filter(
+            pk__in=self.shopping_list_ids
+        ).update(last_interaction=timezone.now())
+        shopping_lists_touched.send(
+            sender=ShoppingList,
+            shopping_list_ids=self.shopping_list_ids,
+            using=self.using,
+        )
+
+
+def get_state(name):
+    if not hasattr(_local, name):
+        setattr(_local, name, {})
+
+    return getattr(_local, name)
+
+
+def touch(*shopping_list_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Bumps `last_interaction` of the given shopping lists.
+
+    The write is deferred until the current transaction commits (or happens
+    right away outside of one), and all touches until then share one UPDATE.
+    Inside `coalesce_touches()` they are held until the block ends.
+    """
+    held = get_state("held").get(using)
+    if held is not None:
+        held.update(shopping_list_ids)
+        return
+
+    batches = get_state("batches")
+    batch = batches.get(using)
+    # Outside a transaction, a batch still pending was rolled back with its own.
+    if (
+        batch is None
+        or not batch.pending
+        or not transaction.get_connection(using).in_atomic_block
+    ):
+        batch = batches[using] = TouchBatch(using)
+    batch.add(shopping_list_ids)
+
+
+@contextmanager
+def coalesce_touches(using=DEFAULT_DB_ALIAS):
+    """
+    Collapses every touch made inside the block, e.g. a whole request or
+    batch, into one write when the outermost block exits.
+    """
+    held = get_state("held")
+    if using in held:
+        yield
+        return
+
+    held[using] = set()
+    try:
+        yield
+    finally:
+        # Also when the block fails, for the writes it committed before that.
+        shopping_list_ids = held.pop(using)
+        if shopping_list_ids:
+            touch(*shopping_list_ids, using=using)
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from shopping_list import feed
+from shopping_list.api.pagination import get_sync_retention
+from shopping_list.models import ChangeEvent, ListJoin, Tombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the tombstones and list joins older than "
+        "SHOPPING_LIST_SYNC_RETENTION, and the change feed events older than "
+        "SHOPPING_LIST_EVENT_RETENTION. Clients with older sync tokens get a full sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        cutoff = timezone.now() - timedelta(seconds=get_sync_retention())
+
+        tombstones, _ = (
+            Tombstone.objects.using(using).filter(deleted_at__lt=cutoff).delete()
+        )
+        joins, _ = ListJoin.objects.using(using).filter(joined_at__lt=cutoff).delete()
+        events_cutoff = timezone.now() - timedelta(seconds=feed.get_retention())
+        events, _ = (
+            ChangeEvent.objects.using(using)
+            .filter(created_at__lt=events_cutoff)
+            .delete()
+        )
+
+        self.stdout.write(
+            f"Deleted {tombstones} tombstones and {joins} list joins older than "
+            f"{cutoff.isoformat()}, and {events} events older than "
+            f"{events_cutoff.isoformat()}."
+        )
@@ -0,0 +1,66 @@
+import dataclasses
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from shopping_list.models import User
+from shopping_list.seeding import SeedOptions, seed_shopping_data
+
+HELP = {
+    "seed": "Random seed; the same seed and options generate the same data.",
+    "users": "Number of users, each with an auth token.",
+    "lists": "Number of shopping lists.",
+    "items": "Total number of shopping items.",
+    "list_size_skew": "Pareto shape of the list sizes (lower is more skewed).",
+    "owner_skew": "Pareto shape of the number of lists per owner.",
+    "shared_fraction": "Fraction of lists shared with other users.",
+    "max_members": "Maximum number of extra members of a shared list.",
+    "vocabulary": "Number of distinct item names.",
+    "name_skew": "Zipf exponent of the item name frequencies.",
+    "purchased_fraction": "Fraction of purchased items.",
+    "password": "Password of every user (by default they cannot log in).",
+    "batch_size": "Rows per bulk insert and transaction.",
+}
+
+
+class Command(BaseCommand):
+    help = "Generates users, shopping lists, memberships, items and auth tokens."
+
+    def add_arguments(self, parser):
+        for field in dataclasses.fields(SeedOptions):
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}",
+                type=str if field.name == "password" else field.type,
+                default=field.default,
+                help=HELP[field.name],
+            )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        seed_options = SeedOptions(
+            **{
+                field.name: options[field.name]
+                for field in dataclasses.fields(SeedOptions)
+            }
+        )
+        using = options["database"]
+
+        if (
+            User.objects.using(using)
+            .filter(username__startswith=f"seed{seed_options.seed}-")
+            .exists()
+        ):
+            raise CommandError(
+                f"Data for seed {seed_options.seed} already exists, use another --seed."
+            )
+
+        started = time.perf_counter()
+        seed_shopping_data(
+            seed_options,
+            using=using,
+            log=lambda message: self.stdout.write(f"Created {message}"),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s.")
+        )
@@ -0,0 +1,169 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from shopping_list.models import ShoppingList
+
+CACHE_KEY_PREFIX = "shopping_list:membership"
+MEMBERS_CACHE_KEY_PREFIX = "shopping_list:members"
+TOO_MANY_LISTS = "*"
+
+
+def get_cache():
+    return caches[getattr(settings, "SHOPPING_LIST_MEMBERSHIP_CACHE", "default")]
+
+
+def get_max_cached_lists():
+    return getattr(settings, "SHOPPING_LIST_MEMBERSHIP_CACHE_MAX_LISTS", 1000)
+
+
+def get_timeout():
+    return getattr(settings, "SHOPPING_LIST_MEMBERSHIP_CACHE_TIMEOUT", 300)
+
+
+def cache_key(user_id):
+    return f"{CACHE_KEY_PREFIX}:{user_id}"
+
+
+def members_cache_key(shopping_list_id):
+    return f"{MEMBERS_CACHE_KEY_PREFIX}:{shopping_list_id}"
+
+
+def as_uuid(shopping_list_id):
+    if isinstance(shopping_list_id, uuid.UUID):
+        return shopping_list_id
+
+    return uuid.UUID(str(shopping_list_id))
+
+
+def load_shopping_list_ids(user_id):
+    max_cached_lists = get_max_cached_lists()
+    shopping_list_ids = list(
+        ShoppingList.members.through.objects.filter(user_id=user_id).values_list(
+            "shoppinglist_id", flat=True
+        )[: max_cached_lists + 1]
+    )
+    if len(shopping_list_ids) > max_cached_lists:
+        return TOO_MANY_LISTS
+
+    return frozenset(shopping_list_ids)
+
+
+def is_member(user, shopping_list_id):
+    """
+    Whether `user` is a member of the shopping list, answered from a per-user
+    cache of shopping list IDs. Users with more lists than the cache holds
+    fall back to a single EXISTS query.
+    """
+    try:
+        shopping_list_id = as_uuid(shopping_list_id)
+    except ValueError:
+        return False
+
+    cache = get_cache()
+    key = cache_key(user.pk)
+
+    shopping_list_ids = cache.get(key)
+    if shopping_list_ids is None:
+        shopping_list_ids = load_shopping_list_ids(user.pk)
+        # A backend that cannot hold the IDs (e.g. they do not fit into a slot
+        # of SharedMemoryCache) returns False, instead of None when it stored them.
+        if cache.set(key, shopping_list_ids, get_timeout()) is False:
+            shopping_list_ids = TOO_MANY_LISTS
+            cache.set(key, shopping_list_ids, get_timeout())
+
+    if shopping_list_ids == TOO_MANY_LISTS:
+        return ShoppingList.members.through.objects.filter(
+            user_id=user.pk, shoppinglist_id=shopping_list_id
+        ).exists()
+
+    return shopping_list_id in shopping_list_ids
+
+
+async def ais_member(user, shopping_list_id):
+    """
+    `is_member` for async code, which stays in the event loop when the IDs of
+    the user's shopping lists are cached.
+    """
+    shopping_list_ids = await get_cache().aget(cache_key(user.pk))
+    if shopping_list_ids is None or shopping_list_ids == TOO_MANY_LISTS:
+        return await sync_to_async(is_member)(user, shopping_list_id)
+
+    try:
+        return as_uuid(shopping_list_id) in shopping_list_ids
+    except ValueError:
+        return False
+
+
+def annotate_membership(queryset, user, shopping_list_field="pk"):
+    """
+    Adds an `is_member` flag to `queryset`, so an object and the requesting
+    user's access to it are resolved in the same query.
+    """
+    return queryset.annotate(
+        is_member=Exists(
+            ShoppingList.members.through.objects.filter(
+                shoppinglist_id=OuterRef(shopping_list_field), user_id=user.pk
+            )
+        )
+    )
+
+
+def invalidate(user_ids):
+    keys = [cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+
+    cache = get_cache()
+    cache.delete_many(keys)
+    # A request that read the old membership before this transaction commits
+    # could cache it again, so evict once more after commit.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_member_ids(shopping_list_ids):
+    """
+    The IDs of the members of the given shopping lists, answered from a
+    per-list cache, with the lists not in it loaded in one query.
+    """
+    keys = {
+        members_cache_key(shopping_list_id): shopping_list_id
+        for shopping_list_id in map(as_uuid, shopping_list_ids)
+    }
+    if not keys:
+        return set()
+
+    cache = get_cache()
+    cached = cache.get_many(list(keys))
+    member_ids = set().union(*cached.values())
+
+    missing = {keys[key]: set() for key in keys if key not in cached}
+    if missing:
+        for shopping_list_id, user_id in ShoppingList.members.through.objects.filter(
+            shoppinglist_id__in=missing
+        ).values_list("shoppinglist_id", "user_id"):
+            missing[shopping_list_id].add(user_id)
+        cache.set_many(
+            {
+                members_cache_key(shopping_list_id): frozenset(user_ids)
+                for shopping_list_id, user_ids in missing.items()
+            },
+            get_timeout(),
+        )
+        member_ids.update(*missing.values())
+
+    return member_ids
+
+
+def invalidate_members(shopping_list_ids):
+    keys = [members_cache_key(as_uuid(pk)) for pk in shopping_list_ids]
+    if not keys:
+        return
+
+    cache = get_cache()
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
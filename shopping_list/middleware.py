@@ -0,0 +1,104 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+from shopping_list.timing import RequestTimer
+
+logger = logging.getLogger("shopping_list.slow_requests")
+
+
+class ServerTimingMiddleware:
+    """
+    Counts the queries of every request and reports where its time went in a
+    `Server-Timing` header: database, serialization, authentication and total.
+
+    Requests slower than `SHOPPING_LIST_SLOW_REQUEST_MS` or running more than
+    `SHOPPING_LIST_SLOW_REQUEST_QUERIES` queries are logged with their most
+    repeated queries, which is how N+1 queries show up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = RequestTimer()
+        with timer.activate(), connection.execute_wrapper(timer):
+            response = self.get_response(request)
+
+        return self.process_response(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        with timer.activate(), connection.execute_wrapper(timer):
+            response = await self.get_response(request)
+
+        return self.process_response(request, response, timer)
+
+    @property
+    def slow_request_ms(self):
+        return getattr(settings, "SHOPPING_LIST_SLOW_REQUEST_MS", 500)
+
+    @property
+    def slow_request_queries(self):
+        return getattr(settings, "SHOPPING_LIST_SLOW_REQUEST_QUERIES", 50)
+
+    @property
+    def slow_request_fingerprints(self):
+        return getattr(settings, "SHOPPING_LIST_SLOW_REQUEST_FINGERPRINTS", 5)
+
+    def process_response(self, request, response, timer):
+        total_ms = timer.total_time * 1000
+        metrics = [
+            f'db;dur={timer.db_time * 1000:.1f};desc="{timer.queries} queries"',
+            *(
+                f"{name};dur={duration * 1000:.1f}"
+                for name, duration in timer.phases.items()
+            ),
+            f"total;dur={total_ms:.1f}",
+        ]
+        response["Server-Timing"] = ", ".join(metrics)
+
+        if (
+            total_ms >= self.slow_request_ms
+            or timer.queries >= self.slow_request_queries
+        ):
+            self.log_slow_request(request, response, timer, total_ms)
+
+        return response
+
+    def log_slow_request(self, request, response, timer, total_ms):
+        repeated = [
+            (count, sql)
+            for sql, count in timer.fingerprints.most_common(
+                self.slow_request_fingerprints
+            )
+            if count > 1
+        ]
+        logger.warning(
+            "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms%s",
+            request.method,
+            request.path,
+            response.status_code,
+            total_ms,
+            timer.queries,
+            timer.db_time * 1000,
+            "".join(f"\n  {count} x {sql}" for count, sql in repeated),
+            extra={
+                "status_code": response.status_code,
+                "request": request,
+                "duration_ms": total_ms,
+                "queries": timer.queries,
+                "db_ms": timer.db_time * 1000,
+                "repeated_queries": repeated,
+            },
+        )
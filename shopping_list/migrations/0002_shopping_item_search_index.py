@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# The search index shopping_list.search queries. The DDL is inlined, so that
+# this migration keeps working whatever becomes of that module.
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS shopping_list_shoppingitem_fts USING fts5("
+    "name, content='shopping_list_shoppingitem', content_rowid='rowid', "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS shopping_list_shoppingitem_fts_insert "
+    "AFTER INSERT ON shopping_list_shoppingitem BEGIN "
+    "INSERT INTO shopping_list_shoppingitem_fts(rowid, name) "
+    "VALUES (new.rowid, new.name); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS shopping_list_shoppingitem_fts_delete "
+    "AFTER DELETE ON shopping_list_shoppingitem BEGIN "
+    "INSERT INTO shopping_list_shoppingitem_fts(shopping_list_shoppingitem_fts, "
+    "rowid, name) VALUES ('delete', old.rowid, old.name); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS shopping_list_shoppingitem_fts_update "
+    "AFTER UPDATE OF name ON shopping_list_shoppingitem BEGIN "
+    "INSERT INTO shopping_list_shoppingitem_fts(shopping_list_shoppingitem_fts, "
+    "rowid, name) VALUES ('delete', old.rowid, old.name); "
+    "INSERT INTO shopping_list_shoppingitem_fts(rowid, name) "
+    "VALUES (new.rowid, new.name); "
+    "END",
+    "INSERT INTO shopping_list_shoppingitem_fts(shopping_list_shoppingitem_fts) "
+    "VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS shopping_list_shoppingitem_fts_insert",
+    "DROP TRIGGER IF EXISTS shopping_list_shoppingitem_fts_delete",
+    "DROP TRIGGER IF EXISTS shopping_list_shoppingitem_fts_update",
+    "DROP TABLE IF EXISTS shopping_list_shoppingitem_fts",
+]
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS shopping_item_name_trgm "
+    "ON shopping_list_shoppingitem USING gin (UPPER(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS shopping_item_name_tsv "
+    "ON shopping_list_shoppingitem USING gin "
+    "(to_tsvector('simple'::regconfig, COALESCE(name, '')))",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS shopping_item_name_tsv",
+    "DROP INDEX IF EXISTS shopping_item_name_trgm",
+]
+
+
+def run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def install_search_index(apps, schema_editor):
+    run(schema_editor, {"sqlite": SQLITE_INSTALL, "postgresql": POSTGRES_INSTALL})
+
+
+def uninstall_search_index(apps, schema_editor):
+    run(schema_editor, {"sqlite": SQLITE_UNINSTALL, "postgresql": POSTGRES_UNINSTALL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping_list", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.0.6 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+# Adding a column rebuilds the table on SQLite, which drops the FTS triggers of
+# 0002_shopping_item_search_index, so they are created again as they were there.
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS shopping_list_shoppingitem_fts_insert "
+    "AFTER INSERT ON shopping_list_shoppingitem BEGIN "
+    "INSERT INTO shopping_list_shoppingitem_fts(rowid, name) "
+    "VALUES (new.rowid, new.name); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS shopping_list_shoppingitem_fts_delete "
+    "AFTER DELETE ON shopping_list_shoppingitem BEGIN "
+    "INSERT INTO shopping_list_shoppingitem_fts(shopping_list_shoppingitem_fts, "
+    "rowid, name) VALUES ('delete', old.rowid, old.name); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS shopping_list_shoppingitem_fts_update "
+    "AFTER UPDATE OF name ON shopping_list_shoppingitem BEGIN "
+    "INSERT INTO shopping_list_shoppingitem_fts(shopping_list_shoppingitem_fts, "
+    "rowid, name) VALUES ('delete', old.rowid, old.name); "
+    "INSERT INTO shopping_list_shoppingitem_fts(rowid, name) "
+    "VALUES (new.rowid, new.name); "
+    "END",
+    "INSERT INTO shopping_list_shoppingitem_fts(shopping_list_shoppingitem_fts) "
+    "VALUES ('rebuild')",
+]
+
+
+def reinstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping_list", "0003_change_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "object_type",
+                    models.CharField(
+                        choices=[("item", "Shopping item"), ("list", "Shopping list")],
+                        max_length=4,
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+                ("shopping_list_id", models.UUIDField()),
+                ("recipient_id", models.BigIntegerField(blank=True, null=True)),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="shoppingitem",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="shoppingitem",
+            index=models.Index(
+                fields=["shopping_list", "updated_at"],
+                name="shopping_item_list_updated",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["shopping_list_id", "deleted_at"], name="tombstone_list_deleted"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["recipient_id", "deleted_at"],
+                name="tombstone_recipient_deleted",
+            ),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
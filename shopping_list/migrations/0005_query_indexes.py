@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping_list", "0004_delta_sync"),
+    ]
+
+    operations = [
+        # The through table's unique index leads with shoppinglist_id; this one
+        # answers "lists of user X" from the index alone.
+        migrations.RunSQL(
+            "CREATE INDEX shopping_list_members_user_list "
+            "ON shopping_list_shoppinglist_members (user_id, shoppinglist_id)",
+            "DROP INDEX shopping_list_members_user_list",
+        ),
+        migrations.AddIndex(
+            model_name="shoppingitem",
+            index=models.Index(
+                fields=["shopping_list", "purchased"], name="shopping_item_list_state"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shoppingitem",
+            index=models.Index(
+                fields=["shopping_list", "name", "purchased"],
+                name="shopping_item_list_name",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shoppinglist",
+            index=models.Index(
+                fields=["-last_interaction", "id"], name="shopping_list_recent"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-17 01:23
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def purchase_duplicate_unpurchased_items(apps, schema_editor):
+    """
+    Leaves one of each group of unpurchased items sharing a name on a list
+    unpurchased, and marks the others purchased, so no item is lost. Migration
+    0004 gave existing items the same `updated_at`, so which one stays is arbitrary.
+    """
+    ShoppingItem = apps.get_model("shopping_list", "ShoppingItem")
+    shopping_items = ShoppingItem.objects.using(schema_editor.connection.alias)
+
+    duplicates = list(
+        shopping_items.filter(purchased=False)
+        .values("shopping_list_id", "name")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        extra_ids = list(
+            shopping_items.filter(
+                shopping_list_id=duplicate["shopping_list_id"],
+                name=duplicate["name"],
+                purchased=False,
+            )
+            .order_by("updated_at", "id")
+            .values_list("id", flat=True)[1:]
+        )
+        # update() skips auto_now, which delta sync needs to send the change.
+        shopping_items.filter(id__in=extra_ids).update(
+            purchased=True, updated_at=timezone.now()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping_list", "0005_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            purchase_duplicate_unpurchased_items, migrations.RunPython.noop
+        ),
+        migrations.RemoveIndex(
+            model_name="shoppingitem",
+            name="shopping_item_list_name",
+        ),
+        migrations.AddConstraint(
+            model_name="shoppingitem",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("purchased", False)),
+                fields=("shopping_list", "name"),
+                name="unique_unpurchased_item_name",
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping_list", "0006_unique_unpurchased_item_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListJoin",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shopping_list_id", models.UUIDField()),
+                ("recipient_id", models.BigIntegerField()),
+                ("joined_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(fields=["deleted_at"], name="tombstone_deleted"),
+        ),
+        migrations.AddIndex(
+            model_name="listjoin",
+            index=models.Index(
+                fields=["recipient_id", "shopping_list_id", "joined_at"],
+                name="list_join_recipient_list",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listjoin",
+            index=models.Index(fields=["joined_at"], name="list_join_joined"),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping_list", "0007_sync_membership_changes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="changeevent",
+            index=models.Index(
+                fields=["shopping_list_id", "id"], name="change_event_list_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="changeevent",
+            index=models.Index(
+                fields=["recipient_id", "id"], name="change_event_recipient"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="changeevent",
+            index=models.Index(fields=["created_at"], name="change_event_created"),
+        ),
+    ]
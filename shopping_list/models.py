@@ -2,6 +2,7 @@ import uuid
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -16,10 +17,20 @@ class ShoppingList(models.Model):
     members = models.ManyToManyField(settings.AUTH_USER_MODEL)
     last_interaction = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-last_interaction", "id"], name="shopping_list_recent"
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
+UNIQUE_UNPURCHASED_ITEM_NAME = "unique_unpurchased_item_name"
+
+
 class ShoppingItem(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -28,7 +39,110 @@ class ShoppingItem(models.Model):
     shopping_list = models.ForeignKey(
         ShoppingList, on_delete=models.CASCADE, related_name="shopping_items"
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["shopping_list", "updated_at"],
+                name="shopping_item_list_updated",
+            ),
+            # Items of a list by state (in insertion order within each state).
+            models.Index(
+                fields=["shopping_list", "purchased"], name="shopping_item_list_state"
+            ),
+        ]
+        constraints = [
+            # Also serves the unpurchased preview, which is ordered by name.
+            models.UniqueConstraint(
+                fields=["shopping_list", "name"],
+                condition=models.Q(purchased=False),
+                name=UNIQUE_UNPURCHASED_ITEM_NAME,
+            ),
+        ]
 
     def __str__(self):
 
         return f"{self.name}"
+
+
+class Tombstone(models.Model):
+    """
+    Marks a deleted shopping item or list, so delta sync can tell clients to drop it.
+    List tombstones are kept per former member, as membership goes with the list.
+    """
+
+    ITEM = "item"
+    LIST = "list"
+    OBJECT_TYPES = [(ITEM, "Shopping item"), (LIST, "Shopping list")]
+
+    object_type = models.CharField(max_length=4, choices=OBJECT_TYPES)
+    object_id = models.UUIDField()
+    shopping_list_id = models.UUIDField()
+    recipient_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["shopping_list_id", "deleted_at"],
+                name="tombstone_list_deleted",
+            ),
+            models.Index(
+                fields=["recipient_id", "deleted_at"],
+                name="tombstone_recipient_deleted",
+            ),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted"),
+        ]
+
+    def __str__(self):
+        return f"{self.object_type} {self.object_id}"
+
+
+class ListJoin(models.Model):
+    """
+    Marks that a user became a member of a shopping list, so delta sync sends
+    them the items of the list that changed before they joined.
+    """
+
+    shopping_list_id = models.UUIDField()
+    recipient_id = models.BigIntegerField()
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["recipient_id", "shopping_list_id", "joined_at"],
+                name="list_join_recipient_list",
+            ),
+            models.Index(fields=["joined_at"], name="list_join_joined"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id} {self.shopping_list_id}"
+
+
+class ChangeEvent(models.Model):
+    """
+    Append-only log of changes to shopping lists, streamed to their members by the change feed.
+    `recipient_id` is set when the event also concerns a user who is not (or no longer) a member.
+    """
+
+    shopping_list_id = models.UUIDField(db_index=True)
+    recipient_id = models.BigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=32)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["shopping_list_id", "id"], name="change_event_list_id"
+            ),
+            models.Index(fields=["recipient_id", "id"], name="change_event_recipient"),
+            models.Index(fields=["created_at"], name="change_event_created"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.shopping_list_id}"
@@ -1,11 +1,176 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
 
-from shopping_list.models import ShoppingItem, ShoppingList
+from shopping_list import database, feed, interactions, membership
+from shopping_list.api.authentication import token_cache
+from shopping_list.models import (
+    ChangeEvent,
+    ListJoin,
+    ShoppingItem,
+    ShoppingList,
+    Tombstone,
+    User,
+)
+from shopping_list.response_cache import shopping_lists_cache
+
+
+def get_member_ids(shopping_list_ids):
+    # Membership changes read the database, as the member cache is evicted by them.
+    return set(
+        ShoppingList.members.through.objects.filter(
+            shoppinglist_id__in=shopping_list_ids
+        ).values_list("user_id", flat=True)
+    )
 
 
 @receiver(post_save, sender=ShoppingItem)
+@receiver(post_delete, sender=ShoppingItem)
 def interaction_with_shopping_list(sender, instance, **kwargs):
-    ShoppingList.objects.get(id=instance.shopping_list.id).save(
-        update_fields=["last_interaction"]
+    interactions.touch(instance.shopping_list_id)
+
+
+@receiver(post_save, sender=ShoppingItem)
+def shopping_item_saved(sender, instance, created, **kwargs):
+    kind = feed.ITEM_CREATED if created else feed.ITEM_UPDATED
+    feed.record([feed.item_event(kind, instance)])
+
+
+@receiver(post_delete, sender=ShoppingItem)
+def shopping_item_deleted(sender, instance, origin=None, **kwargs):
+    # Items deleted along with their list are covered by the list's own tombstones and events.
+    if (
+        isinstance(origin, ShoppingList)
+        or getattr(origin, "model", None) is ShoppingList
+    ):
+        return
+
+    feed.record([feed.item_event(feed.ITEM_DELETED, instance)])
+    Tombstone.objects.create(
+        object_type=Tombstone.ITEM,
+        object_id=instance.pk,
+        shopping_list_id=instance.shopping_list_id,
     )
+
+
+@receiver(interactions.shopping_lists_touched)
+def shopping_lists_touched(sender, shopping_list_ids, **kwargs):
+    shopping_lists_cache.bump(membership.get_member_ids(shopping_list_ids))
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_saved(sender, instance, created, **kwargs):
+    if not created:
+        shopping_lists_cache.bump(membership.get_member_ids([instance.pk]))
+        feed.record(
+            [
+                ChangeEvent(
+                    shopping_list_id=instance.pk,
+                    kind=feed.LIST_UPDATED,
+                    data={"name": instance.name},
+                )
+            ]
+        )
+
+
+@receiver(m2m_changed, sender=ShoppingList.members.through)
+def shopping_list_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        user_ids = {instance.pk}
+        if pk_set is None:
+            pk_set = set(instance.shoppinglist_set.values_list("pk", flat=True))
+        member_ids = get_member_ids(pk_set)
+        changes = [(shopping_list_id, instance.pk) for shopping_list_id in pk_set]
+    else:
+        member_ids = get_member_ids([instance.pk])
+        user_ids = member_ids if pk_set is None else set(pk_set)
+        changes = [(instance.pk, user_id) for user_id in user_ids]
+
+    membership.invalidate(user_ids)
+    membership.invalidate_members(pk_set if reverse else [instance.pk])
+    # Every member of a changed list sees the new member list in the overview.
+    shopping_lists_cache.bump(user_ids | member_ids)
+
+    # Delta sync sends a joined list's items in full, and drops a left list.
+    if action == "post_add":
+        ListJoin.objects.bulk_create(
+            ListJoin(shopping_list_id=shopping_list_id, recipient_id=user_id)
+            for shopping_list_id, user_id in changes
+        )
+    else:
+        Tombstone.objects.bulk_create(
+            Tombstone(
+                object_type=Tombstone.LIST,
+                object_id=shopping_list_id,
+                shopping_list_id=shopping_list_id,
+                recipient_id=user_id,
+            )
+            for shopping_list_id, user_id in changes
+        )
+
+    kind = feed.MEMBER_ADDED if action == "post_add" else feed.MEMBER_REMOVED
+    feed.record(
+        [
+            ChangeEvent(
+                shopping_list_id=shopping_list_id,
+                recipient_id=user_id,
+                kind=kind,
+                data={"user": user_id},
+            )
+            for shopping_list_id, user_id in changes
+        ]
+    )
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    user_ids = get_member_ids([instance.pk])
+
+    membership.invalidate(user_ids)
+    membership.invalidate_members([instance.pk])
+    shopping_lists_cache.bump(user_ids)
+    # Nobody is a member once the list is gone, so each member gets their own event.
+    feed.record(
+        [
+            ChangeEvent(
+                shopping_list_id=instance.pk,
+                recipient_id=user_id,
+                kind=feed.LIST_DELETED,
+            )
+            for user_id in user_ids
+        ]
+    )
+    Tombstone.objects.bulk_create(
+        Tombstone(
+            object_type=Tombstone.LIST,
+            object_id=instance.pk,
+            shopping_list_id=instance.pk,
+            recipient_id=user_id,
+        )
+        for user_id in user_ids
+    )
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+
+    token_cache.invalidate(
+        Token.objects.filter(user=instance).values_list("key", flat=True)
+    )
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    database.configure_connection(connection)
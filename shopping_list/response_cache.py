@@ -0,0 +1,104 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class VersionedResponseCache:
+    """
+    Read-through cache of response payloads, keyed per user and per user version.
+
+    Writes never look for keys to delete: they bump the version of every
+    affected user once they commit, which orphans that user's entries until
+    they expire. When an entry is missing, one caller rebuilds it while the
+    others wait for it for up to `lock_wait` seconds instead of all hitting
+    the database.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "SHOPPING_LIST_RESPONSE_CACHE", "default")]
+
+    @property
+    def timeout(self):
+        return getattr(settings, "SHOPPING_LIST_RESPONSE_CACHE_TIMEOUT", 300)
+
+    @property
+    def lock_timeout(self):
+        return getattr(settings, "SHOPPING_LIST_RESPONSE_CACHE_LOCK_TIMEOUT", 10)
+
+    @property
+    def lock_wait(self):
+        return getattr(settings, "SHOPPING_LIST_RESPONSE_CACHE_LOCK_WAIT", 2)
+
+    poll_interval = 0.02
+
+    def version_key(self, user_id):
+        return f"{self.namespace}:version:{user_id}"
+
+    def entry_key(self, user_id, version, request_key):
+        digest = hashlib.sha256(request_key.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:entry:{user_id}:{version}:{digest}"
+
+    def get_version(self, user_id):
+        key = self.version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, uuid.uuid4().hex, None)
+            version = self.cache.get(key)
+
+        return version
+
+    def bump(self, user_ids):
+        """
+        Bumps the versions of `user_ids` once the current transaction commits,
+        as entries built from the data before that would be stored under the
+        new versions otherwise.
+        """
+        versions = {
+            self.version_key(user_id): uuid.uuid4().hex for user_id in set(user_ids)
+        }
+        if versions:
+            transaction.on_commit(lambda: self.cache.set_many(versions, None))
+
+    def get_or_set(self, user_id, request_key, compute):
+        """
+        Returns `(value, hit)`, calling `compute()` to fill the entry on a miss.
+        """
+        cache = self.cache
+        key = self.entry_key(user_id, self.get_version(user_id), request_key)
+
+        value = cache.get(key)
+        if value is not None:
+            return value, True
+
+        lock_key = f"{key}:lock"
+        if not cache.add(lock_key, 1, self.lock_timeout):
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = cache.get(key)
+                if value is not None:
+                    return value, True
+                # The rebuild is over, but could not store its value.
+                if not cache.has_key(lock_key):
+                    break
+
+            return compute(), False
+
+        try:
+            value = compute()
+            cache.set(key, value, self.timeout)
+        finally:
+            cache.delete(lock_key)
+
+        return value, False
+
+
+shopping_lists_cache = VersionedResponseCache("shopping_list:shopping_lists")
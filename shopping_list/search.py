@@ -0,0 +1,130 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from shopping_list.models import ShoppingItem
+
+SHOPPING_ITEM_TABLE = ShoppingItem._meta.db_table
+SQLITE_FTS_TABLE = f"{SHOPPING_ITEM_TABLE}_fts"
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_words(term):
+    return WORD_RE.findall(term.lower())
+
+
+class BaseSearchBackend:
+    """
+    Filters a ShoppingItem queryset by a search term, annotates it with
+    `search_rank` (lower is better) and orders it best match first.
+    Every word of the term is matched as a prefix, and names containing the
+    whole term match too, ranked after them.
+    """
+
+    def search(self, queryset, term):
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    FTS5 external content table over shopping item names, kept in sync by
+    triggers (see migration 0002_shopping_item_search_index).
+
+    FTS5 only matches the start of words, so substrings are matched by scanning
+    the names of the queryset, as on other databases.
+    """
+
+    def match_expression(self, words):
+        return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+    def search(self, queryset, term):
+        words = search_words(term)
+        if not words:
+            return queryset.none()
+
+        match = self.match_expression(words)
+        matches = RawSQL(
+            f"{SHOPPING_ITEM_TABLE}.rowid IN "
+            f"(SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s)",
+            (match,),
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"(SELECT rank FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s "
+            f"AND rowid = {SHOPPING_ITEM_TABLE}.rowid)",
+            (match,),
+            output_field=FloatField(),
+        )
+
+        # bm25 ranks are negative, so names only containing the term come last.
+        return (
+            queryset.filter(matches | Q(name__icontains=term))
+            .annotate(search_rank=Coalesce(rank, 0.0))
+            .order_by("search_rank", "name", "id")
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Prefix tsquery over a `simple` tsvector expression index, plus a pg_trgm
+    index so substring matches stay indexed too (see migration
+    0002_shopping_item_search_index).
+    """
+
+    config = "simple"
+
+    def tsquery(self, words):
+        return " & ".join(
+            "'{}':*".format(word.replace("\\", "\\\\").replace("'", "''"))
+            for word in words
+        )
+
+    def search(self, queryset, term):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        words = search_words(term)
+        if not words:
+            return queryset.none()
+
+        vector = SearchVector("name", config=self.config)
+        query = SearchQuery(self.tsquery(words), config=self.config, search_type="raw")
+
+        return (
+            queryset.annotate(search_vector=vector)
+            .filter(Q(search_vector=query) | Q(name__icontains=term))
+            .annotate(search_rank=-SearchRank(vector, query))
+            .order_by("search_rank", "name", "id")
+        )
+
+
+class DefaultSearchBackend(BaseSearchBackend):
+
+    def search(self, queryset, term):
+        words = search_words(term)
+        if not words:
+            return queryset.none()
+
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word)
+
+        return (
+            queryset.filter(condition)
+            .annotate(search_rank=Value(0.0, output_field=FloatField()))
+            .order_by("name", "id")
+        )
+
+
+SEARCH_BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend(using="default"):
+    vendor = connections[using].vendor
+    return SEARCH_BACKENDS.get(vendor, DefaultSearchBackend)()
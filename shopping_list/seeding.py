@@ -0,0 +1,278 @@
+import functools
+import itertools
+import random
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from shopping_list.models import ShoppingItem, ShoppingList, User
+
+PRODUCTS = (
+    "milk bread eggs butter cheese apples bananas coffee tea rice pasta flour "
+    "sugar salt pepper onions potatoes tomatoes carrots lemons chicken beef fish "
+    "yogurt cereal honey jam oil vinegar soap shampoo toothpaste sponges foil"
+).split()
+VARIETIES = (
+    "organic fresh frozen whole large small smoked sliced dried spicy sweet "
+    "light dark red green wild"
+).split()
+
+
+@dataclass
+class SeedOptions:
+    """
+    Shape of a generated dataset. List sizes and the number of lists owned per
+    user follow Pareto distributions (lower `*_skew` means a heavier tail, and
+    None the same for every list or user), and item names are drawn from a Zipf
+    distribution over `vocabulary` names.
+    """
+
+    seed: int = 0
+    users: int = 1000
+    lists: int = 5000
+    items: int = 100_000
+    list_size_skew: float = 1.2
+    owner_skew: float = 1.5
+    shared_fraction: float = 0.1
+    max_members: int = 50
+    vocabulary: int = 5000
+    name_skew: float = 1.1
+    purchased_fraction: float = 0.4
+    password: str = None
+    batch_size: int = 5000
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def pareto_counts(rng, total, buckets, skew):
+    """
+    Splits `total` into `buckets` counts with Pareto distributed sizes, or
+    equal ones if `skew` is None.
+    """
+    if skew is None:
+        return [
+            total // buckets + (index < total % buckets) for index in range(buckets)
+        ]
+
+    weights = [rng.paretovariate(skew) for _ in range(buckets)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in rng.choices(range(buckets), weights=weights, k=total - sum(counts)):
+        counts[index] += 1
+
+    return counts
+
+
+def item_names(size):
+    """
+    Returns `size` distinct names, the most common products first.
+    """
+    names = list(PRODUCTS)
+    names += [f"{variety} {product}" for variety in VARIETIES for product in PRODUCTS]
+    names = names[:size]
+    for number in itertools.count(2):
+        if len(names) >= size:
+            return names
+        names += [f"{product} {number}" for product in PRODUCTS][: size - len(names)]
+
+
+class DatasetGenerator:
+    """
+    Generates users, shopping lists, memberships, items and auth tokens in
+    batches of bulk inserts, one transaction per batch, so memory stays flat
+    whatever the size. The same options and seed always generate the same rows,
+    except for the auth tokens, which are as random as any other.
+    """
+
+    sqlite_cache_kib = 512 * 1024
+
+    def __init__(self, options, using=DEFAULT_DB_ALIAS, log=None):
+        self.options = options
+        self.using = using
+        self.log = log or (lambda message: None)
+        self.rng = random.Random(options.seed)
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def insert(self, model, objects):
+        count = 0
+        for batch in batched(objects, self.options.batch_size):
+            with transaction.atomic(using=self.using):
+                model.objects.using(self.using).bulk_create(batch)
+            count += len(batch)
+
+        self.log(f"{count} {model._meta.verbose_name_plural}")
+        return count
+
+    def insert_values(self, model, field_names, rows):
+        """
+        Like `insert()` for rows of database values, without building a model
+        instance and compiling every field of every row, which dominates at
+        millions of rows.
+        """
+        connection = connections[self.using]
+        fields = [model._meta.get_field(name) for name in field_names]
+        quote_name = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote_name(model._meta.db_table),
+            ", ".join(quote_name(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)),
+        )
+
+        count = 0
+        for batch in batched(rows, self.options.batch_size):
+            with transaction.atomic(using=self.using), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            count += len(batch)
+
+        self.log(f"{count} {model._meta.verbose_name_plural}")
+        return count
+
+    def generate(self):
+        options = self.options
+        prefix = f"seed{options.seed}"
+        if options.password is None:
+            password = "!" + "%032x" % self.rng.getrandbits(128)
+        else:
+            password = make_password(options.password, salt=f"{prefix}salt")
+
+        self.insert(
+            User,
+            (
+                User(username=f"{prefix}-user-{index}", password=password)
+                for index in range(options.users)
+            ),
+        )
+        user_ids = list(
+            User.objects.using(self.using)
+            .filter(username__startswith=f"{prefix}-user-")
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        self.insert(
+            Token,
+            (Token(key=Token.generate_key(), user_id=user_id) for user_id in user_ids),
+        )
+
+        list_ids = [self.uuid() for _ in range(options.lists)]
+        self.insert(
+            ShoppingList,
+            (
+                ShoppingList(id=list_id, name=f"List {index}")
+                for index, list_id in enumerate(list_ids)
+            ),
+        )
+        self.insert(ShoppingList.members.through, self.memberships(user_ids, list_ids))
+
+        connection = connections[self.using]
+        # The search index stays in place and follows every insert, so the
+        # existing items can be searched while the new ones are loaded.
+        with self.bulk_load_settings(connection):
+            self.insert_values(
+                ShoppingItem,
+                ["id", "shopping_list", "name", "purchased", "updated_at"],
+                self.shopping_items(list_ids),
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        return user_ids, list_ids
+
+    @contextmanager
+    def bulk_load_settings(self, connection):
+        """
+        On SQLite, random UUID keys touch index pages all over the table, so the
+        indexes are kept in memory while inserting instead of being reread, and
+        batches are not synced to disk: an interrupted seed is rerun anyway.
+        """
+        if connection.vendor != "sqlite" or connection.in_atomic_block:
+            yield
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            (cache_size,) = cursor.fetchone()
+            cursor.execute("PRAGMA synchronous")
+            (synchronous,) = cursor.fetchone()
+            cursor.execute(f"PRAGMA cache_size = -{self.sqlite_cache_kib}")
+            cursor.execute("PRAGMA synchronous = OFF")
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA cache_size = {cache_size}")
+                cursor.execute(f"PRAGMA synchronous = {synchronous}")
+
+    def memberships(self, user_ids, list_ids):
+        options = self.options
+        Membership = ShoppingList.members.through
+        owned = pareto_counts(
+            self.rng, len(list_ids), len(user_ids), options.owner_skew
+        )
+        owners = [
+            user_id for user_id, count in zip(user_ids, owned) for _ in range(count)
+        ]
+
+        for owner_id, list_id in zip(owners, list_ids):
+            member_ids = {owner_id}
+            if self.rng.random() < options.shared_fraction:
+                members = min(
+                    int(self.rng.paretovariate(1.0)) + 1,
+                    options.max_members,
+                    len(user_ids),
+                )
+                member_ids.update(self.rng.sample(user_ids, members))
+
+            for member_id in sorted(member_ids):
+                yield Membership(shoppinglist_id=list_id, user_id=member_id)
+
+    def shopping_items(self, list_ids):
+        options = self.options
+        names = item_names(options.vocabulary)
+        cum_weights = list(
+            itertools.accumulate(
+                1 / rank**options.name_skew for rank in range(1, len(names) + 1)
+            )
+        )
+        sizes = pareto_counts(
+            self.rng, options.items, len(list_ids), options.list_size_skew
+        )
+        connection = connections[self.using]
+        fields = {
+            name: ShoppingItem._meta.get_field(name)
+            for name in ["id", "shopping_list", "updated_at"]
+        }
+        prepare_id = functools.partial(
+            fields["id"].get_db_prep_save, connection=connection
+        )
+        now = fields["updated_at"].get_db_prep_save(timezone.now(), connection)
+
+        for list_id, size in zip(list_ids, sizes):
+            list_id = fields["shopping_list"].get_db_prep_save(list_id, connection)
+            seen = {}
+            for name in self.rng.choices(names, cum_weights=cum_weights, k=size):
+                # Unpurchased names are unique per list, so repeats get a number.
+                seen[name] = seen.get(name, 0) + 1
+                if seen[name] > 1:
+                    name = f"{name} ({seen[name]})"
+                purchased = self.rng.random() < options.purchased_fraction
+                yield prepare_id(self.uuid()), list_id, name, purchased, now
+
+
+def seed_shopping_data(options, using=DEFAULT_DB_ALIAS, log=None):
+    """
+    Returns the IDs of the generated users and shopping lists, in the order
+    they were generated in.
+    """
+    return DatasetGenerator(options, using=using, log=log).generate()
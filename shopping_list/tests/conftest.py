@@ -1,6 +1,15 @@
+import re
+
 import pytest
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
 from rest_framework.test import APIClient
 
+from shopping_list import seeding
+from shopping_list.api.authentication import token_cache
 from shopping_list.models import ShoppingItem, ShoppingList, User
 
 
@@ -52,3 +61,71 @@ def create_shopping_list():
         return shopping_list
 
     return _create_shopping_list
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_caches(tmp_path_factory):
+    # Never touch the cache file of a server running on the same host.
+    default = {
+        **settings.CACHES["default"],
+        "LOCATION": str(tmp_path_factory.mktemp("cache") / "cache"),
+    }
+    with override_settings(CACHES={**settings.CACHES, "default": default}):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+    token_cache.clear()
+
+
+@pytest.fixture
+def seed_shopping_data():
+
+    def _seed_shopping_data(users=20, lists_per_user=5, items_per_list=40):
+        user_ids, list_ids = seeding.seed_shopping_data(
+            seeding.SeedOptions(
+                users=users,
+                lists=users * lists_per_user,
+                items=users * lists_per_user * items_per_list,
+                list_size_skew=None,
+                owner_skew=None,
+                shared_fraction=0,
+            )
+        )
+        shopping_lists = ShoppingList.objects.in_bulk(list_ids)
+
+        return (
+            list(User.objects.filter(pk__in=user_ids).order_by("pk")),
+            [shopping_lists[list_id] for list_id in list_ids],
+        )
+
+    return _seed_shopping_data
+
+
+FULL_SCAN_PATTERNS = {
+    # "SCAN table [USING INDEX ...]" visits every row, only "SEARCH" seeks.
+    "sqlite": re.compile(r"\bSCAN (\w+)\b"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+@pytest.fixture(scope="session")
+def assert_no_full_scan():
+
+    def _assert_no_full_scan(queryset):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            pytest.skip(f"No query plan check for {connection.vendor}")
+
+        tables = {
+            model._meta.db_table for model in apps.get_models(include_auto_created=True)
+        }
+        plan = queryset.explain()
+        scanned = set(pattern.findall(plan)) & tables
+
+        assert not scanned, f"Full scan of {', '.join(sorted(scanned))}:\n{plan}"
+
+    return _assert_no_full_scan
@@ -1,12 +1,54 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
 from unittest import mock
 
 import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-
-from shopping_list.models import ShoppingItem, ShoppingList, User
+from rest_framework.views import exception_handler
+
+from shopping_list import database, feed, interactions, membership, timing
+from shopping_list.api.authentication import TokenCache
+from shopping_list.api.importer import ShoppingDataImport
+from shopping_list.api.serializers import (
+    ShoppingItemChangeSerializer,
+    ShoppingItemSerializer,
+    ShoppingListSerializer,
+    ValuesPlan,
+)
+from shopping_list.api.throttling import SlidingWindowRateThrottle
+from shopping_list.cache_backends import SharedMemoryCache
+from shopping_list.models import (
+    ChangeEvent,
+    ListJoin,
+    ShoppingItem,
+    ShoppingList,
+    Tombstone,
+    User,
+)
+from shopping_list.response_cache import VersionedResponseCache
 
 
 @pytest.mark.django_db
@@ -576,7 +618,7 @@ def test_correct_order_shopping_lists(create_user, create_authenticated_client):
     assert response.data["results"][2]["name"] == "Oldest"
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 def test_shopping_lists_order_changed_when_item_marked_purchased(
     create_user, create_authenticated_client
 ):
@@ -921,3 +963,2006 @@ def test_order_shopping_items_purchased_and_names(
     assert response.data["results"][1]["name"] == "Dates"
     assert response.data["results"][2]["name"] == "Apples"
     assert response.data["results"][3]["name"] == "Coconut"
+
+
+@pytest.mark.django_db
+def test_shopping_lists_query_count_does_not_grow_with_lists_and_items(
+    create_user,
+    create_authenticated_client,
+    create_shopping_list,
+    django_capture_on_commit_callbacks,
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    url = reverse("all-shopping-lists")
+
+    shopping_list = create_shopping_list("Groceries", user)
+    with django_capture_on_commit_callbacks(execute=True):
+        ShoppingItem.objects.create(
+            shopping_list=shopping_list, name="Eggs", purchased=False
+        )
+
+    with CaptureQueriesContext(connection) as one_list_queries:
+        client.get(url)
+
+    another_member = User.objects.create_user("SomeoneElse", "someone@else.com", "x")
+    with django_capture_on_commit_callbacks(execute=True):
+        for index in range(3):
+            shopping_list = create_shopping_list(f"List {index}", user)
+            shopping_list.members.add(another_member)
+            for item_index in range(5):
+                ShoppingItem.objects.create(
+                    shopping_list=shopping_list,
+                    name=f"Item {item_index}",
+                    purchased=False,
+                )
+
+    with CaptureQueriesContext(connection) as many_lists_queries:
+        response = client.get(url)
+
+    assert len(many_lists_queries) == len(one_list_queries)
+    assert all(
+        len(shopping_list["unpurchased_items"]) == 3
+        for shopping_list in response.data["results"]
+    )
+    assert all(
+        len(shopping_list["members"]) == 2 for shopping_list in response.data["results"]
+    )
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_shopping_items_forward_and_back(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+
+    for name, purchased in [
+        ("Dates", True),
+        ("Bananas", False),
+        ("Apples", True),
+        ("Coconut", False),
+        ("Eggs", False),
+    ]:
+        ShoppingItem.objects.create(
+            name=name, purchased=purchased, shopping_list=shopping_list
+        )
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    first_page = client.get(url + "?pagination=cursor&page_size=2")
+
+    assert "count" not in first_page.data
+    assert first_page.data["previous"] is None
+    assert [item["name"] for item in first_page.data["results"]] == [
+        "Bananas",
+        "Coconut",
+    ]
+
+    second_page = client.get(first_page.data["next"])
+    third_page = client.get(second_page.data["next"])
+
+    assert [item["name"] for item in second_page.data["results"]] == [
+        "Eggs",
+        "Apples",
+    ]
+    assert [item["name"] for item in third_page.data["results"]] == ["Dates"]
+    assert third_page.data["next"] is None
+
+    back_to_second_page = client.get(third_page.data["previous"])
+
+    assert back_to_second_page.data["results"] == second_page.data["results"]
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_of_shopping_lists_uses_last_interaction(
+    create_user, create_authenticated_client
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+
+    with mock.patch("django.utils.timezone.now") as mock_now:
+        for days, name in [(3, "Oldest"), (2, "Old"), (1, "New")]:
+            mock_now.return_value = datetime.now() - timedelta(days=days)
+            ShoppingList.objects.create(name=name).members.add(user)
+
+    url = reverse("all-shopping-lists") + "?pagination=cursor&page_size=2"
+    first_page = client.get(url)
+    second_page = client.get(first_page.data["next"])
+
+    assert [shopping_list["name"] for shopping_list in first_page.data["results"]] == [
+        "New",
+        "Old",
+    ]
+    assert [shopping_list["name"] for shopping_list in second_page.data["results"]] == [
+        "Oldest"
+    ]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_returns_not_found(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    response = client.get(url + "?cursor=not-a-cursor")
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_search_matches_word_prefixes_and_ranks_results(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+
+    for name in ["Chocolate milk", "Milk", "Oat milk with milk foam", "Bread"]:
+        ShoppingItem.objects.create(
+            name=name, purchased=False, shopping_list=shopping_list
+        )
+
+    url = reverse("search-shopping-items") + "?search=mil"
+    response = client.get(url)
+
+    names = [item["name"] for item in response.data["results"]]
+    assert sorted(names) == ["Chocolate milk", "Milk", "Oat milk with milk foam"]
+    assert "Bread" not in names
+
+
+@pytest.mark.django_db
+def test_search_matches_substrings_after_word_prefixes(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    for name in ["Buttermilk", "Ilka's cake", "Bread"]:
+        ShoppingItem.objects.create(
+            name=name, purchased=False, shopping_list=shopping_list
+        )
+
+    response = client.get(reverse("search-shopping-items") + "?search=ilk")
+
+    names = [item["name"] for item in response.data["results"]]
+    assert names == ["Ilka's cake", "Buttermilk"]
+
+
+@pytest.mark.django_db
+def test_search_cursor_pages_keep_the_ranking(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    for name in ["Milk", "Almond milk chocolate bar", "Oat milk milk"]:
+        ShoppingItem.objects.create(
+            name=name, purchased=False, shopping_list=shopping_list
+        )
+    url = reverse("search-shopping-items") + "?search=milk"
+
+    ranked = [item["name"] for item in client.get(url).data["results"]]
+    paged = []
+    next_url = url + "&pagination=cursor&page_size=1"
+    while next_url:
+        response = client.get(next_url)
+        assert set(response.data["results"][0]) == {"id", "name", "purchased"}
+        paged += [item["name"] for item in response.data["results"]]
+        next_url = response.data["next"]
+    async_client = create_async_client(user)
+    async_results = async_to_sync(async_client.get)(
+        reverse("async-search-shopping-items") + "?search=milk"
+    ).json()["results"]
+
+    assert ranked != sorted(ranked)
+    assert paged == ranked
+    assert [item["name"] for item in async_results] == ranked
+
+
+@pytest.mark.django_db
+def test_search_index_follows_renamed_and_deleted_items(
+    create_user, create_authenticated_client, create_shopping_item
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    url = reverse("search-shopping-items") + "?search=butter"
+
+    shopping_item = create_shopping_item("Milk", user)
+    another_shopping_item = create_shopping_item("Butter", user)
+
+    shopping_item.name = "Peanut butter"
+    shopping_item.save()
+    another_shopping_item.delete()
+
+    response = client.get(url)
+
+    assert [item["name"] for item in response.data["results"]] == ["Peanut butter"]
+
+
+@pytest.mark.django_db
+def test_membership_check_costs_no_queries_on_warm_cache(
+    create_user, create_shopping_list, django_assert_num_queries
+):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    another_shopping_list = ShoppingList.objects.create(name="Books")
+
+    with django_assert_num_queries(1):
+        assert membership.is_member(user, shopping_list.id)
+
+    with django_assert_num_queries(0):
+        assert membership.is_member(user, shopping_list.id)
+        assert not membership.is_member(user, another_shopping_list.id)
+
+
+@pytest.mark.django_db
+def test_membership_check_falls_back_to_exists_when_ids_do_not_fit_the_cache(
+    create_user, django_assert_num_queries
+):
+    user = create_user()
+    shopping_lists = ShoppingList.objects.bulk_create(
+        ShoppingList(name=f"List {index}") for index in range(200)
+    )
+    user.shoppinglist_set.add(*shopping_lists)
+
+    with django_assert_num_queries(2):
+        assert membership.is_member(user, shopping_lists[0].id)
+
+    with django_assert_num_queries(1):
+        assert membership.is_member(user, shopping_lists[1].id)
+
+
+@pytest.mark.django_db
+def test_removed_member_loses_access_despite_cached_membership(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    list_creator = User.objects.create(username="list_creator", password="whocares")
+    shopping_list = create_shopping_list("Groceries", list_creator)
+    shopping_list.members.add(user)
+
+    url = reverse("shopping-list-detail", args=[shopping_list.id])
+    assert client.get(url).status_code == status.HTTP_200_OK
+
+    shopping_list.members.remove(user)
+
+    assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_new_member_gains_access_despite_cached_membership(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    list_creator = User.objects.create(username="list_creator", password="whocares")
+    shopping_list = create_shopping_list("Groceries", list_creator)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+    user.shoppinglist_set.add(shopping_list)
+
+    assert client.get(url).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_shopping_items_of_missing_shopping_list_return_not_found(
+    create_user, create_authenticated_client
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+
+    url = reverse("list-add-shopping-item", args=[uuid.uuid4()])
+
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+    assert (
+        client.post(url, {"name": "Milk", "purchased": False}, format="json")
+    ).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_shopping_item_is_looked_up_within_its_shopping_list(
+    create_user, create_authenticated_client, create_shopping_item
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_item = create_shopping_item("Chocolate", user)
+    another_shopping_item = create_shopping_item("Milk", user)
+
+    url = reverse(
+        "shopping-item-detail",
+        kwargs={
+            "pk": another_shopping_item.shopping_list.id,
+            "item_pk": shopping_item.id,
+        },
+    )
+
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_toggling_shopping_item_resolves_item_and_membership_in_one_query(
+    create_user, create_authenticated_client, create_shopping_item
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_item = create_shopping_item("Chocolate", user)
+
+    url = reverse(
+        "shopping-item-detail",
+        kwargs={"pk": shopping_item.shopping_list.id, "item_pk": shopping_item.id},
+    )
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.patch(url, {"purchased": True}, format="json")
+
+    shopping_list_queries = [
+        query["sql"]
+        for query in queries.captured_queries
+        if "shopping_list_shopping" in query["sql"]
+    ]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert shopping_list_queries[0].startswith("SELECT")
+    assert "EXISTS" in shopping_list_queries[0]
+    assert len(shopping_list_queries) <= 4
+
+
+@pytest.mark.django_db
+def test_shopping_items_are_created_in_bulk(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    data = [{"name": f"Item {index}", "purchased": False} for index in range(200)]
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(url, data, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.data) == 200
+    assert response.data[0]["name"] == "Item 0"
+    assert shopping_list.shopping_items.count() == 200
+    assert len(queries) < 12
+
+
+@pytest.mark.django_db
+def test_bulk_shopping_items_with_duplicates_are_rejected_per_item(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    ShoppingItem.objects.create(
+        shopping_list=shopping_list, name="Milk", purchased=False
+    )
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    data = [
+        {"name": "Milk", "purchased": False},
+        {"name": "Eggs", "purchased": False},
+        {"name": "Eggs", "purchased": False},
+        {"name": "Bread"},
+    ]
+
+    response = client.post(url, data, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data[0] == {}
+    assert response.data[1] == {}
+    assert "purchased" in response.data[3]
+
+    data[3]["purchased"] = True
+    response = client.post(url, data, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "name" in response.data[0]
+    assert response.data[1] == {}
+    assert "name" in response.data[2]
+    assert response.data[3] == {}
+    assert shopping_list.shopping_items.count() == 1
+
+
+@pytest.mark.django_db
+def test_toggling_an_item_records_its_event_without_extra_queries(
+    create_user, create_shopping_item, django_capture_on_commit_callbacks
+):
+    user = create_user()
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        shopping_item = create_shopping_item("Milk", user)
+    url = reverse(
+        "shopping-item-detail",
+        args=[shopping_item.shopping_list_id, shopping_item.pk],
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        client.patch(url, {"purchased": True}, format="json")
+
+    with CaptureQueriesContext(connection) as queries:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.patch(url, {"purchased": False}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    # SELECT, SAVEPOINT, UPDATE, INSERT of the event, RELEASE, and the touch
+    # UPDATE, whose members come from the cache.
+    assert len(queries) == 6
+    assert ChangeEvent.objects.filter(kind=feed.ITEM_UPDATED).count() == 2
+
+
+@pytest.mark.django_db
+def test_item_writes_in_one_transaction_touch_shopping_list_once(
+    create_user,
+    create_authenticated_client,
+    create_shopping_list,
+    django_capture_on_commit_callbacks,
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+
+    with mock.patch("django.utils.timezone.now") as mock_now:
+        mock_now.return_value = datetime.now() - timedelta(days=10)
+        older_list = create_shopping_list("Older", user)
+        mock_now.return_value = datetime.now() - timedelta(days=5)
+        create_shopping_list("Recent", user)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        with transaction.atomic():
+            for name in ["Milk", "Eggs", "Bread"]:
+                ShoppingItem.objects.create(
+                    name=name, purchased=False, shopping_list=older_list
+                )
+
+    with CaptureQueriesContext(connection) as queries:
+        for callback in callbacks:
+            callback()
+
+    batches = {
+        callback.__self__
+        for callback in callbacks
+        if isinstance(getattr(callback, "__self__", None), interactions.TouchBatch)
+    }
+    assert len(batches) == 1
+    assert len([query for query in queries if query["sql"].startswith("UPDATE")]) == 1
+
+    response = client.get(reverse("all-shopping-lists"))
+
+    assert response.data["results"][0]["name"] == "Older"
+    assert response.data["results"][1]["name"] == "Recent"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_touches_survive_a_rolled_back_savepoint(create_user, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    another_shopping_list = create_shopping_list("Books", user)
+    touched_before = ShoppingList.objects.get(pk=another_shopping_list.pk)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                interactions.touch(shopping_list.id)
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        interactions.touch(another_shopping_list.id)
+
+    another_shopping_list.refresh_from_db()
+    assert another_shopping_list.last_interaction > touched_before.last_interaction
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_touches_the_lists_of_every_batch_once(create_user):
+    user = create_user()
+    importer = ShoppingDataImport(user)
+    importer.batch_size = 2
+    lines = [
+        json.dumps({"type": "list", "id": f"list-{index}", "name": f"List {index}"})
+        for index in range(4)
+    ]
+
+    with CaptureQueriesContext(connection) as queries:
+        importer.run(lines)
+
+    touches = [
+        query
+        for query in queries
+        if query["sql"].startswith("UPDATE") and "last_interaction" in query["sql"]
+    ]
+    assert len(touches) == 1
+
+
+@pytest.mark.django_db
+def test_coalesced_touches_are_written_once(
+    create_user, create_shopping_list, django_capture_on_commit_callbacks
+):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    another_shopping_list = create_shopping_list("Books", user)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        with interactions.coalesce_touches():
+            interactions.touch(shopping_list.id)
+            interactions.touch(another_shopping_list.id)
+            interactions.touch(shopping_list.id)
+
+            assert len(callbacks) == 0
+
+    assert len(callbacks) == 1
+
+    with CaptureQueriesContext(connection) as queries:
+        callbacks[0]()
+
+    assert len([query for query in queries if query["sql"].startswith("UPDATE")]) == 1
+
+
+@pytest.mark.django_db
+def test_unchanged_shopping_lists_return_not_modified(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    create_shopping_list("Groceries", user)
+    url = reverse("all-shopping-lists")
+
+    response = client.get(url)
+    etag = response.headers["ETag"]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "Last-Modified" in response.headers
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    shopping_list_queries = [
+        query for query in queries if "shopping_list_shoppinglist" in query["sql"]
+    ]
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert len(shopping_list_queries) == 1
+
+    create_shopping_list("Books", user)
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_shopping_list_etag_changes_when_shopping_list_changes(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    url = reverse("shopping-list-detail", args=[shopping_list.id])
+
+    etag = client.get(url).headers["ETag"]
+
+    assert (
+        client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+        == status.HTTP_304_NOT_MODIFIED
+    )
+
+    client.patch(url, {"name": "Food"}, format="json")
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_shopping_items_etag_changes_when_item_is_added(
+    create_user,
+    create_authenticated_client,
+    create_shopping_list,
+    django_capture_on_commit_callbacks,
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+
+    etag = client.get(url).headers["ETag"]
+
+    assert (
+        client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+        == status.HTTP_304_NOT_MODIFIED
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(url, {"name": "Milk", "purchased": False}, format="json")
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_not_member_gets_no_etag_for_shopping_list(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    list_creator = User.objects.create(username="list_creator", password="whocares")
+    shopping_list = create_shopping_list("Groceries", list_creator)
+    url = reverse("shopping-list-detail", args=[shopping_list.id])
+
+    response = client.get(url, HTTP_IF_NONE_MATCH="*")
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_shopping_lists_response_is_served_from_cache(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    create_shopping_list("Groceries", user)
+    url = reverse("all-shopping-lists")
+
+    first_response = client.get(url)
+
+    with CaptureQueriesContext(connection) as queries:
+        second_response = client.get(url)
+
+    shopping_list_queries = [
+        query for query in queries if "shopping_list_shoppinglist" in query["sql"]
+    ]
+    assert first_response.headers["X-Cache"] == "MISS"
+    assert second_response.headers["X-Cache"] == "HIT"
+    assert second_response.data == first_response.data
+    assert len(shopping_list_queries) == 1
+
+
+@pytest.mark.django_db
+def test_shopping_lists_cache_is_invalidated_by_item_and_member_changes(
+    create_user,
+    create_authenticated_client,
+    create_shopping_list,
+    django_capture_on_commit_callbacks,
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    url = reverse("all-shopping-lists")
+
+    client.get(url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ShoppingItem.objects.create(
+            name="Milk", purchased=False, shopping_list=shopping_list
+        )
+
+    response = client.get(url)
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.data["results"][0]["unpurchased_items"] == [{"name": "Milk"}]
+
+    another_member = User.objects.create(username="another_member", password="x")
+    with django_capture_on_commit_callbacks(execute=True):
+        shopping_list.members.add(another_member)
+
+    response = client.get(url)
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert len(response.data["results"][0]["members"]) == 2
+
+
+@pytest.mark.django_db
+def test_response_cache_waits_for_entry_being_rebuilt():
+    response_cache = VersionedResponseCache("test")
+    version = response_cache.get_version(1)
+    key = response_cache.entry_key(1, version, "/api/shopping-lists/")
+    response_cache.cache.add(f"{key}:lock", 1)
+
+    rebuild = threading.Timer(0.1, response_cache.cache.set, args=(key, "fresh"))
+    rebuild.start()
+    compute = mock.Mock(return_value="recomputed")
+
+    value, hit = response_cache.get_or_set(1, "/api/shopping-lists/", compute)
+    rebuild.join()
+
+    assert (value, hit) == ("fresh", True)
+    compute.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_response_cache_stops_waiting_when_the_rebuild_stored_nothing(settings):
+    settings.SHOPPING_LIST_RESPONSE_CACHE_LOCK_WAIT = 5
+    response_cache = VersionedResponseCache("test")
+    version = response_cache.get_version(1)
+    key = response_cache.entry_key(1, version, "/api/shopping-lists/")
+    response_cache.cache.add(f"{key}:lock", 1)
+
+    rebuild = threading.Timer(0.1, response_cache.cache.delete, args=(f"{key}:lock",))
+    rebuild.start()
+    started = time.monotonic()
+
+    value, hit = response_cache.get_or_set(1, "/api/shopping-lists/", lambda: "own")
+    rebuild.join()
+
+    assert (value, hit) == ("own", False)
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_response_cache_versions_are_bumped_after_commit():
+    response_cache = VersionedResponseCache("test")
+    version = response_cache.get_version(1)
+
+    with transaction.atomic():
+        response_cache.bump([1])
+        during = response_cache.get_version(1)
+
+    assert during == version
+    assert response_cache.get_version(1) != version
+
+
+@pytest.mark.django_db
+def test_token_authentication_is_cached(create_user):
+    user = create_user()
+    token = Token.objects.create(user=user)
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    url = reverse("all-shopping-lists")
+
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not [query for query in queries if "authtoken_token" in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_cached_token_stops_working_when_deleted_or_user_deactivated(create_user):
+    user = create_user()
+    token = Token.objects.create(user=user)
+    url = reverse("all-shopping-lists")
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    assert client.get(url).status_code == status.HTTP_200_OK
+
+    user.is_active = False
+    user.save()
+    assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+    user.is_active = True
+    user.save()
+    assert client.get(url).status_code == status.HTTP_200_OK
+
+    token.delete()
+    assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_token_invalidation_reaches_the_local_cache_of_other_workers():
+    worker, other_worker = TokenCache(), TokenCache()
+
+    loaded_before_invalidation = worker.get("key")[1]
+    worker.set("key", "user", loaded_before_invalidation)
+    other_worker.invalidate(["key"])
+    stale, generation = worker.get("key")
+    other_worker.set("key", "stale", loaded_before_invalidation)
+    ignored = TokenCache().get("key")[0]
+    worker.set("key", "reloaded", generation)
+
+    assert stale is None
+    assert ignored is None
+    assert TokenCache().get("key")[0] == "reloaded"
+
+
+def test_async_token_cache_checks_the_shared_generation():
+    worker, other_worker = TokenCache(), TokenCache()
+
+    async def reload():
+        generation = (await worker.aget("key"))[1]
+        await worker.aset("key", "user", generation)
+        cached = (await worker.aget("key"))[0]
+        other_worker.invalidate(["key"])
+        return cached, (await worker.aget("key"))[0]
+
+    cached, revoked = async_to_sync(reload)()
+
+    assert cached == "user"
+    assert revoked is None
+
+
+def test_sliding_window_throttle_keeps_two_counters_per_user():
+    class ThreePerMinuteThrottle(SlidingWindowRateThrottle):
+        scope = "test"
+        rate = "3/minute"
+
+    user = mock.Mock(pk=1, is_authenticated=True)
+    request = mock.Mock(user=user)
+    clock = iter([600.0, 610.0, 620.0, 630.0, 670.0, 671.0])
+
+    def check():
+        throttle = ThreePerMinuteThrottle()
+        throttle.timer = lambda: next(clock)
+        return throttle.allow_request(request, None), throttle
+
+    assert check()[0] and check()[0] and check()[0]
+
+    allowed, throttle = check()
+    assert not allowed
+    assert throttle.wait() == pytest.approx(30)
+
+    # 10s into the next window, 5/6 of the previous window still counts: 2.5 < 3.
+    assert check()[0]
+    allowed, throttle = check()
+    assert not allowed
+
+    counters = caches["default"].get_many(
+        ["throttle_test_1:9", "throttle_test_1:10", "throttle_test_1:11"]
+    )
+    assert counters == {"throttle_test_1:10": 3, "throttle_test_1:11": 1}
+
+
+def test_sliding_window_throttle_lets_only_the_limit_through_concurrently():
+    class ThreePerMinuteThrottle(SlidingWindowRateThrottle):
+        scope = "test"
+        rate = "3/minute"
+
+    request = mock.Mock(user=mock.Mock(pk=2, is_authenticated=True))
+    barrier = threading.Barrier(10)
+    allowed = []
+
+    def check():
+        throttle = ThreePerMinuteThrottle()
+        throttle.timer = lambda: 600.0
+        barrier.wait()
+        allowed.append(throttle.allow_request(request, None))
+
+    threads = [threading.Thread(target=check) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert allowed.count(True) == 3
+    assert caches["default"].get("throttle_test_2:10") == 3
+
+
+def create_shared_memory_cache(tmp_path, **options):
+    return SharedMemoryCache(
+        str(tmp_path / "cache"), {"OPTIONS": {"SLOTS": 64, "SLOT_SIZE": 256, **options}}
+    )
+
+
+def test_shared_memory_cache_stores_expires_and_counts(tmp_path):
+    cache = create_shared_memory_cache(tmp_path)
+
+    cache.set("list", {"name": "Groceries"})
+    cache.set("gone", 1, timeout=-1)
+
+    assert cache.get("list") == {"name": "Groceries"}
+    assert cache.get("gone") is None
+    assert cache.add("list", "other") is False
+    assert cache.add("counter", 1) is True
+    assert cache.incr("counter", 5) == 6
+    assert cache.get_many(["list", "counter", "missing"]) == {
+        "list": {"name": "Groceries"},
+        "counter": 6,
+    }
+
+    with pytest.raises(ValueError):
+        cache.incr("missing")
+
+    assert cache.set("too-big", "x" * 1000) is False
+    assert cache.get("too-big") is None
+
+    assert cache.delete("list") is True
+    cache.clear()
+    assert cache.get("counter") is None
+
+
+def test_shared_memory_cache_evicts_within_fixed_size(tmp_path):
+    cache = create_shared_memory_cache(tmp_path, SLOTS=8, WAYS=8)
+
+    for index in range(20):
+        cache.set(f"key-{index}", index)
+
+    stored = cache.get_many([f"key-{index}" for index in range(20)])
+
+    assert len(stored) == 8
+    assert stored["key-19"] == 19
+
+
+def test_shared_memory_cache_refuses_a_file_with_another_layout(tmp_path):
+    cache = create_shared_memory_cache(tmp_path)
+    cache.set("list", "Groceries")
+
+    with pytest.raises(ImproperlyConfigured):
+        create_shared_memory_cache(tmp_path, SLOT_SIZE=512)
+
+    assert cache.get("list") == "Groceries"
+
+
+def test_shared_memory_cache_refuses_files_others_can_write(tmp_path):
+    (tmp_path / "target").touch()
+    (tmp_path / "cache").symlink_to(tmp_path / "target")
+
+    with pytest.raises(OSError):
+        create_shared_memory_cache(tmp_path)
+
+    (tmp_path / "cache").unlink()
+    (tmp_path / "cache").touch()
+    (tmp_path / "cache").chmod(0o666)
+
+    with pytest.raises(ImproperlyConfigured):
+        create_shared_memory_cache(tmp_path)
+
+
+def test_shared_memory_cache_creates_a_private_directory(tmp_path):
+    SharedMemoryCache(
+        str(tmp_path / "private" / "cache"),
+        {"OPTIONS": {"SLOTS": 64, "SLOT_SIZE": 256}},
+    )
+
+    assert (tmp_path / "private").stat().st_mode & 0o777 == 0o700
+
+
+def increment_shared_counter(location):
+    cache = SharedMemoryCache(location, {"OPTIONS": {"SLOTS": 64, "SLOT_SIZE": 256}})
+    for _ in range(200):
+        cache.incr("counter")
+
+
+def test_shared_memory_cache_is_shared_and_atomic_across_processes(tmp_path):
+    cache = create_shared_memory_cache(tmp_path)
+    cache.set("counter", 0)
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=increment_shared_counter, args=(str(tmp_path / "cache"),)
+        )
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert cache.get("counter") == 800
+
+
+def create_async_client(user):
+    client = AsyncClient()
+    client.force_login(user)
+
+    return client
+
+
+@pytest.mark.django_db
+def test_async_shopping_lists_are_listed_and_created(create_user, create_shopping_list):
+    user = create_user()
+    create_shopping_list("Groceries", user)
+    client = create_async_client(user)
+
+    url = reverse("async-all-shopping-lists")
+
+    response = async_to_sync(client.post)(
+        url, {"name": "Hardware"}, content_type="application/json"
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["members"] == [{"id": user.id, "username": user.username}]
+
+    response = async_to_sync(client.get)(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert {result["name"] for result in response.json()["results"]} == {
+        "Groceries",
+        "Hardware",
+    }
+
+
+@pytest.mark.django_db
+def test_async_shopping_items_are_only_available_to_members(
+    create_user, create_shopping_list
+):
+    user = create_user()
+    other_user = User.objects.create_user("SomeoneElse", "someone@else.com", "pw")
+    shopping_list = create_shopping_list("Groceries", user)
+
+    url = reverse("async-list-add-shopping-item", args=[shopping_list.id])
+    data = {"name": "Milk", "purchased": False}
+
+    response = async_to_sync(create_async_client(user).post)(
+        url, data, content_type="application/json"
+    )
+    duplicate = async_to_sync(create_async_client(user).post)(
+        url, data, content_type="application/json"
+    )
+    forbidden = async_to_sync(create_async_client(other_user).get)(url)
+    anonymous = async_to_sync(AsyncClient().get)(url)
+    missing = async_to_sync(create_async_client(user).get)(
+        reverse("async-list-add-shopping-item", args=[uuid.uuid4()])
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert duplicate.status_code == status.HTTP_400_BAD_REQUEST
+    assert duplicate.json() == ["There's already this item on the list"]
+    assert forbidden.status_code == status.HTTP_403_FORBIDDEN
+    assert anonymous.status_code == status.HTTP_401_UNAUTHORIZED
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+    assert ShoppingItem.objects.get().name == "Milk"
+
+
+def tagged_exception_handler(exc, context):
+    response = exception_handler(exc, context)
+    if response is not None:
+        response.data = {"error": response.data}
+        response["X-Error"] = type(exc).__name__
+    return response
+
+
+@pytest.mark.django_db
+def test_async_errors_go_through_the_exception_handler(
+    create_user, create_authenticated_client, settings
+):
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        "EXCEPTION_HANDLER": "shopping_list.tests.tests.tagged_exception_handler",
+    }
+    user = create_user()
+    missing = uuid.uuid4()
+
+    sync_response = create_authenticated_client(user).get(
+        reverse("shopping-list-detail", args=[missing])
+    )
+    async_response = async_to_sync(create_async_client(user).get)(
+        reverse("async-shopping-list-detail", args=[missing])
+    )
+    anonymous = async_to_sync(AsyncClient().get)(reverse("async-all-shopping-lists"))
+
+    assert async_response.status_code == sync_response.status_code == 404
+    assert async_response.json().keys() == sync_response.json().keys() == {"error"}
+    assert async_response["X-Error"] in {"Http404", "NotFound"}
+    assert anonymous.status_code == status.HTTP_401_UNAUTHORIZED
+    assert anonymous["WWW-Authenticate"] == "Token"
+    assert anonymous["X-Error"] == "NotAuthenticated"
+
+
+@pytest.mark.django_db
+def test_async_shopping_item_detail_is_updated_and_deleted(
+    create_user, create_shopping_item
+):
+    user = create_user()
+    shopping_item = create_shopping_item("Milk", user)
+    client = create_async_client(user)
+
+    url = reverse(
+        "async-shopping-item-detail",
+        args=[shopping_item.shopping_list_id, shopping_item.id],
+    )
+
+    response = async_to_sync(client.patch)(
+        url, {"purchased": True}, content_type="application/json"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["purchased"] is True
+    shopping_item.refresh_from_db()
+    assert shopping_item.purchased is True
+
+    response = async_to_sync(client.delete)(url)
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert not ShoppingItem.objects.exists()
+
+
+@pytest.mark.django_db
+def test_async_search_authenticates_with_token(create_user, create_shopping_item):
+    user = create_user()
+    create_shopping_item("Oat milk", user)
+    create_shopping_item("Bread", user)
+    token = Token.objects.create(user=user)
+    client = AsyncClient()
+
+    url = reverse("async-search-shopping-items") + "?search=mil"
+
+    response = async_to_sync(client.get)(
+        url, headers={"Authorization": f"Token {token.key}"}
+    )
+    invalid = async_to_sync(client.get)(url, headers={"Authorization": "Token nope"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["name"] for result in response.json()["results"]] == ["Oat milk"]
+    assert invalid.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def parse_server_sent_event(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return int(fields["id"]), fields["event"], json.loads(fields["data"])
+
+
+@pytest.mark.django_db
+def test_change_feed_replays_events_after_last_event_id(
+    create_user, create_shopping_item
+):
+    user = create_user()
+    other_user = User.objects.create_user("SomeoneElse", "someone@else.com", "pw")
+    first_item = create_shopping_item("Milk", user)
+    create_shopping_item("Not mine", other_user)
+    second_item = ShoppingItem.objects.create(
+        name="Bread", purchased=False, shopping_list=first_item.shopping_list
+    )
+    first_event = ChangeEvent.objects.get(data__id=str(first_item.id))
+    client = create_async_client(user)
+
+    async def read_events():
+        response = await client.get(
+            reverse("async-change-feed"),
+            headers={"Last-Event-ID": str(first_event.id)},
+        )
+        stream = aiter(response.streaming_content)
+        assert await anext(stream) == b"retry: 3000\n\n"
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        await stream.aclose()
+
+        return response, chunk
+
+    response, chunk = async_to_sync(read_events)()
+
+    assert response["Content-Type"] == "text/event-stream"
+    event_id, kind, data = parse_server_sent_event(chunk)
+    assert event_id > first_event.id
+    assert kind == feed.ITEM_CREATED
+    assert data == {
+        "shopping_list": str(first_item.shopping_list_id),
+        "id": str(second_item.id),
+        "name": "Bread",
+        "purchased": False,
+    }
+
+
+@pytest.mark.django_db
+def test_change_feed_replays_only_events_concerning_the_user(
+    create_user, create_shopping_item
+):
+    user = create_user()
+    other_user = User.objects.create_user("SomeoneElse", "someone@else.com", "pw")
+    create_shopping_item("Not mine", other_user)
+    shopping_item = create_shopping_item("Milk", user)
+    shared = ShoppingList.objects.create(name="Party")
+    shared.members.add(user, other_user)
+    shared.members.remove(user)
+
+    async def replay():
+        return [
+            event
+            async for events in feed.InProcessEventBroker().replay(0, user)
+            for event in events
+        ]
+
+    events = async_to_sync(replay)()
+
+    assert [(event.kind, event.shopping_list_id) for event in events] == [
+        (feed.MEMBER_ADDED, shopping_item.shopping_list_id),
+        (feed.ITEM_CREATED, shopping_item.shopping_list_id),
+        (feed.MEMBER_ADDED, shared.pk),
+        (feed.MEMBER_REMOVED, shared.pk),
+    ]
+
+
+@pytest.mark.django_db
+def test_change_feed_streams_published_membership_changes(
+    create_user, create_shopping_list
+):
+    user = create_user()
+    other_user = User.objects.create_user("SomeoneElse", "someone@else.com", "pw")
+    shopping_list = create_shopping_list("Groceries", other_user)
+
+    def add_member():
+        with transaction.atomic():
+            shopping_list.members.add(user)
+        return list(ChangeEvent.objects.filter(recipient_id=user.pk))
+
+    client = create_async_client(user)
+
+    async def read_events():
+        response = await client.get(reverse("async-change-feed"))
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.2)
+        events = await sync_to_async(add_member)()
+        feed.get_broker().publish(events)
+        chunk = await asyncio.wait_for(pending, 5)
+        await stream.aclose()
+
+        return chunk
+
+    event_id, kind, data = parse_server_sent_event(async_to_sync(read_events)())
+
+    assert kind == feed.MEMBER_ADDED
+    assert data == {"shopping_list": str(shopping_list.id), "user": user.id}
+
+
+@pytest.mark.django_db
+def test_polling_event_broker_delivers_events_from_the_database(settings):
+    settings.SHOPPING_LIST_EVENT_POLL_INTERVAL = 0.05
+    broker = feed.PollingEventBroker()
+    shopping_list_id = uuid.uuid4()
+
+    def create_event():
+        return ChangeEvent.objects.create(
+            shopping_list_id=shopping_list_id, kind=feed.LIST_UPDATED
+        )
+
+    async def listen():
+        events = broker.listen(timeout=5)
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.1)
+        event = await sync_to_async(create_event)()
+        received = await asyncio.wait_for(pending, 5)
+        await events.aclose()
+
+        return event, received
+
+    event, received = async_to_sync(listen)()
+
+    assert received == [event]
+    assert broker.pollers == {}
+
+
+@pytest.mark.django_db
+def test_polling_event_broker_delivers_events_committed_out_of_order(settings):
+    settings.SHOPPING_LIST_EVENT_POLL_INTERVAL = 0.05
+    broker = feed.PollingEventBroker()
+    shopping_list_id = uuid.uuid4()
+
+    def create_event(offset):
+        latest = ChangeEvent.objects.order_by("id").last()
+        return ChangeEvent.objects.create(
+            id=(latest.id if latest else 0) + offset,
+            shopping_list_id=shopping_list_id,
+            kind=feed.LIST_UPDATED,
+        )
+
+    async def listen():
+        events = broker.listen(timeout=5)
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.1)
+        later = await sync_to_async(create_event)(2)
+        first = await asyncio.wait_for(pending, 5)
+        earlier = await sync_to_async(create_event)(-1)
+        second = await asyncio.wait_for(anext(events), 5)
+        await events.aclose()
+
+        return later, earlier, first, second
+
+    later, earlier, first, second = async_to_sync(listen)()
+
+    assert first == [later]
+    assert second == [earlier]
+
+
+@pytest.mark.django_db
+def test_change_feed_is_refused_outside_asgi(create_user, client):
+    client.force_login(create_user())
+
+    response = client.get(reverse("async-change-feed"))
+
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+
+@pytest.mark.django_db
+def test_changes_return_only_items_changed_since_token(
+    create_user, create_authenticated_client, create_shopping_item, settings
+):
+    settings.SHOPPING_LIST_SYNC_WINDOW = 0
+    user = create_user()
+    client = create_authenticated_client(user)
+    unchanged = create_shopping_item("Bread", user)
+    updated = ShoppingItem.objects.create(
+        name="Milk", purchased=False, shopping_list=unchanged.shopping_list
+    )
+    deleted = ShoppingItem.objects.create(
+        name="Eggs", purchased=False, shopping_list=unchanged.shopping_list
+    )
+
+    url = reverse("shopping-item-changes")
+    response = client.get(url)
+
+    assert len(response.data["items"]) == 3
+    assert response.data["has_more"] is False
+
+    updated.purchased = True
+    updated.save()
+    deleted_id = deleted.id
+    deleted.delete()
+    created = ShoppingItem.objects.create(
+        name="Butter", purchased=False, shopping_list=unchanged.shopping_list
+    )
+
+    response = client.get(url, {"since": response.data["token"]})
+
+    assert [item["id"] for item in response.data["items"]] == [
+        str(updated.id),
+        str(created.id),
+    ]
+    assert response.data["items"][0]["purchased"] is True
+    assert [(row["type"], row["id"]) for row in response.data["deleted"]] == [
+        ("item", str(deleted_id))
+    ]
+
+    response = client.get(url, {"since": response.data["token"]})
+
+    assert response.data["items"] == []
+    assert response.data["deleted"] == []
+
+
+@pytest.mark.django_db
+def test_changes_are_paged_and_report_deleted_lists(
+    create_user, create_authenticated_client, create_shopping_list, settings
+):
+    settings.SHOPPING_LIST_SYNC_WINDOW = 0
+    user = create_user()
+    client = create_authenticated_client(user)
+    kept = create_shopping_list("Groceries", user)
+    removed = create_shopping_list("Party", user)
+    ShoppingItem.objects.create(name="Milk", purchased=False, shopping_list=kept)
+    ShoppingItem.objects.create(name="Eggs", purchased=False, shopping_list=kept)
+
+    url = reverse("shopping-item-changes")
+    first_page = client.get(url, {"page_size": 1})
+    second_page = client.get(url, {"page_size": 1, "since": first_page.data["token"]})
+    removed_id = removed.id
+    removed.delete()
+    after_delete = client.get(url, {"since": second_page.data["token"]})
+    invalid = client.get(url, {"since": "not a token"})
+
+    assert first_page.data["has_more"] is True
+    assert len(second_page.data["items"]) == 1
+    assert first_page.data["items"] != second_page.data["items"]
+    assert after_delete.data["items"] == []
+    assert [(row["type"], row["id"]) for row in after_delete.data["deleted"]] == [
+        ("list", str(removed_id))
+    ]
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_changes_follow_membership_of_the_user(
+    create_user, create_authenticated_client, create_shopping_list, settings
+):
+    settings.SHOPPING_LIST_SYNC_WINDOW = 0
+    user = create_user()
+    other_user = User.objects.create_user("SomeoneElse", "someone@else.com", "x")
+    client = create_authenticated_client(user)
+    other_client = create_authenticated_client(other_user)
+    own = create_shopping_list("Groceries", user)
+    shared = create_shopping_list("Party", other_user)
+    own.members.add(other_user)
+    item = ShoppingItem.objects.create(
+        name="Cake", purchased=False, shopping_list=shared
+    )
+
+    url = reverse("shopping-item-changes")
+    token = client.get(url).data["token"]
+    other_token = other_client.get(url).data["token"]
+
+    shared.members.add(user)
+    joined = client.get(url, {"since": token})
+
+    own.members.remove(other_user)
+    removed = other_client.get(url, {"since": other_token})
+    remaining = client.get(url, {"since": joined.data["token"]})
+
+    shared.members.remove(user)
+    left = client.get(url, {"since": remaining.data["token"]})
+    shared.members.add(user)
+    rejoined = client.get(url, {"since": token})
+
+    assert [row["id"] for row in joined.data["items"]] == [str(item.id)]
+    assert [(row["type"], row["id"]) for row in removed.data["deleted"]] == [
+        ("list", str(own.id))
+    ]
+    assert remaining.data["deleted"] == []
+    assert [(row["type"], row["id"]) for row in left.data["deleted"]] == [
+        ("list", str(shared.id))
+    ]
+    assert [row["id"] for row in rejoined.data["items"]] == [str(item.id)]
+    assert rejoined.data["deleted"] == []
+
+
+@pytest.mark.django_db
+def test_changes_read_again_a_window_behind_the_token(
+    create_user, create_authenticated_client, create_shopping_item, settings
+):
+    settings.SHOPPING_LIST_SYNC_WINDOW = 30
+    user = create_user()
+    client = create_authenticated_client(user)
+    item = create_shopping_item("Bread", user)
+    url = reverse("shopping-item-changes")
+
+    first = client.get(url)
+    # Committed late with an earlier timestamp than the rows already synced.
+    late = ShoppingItem.objects.create(
+        name="Milk", purchased=False, shopping_list=item.shopping_list
+    )
+    ShoppingItem.objects.filter(pk=late.pk).update(
+        updated_at=item.updated_at - timedelta(seconds=5)
+    )
+    second = client.get(url, {"since": first.data["token"]})
+
+    assert {row["id"] for row in second.data["items"]} == {
+        str(item.id),
+        str(late.id),
+    }
+    assert second.data["reset"] is False
+
+
+@pytest.mark.django_db
+def test_changes_start_over_when_the_token_has_expired(
+    create_user, create_authenticated_client, create_shopping_item, settings
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    create_shopping_item("Bread", user)
+    url = reverse("shopping-item-changes")
+
+    token = client.get(url).data["token"]
+    settings.SHOPPING_LIST_SYNC_RETENTION = 0
+    response = client.get(url, {"since": token})
+
+    assert response.data["reset"] is True
+    assert len(response.data["items"]) == 1
+
+
+@pytest.mark.django_db
+def test_prune_sync_history_deletes_rows_past_the_retention(
+    create_user, create_shopping_list, settings
+):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    other_user = User.objects.create_user("SomeoneElse", "someone@else.com", "x")
+    shopping_list.members.add(other_user)
+    shopping_list.members.remove(other_user)
+    Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+    ListJoin.objects.update(joined_at=timezone.now() - timedelta(days=31))
+    ChangeEvent.objects.update(created_at=timezone.now() - timedelta(days=8))
+    shopping_list.members.add(other_user)
+
+    call_command("prune_sync_history", stdout=io.StringIO())
+
+    assert Tombstone.objects.count() == 0
+    assert ListJoin.objects.count() == 1
+    assert ChangeEvent.objects.get().kind == feed.MEMBER_ADDED
+
+
+@pytest.mark.django_db
+def test_endpoint_queries_use_indexes(seed_shopping_data, assert_no_full_scan):
+    users, shopping_lists = seed_shopping_data()
+    user, shopping_list = users[0], shopping_lists[0]
+    users_shopping_lists = ShoppingList.objects.filter(members=user)
+
+    assert_no_full_scan(
+        ShoppingItem.objects.filter(shopping_list=shopping_list).order_by(
+            "purchased", "name", "id"
+        )[:51]
+    )
+    assert_no_full_scan(
+        ShoppingItem.objects.filter(
+            shopping_list=shopping_list, name="milk", purchased=False
+        )
+    )
+    assert_no_full_scan(
+        ShoppingItem.objects.filter(
+            shopping_list__in=[
+                shopping_list.pk for shopping_list in shopping_lists[:5]
+            ],
+            purchased=False,
+        ).order_by("name", "id")
+    )
+    assert_no_full_scan(users_shopping_lists.order_by("-last_interaction", "id")[:51])
+    assert_no_full_scan(
+        ShoppingList.members.through.objects.filter(user_id=user.pk).values_list(
+            "shoppinglist_id", flat=True
+        )
+    )
+    assert_no_full_scan(
+        ShoppingItem.objects.filter(shopping_list__in=users_shopping_lists).order_by(
+            "updated_at", "pk"
+        )[:501]
+    )
+    assert_no_full_scan(
+        membership.annotate_membership(
+            ShoppingItem.objects.filter(shopping_list=shopping_list),
+            user,
+            shopping_list_field="shopping_list_id",
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_shopping_item_is_created_without_duplicate_lookup(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    data = {"name": "Milk", "purchased": False}
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(url, data, format="json")
+
+    item_table = ShoppingItem._meta.db_table
+    item_queries = [query["sql"] for query in queries if item_table in query["sql"]]
+    duplicate = client.post(url, data, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(item_queries) == 1
+    assert item_queries[0].startswith("INSERT")
+    assert duplicate.status_code == status.HTTP_400_BAD_REQUEST
+    assert duplicate.data == ["There's already this item on the list"]
+    assert ShoppingItem.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_shopping_item_update_to_duplicate_unpurchased_item_is_rejected(
+    create_user, create_authenticated_client, create_shopping_item
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    unpurchased = create_shopping_item("Milk", user)
+    purchased = ShoppingItem.objects.create(
+        name="Milk", purchased=True, shopping_list=unpurchased.shopping_list
+    )
+
+    url = reverse(
+        "shopping-item-detail",
+        kwargs={"pk": purchased.shopping_list_id, "item_pk": purchased.id},
+    )
+    response = client.patch(url, {"purchased": False}, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data == ["There's already this item on the list"]
+    purchased.refresh_from_db()
+    assert purchased.purchased is True
+
+
+@pytest.mark.django_db
+def test_add_and_remove_members_in_bulk(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Household", user)
+    members = User.objects.bulk_create(
+        User(username=f"member-{index}") for index in range(30)
+    )
+    member_ids = [member.id for member in members]
+
+    def count_queries(url, ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.put(url, {"members": ids}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+
+        user_lookups = [
+            query
+            for query in queries
+            if f'"{User._meta.db_table}"."id" IN' in query["sql"]
+        ]
+        return len(queries), len(user_lookups)
+
+    add_url = reverse("shopping-list-add-members", args=[shopping_list.id])
+    remove_url = reverse("shopping-list-remove-members", args=[shopping_list.id])
+
+    # The first request also warms the membership cache.
+    count_queries(add_url, member_ids[:1])
+    few_queries, few_user_lookups = count_queries(add_url, member_ids[1:3])
+    many_queries, many_user_lookups = count_queries(add_url, member_ids[3:])
+
+    assert shopping_list.members.count() == 31
+    assert many_queries == few_queries
+    assert many_user_lookups == few_user_lookups == 1
+
+    removed_queries, _ = count_queries(remove_url, member_ids)
+
+    assert shopping_list.members.count() == 1
+    assert removed_queries <= few_queries
+
+    response = client.put(add_url, {"members": [member_ids[0], 0]}, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data == {"members": ['Invalid pk "0" - object does not exist.']}
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+
+    return metrics
+
+
+@pytest.mark.django_db
+def test_server_timing_header_reports_queries_and_phases(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    client = create_authenticated_client(user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    metrics = parse_server_timing(response["Server-Timing"])
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set(metrics) == {"db", "auth", "serialize", "total"}
+    assert metrics["db"]["desc"] == f'"{len(queries)} queries"'
+    assert float(metrics["db"]["dur"]) <= float(metrics["total"]["dur"])
+
+    response = async_to_sync(create_async_client(user).get)(
+        reverse("async-list-add-shopping-item", args=[shopping_list.id])
+    )
+    metrics = parse_server_timing(response["Server-Timing"])
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set(metrics) == {"db", "auth", "serialize", "total"}
+    assert metrics["db"]["desc"] != '"0 queries"'
+
+
+@pytest.mark.django_db
+def test_slow_requests_are_logged_with_repeated_queries(
+    settings, caplog, create_user, create_authenticated_client, create_shopping_list
+):
+    settings.SHOPPING_LIST_SLOW_REQUEST_QUERIES = 3
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    client = create_authenticated_client(user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    data = [{"name": f"Item {index}", "purchased": False} for index in range(3)]
+
+    with caplog.at_level("WARNING", logger="shopping_list.slow_requests"):
+        client.post(url, data, format="json")
+
+    [record] = caplog.records
+    assert record.message.startswith(f"Slow request POST {url} (201)")
+    assert record.queries >= 3
+
+    settings.SHOPPING_LIST_SLOW_REQUEST_QUERIES = 1000
+    caplog.clear()
+    with caplog.at_level("WARNING", logger="shopping_list.slow_requests"):
+        client.get(url)
+
+    assert caplog.records == []
+
+
+def test_query_fingerprints_ignore_values():
+    assert timing.fingerprint(
+        'SELECT * FROM "item" WHERE "id" IN (%s, %s, %s) LIMIT 21'
+    ) == timing.fingerprint(
+        """SELECT * FROM "item"
+        WHERE "id" IN (%s) LIMIT 5"""
+    )
+    assert timing.fingerprint("SELECT 'a''b', 1.5") == "SELECT ?, ?"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "serializer_class", [ShoppingItemSerializer, ShoppingItemChangeSerializer]
+)
+def test_values_plan_matches_the_serializer(
+    create_user, create_shopping_list, serializer_class
+):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    ShoppingItem.objects.bulk_create(
+        ShoppingItem(shopping_list=shopping_list, name=name, purchased=purchased)
+        for name, purchased in [("Milk", False), ("Eggs", True), ("Bread", False)]
+    )
+    queryset = ShoppingItem.objects.order_by("name")
+
+    plan = ValuesPlan.for_serializer(serializer_class)
+
+    assert plan is ValuesPlan.for_serializer(serializer_class)
+    assert json.loads(JSONRenderer().render(plan.serialize(plan.values(queryset)))) == (
+        json.loads(JSONRenderer().render(serializer_class(queryset, many=True).data))
+    )
+
+
+def test_values_plan_rejects_fields_without_a_column():
+    with pytest.raises(ImproperlyConfigured):
+        ValuesPlan.for_serializer(ShoppingListSerializer)
+
+
+@pytest.mark.django_db
+def test_seed_shopping_data_is_deterministic(create_authenticated_client):
+    options = ["--users=10", "--lists=30", "--items=600", "--vocabulary=50"]
+
+    def seeded_items():
+        return list(
+            ShoppingItem.objects.order_by("id").values_list("id", "name", "purchased")
+        )
+
+    call_command("seed_shopping_data", *options, stdout=io.StringIO())
+    items = seeded_items()
+    tokens = set(Token.objects.values_list("key", flat=True))
+
+    assert len(items) == 600
+    assert User.objects.count() == Token.objects.count() == 10
+    assert ShoppingList.objects.count() == 30
+    assert ShoppingList.members.through.objects.count() >= 30
+    with pytest.raises(CommandError):
+        call_command("seed_shopping_data", *options, stdout=io.StringIO())
+
+    user = User.objects.filter(shoppinglist__shopping_items__name="milk").first()
+    client = create_authenticated_client(user)
+    response = client.get(reverse("search-shopping-items") + "?search=milk")
+    assert response.data["results"]
+
+    User.objects.all().delete()
+    ShoppingList.objects.all().delete()
+    call_command("seed_shopping_data", *options, stdout=io.StringIO())
+
+    assert seeded_items() == items
+    # Tokens are credentials, so knowing the seed must not give them away.
+    assert not tokens & set(Token.objects.values_list("key", flat=True))
+
+
+@pytest.mark.django_db
+def test_export_streams_everything_the_user_can_access(
+    create_authenticated_client, seed_shopping_data
+):
+    users, shopping_lists = seed_shopping_data(users=3, lists_per_user=2)
+    shopping_lists[0].members.add(users[1])
+    client = create_authenticated_client(users[0])
+
+    response = client.get(reverse("export-shopping-data"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    assert response["Content-Type"] == "application/x-ndjson"
+    records = [
+        json.loads(line) for line in b"".join(response.streaming_content).splitlines()
+    ]
+    own_lists = {str(shopping_list.pk) for shopping_list in shopping_lists[:2]}
+    assert [record["type"] for record in records] == (
+        ["list"] * 2 + ["member"] * 3 + ["item"] * 80
+    )
+    assert {record["id"] for record in records if record["type"] == "list"} == own_lists
+    assert {
+        (record["shopping_list"], record["name"])
+        for record in records
+        if record["type"] == "member"
+    } == {
+        (str(shopping_lists[0].pk), users[0].username),
+        (str(shopping_lists[0].pk), users[1].username),
+        (str(shopping_lists[1].pk), users[0].username),
+    }
+    assert {
+        record["shopping_list"] for record in records if record["type"] == "item"
+    } == own_lists
+
+
+@pytest.mark.django_db
+def test_export_csv_can_be_gzipped(create_authenticated_client, seed_shopping_data):
+    users, shopping_lists = seed_shopping_data(users=2, lists_per_user=1)
+    client = create_authenticated_client(users[0])
+    url = reverse("export-shopping-data")
+
+    response = client.get(url, {"file_format": "csv"})
+    content = b"".join(response.streaming_content)
+    gzipped = client.get(url, {"file_format": "csv", "compression": "gzip"})
+
+    assert gzipped["Content-Type"] == "application/gzip"
+    assert 'filename="shopping-lists.csv.gz"' in gzipped["Content-Disposition"]
+    assert gzip.decompress(b"".join(gzipped.streaming_content)) == content
+    rows = list(csv.DictReader(io.StringIO(content.decode())))
+    assert len(rows) == 1 + 1 + 40
+    assert rows[0]["type"] == "list"
+    assert rows[-1]["shopping_list"] == str(shopping_lists[0].pk)
+
+
+@pytest.mark.django_db
+def test_export_rejects_unknown_formats(create_user, create_authenticated_client):
+    client = create_authenticated_client(create_user())
+
+    response = client.get(reverse("export-shopping-data"), {"file_format": "xml"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def ndjson(*records):
+    return "".join(
+        record if isinstance(record, str) else json.dumps(record) + "\n"
+        for record in records
+    )
+
+
+@pytest.mark.django_db
+def test_import_creates_lists_members_and_items_in_batches(
+    create_user, create_authenticated_client, django_assert_max_num_queries
+):
+    user = create_user()
+    other_user = User.objects.create_user("Other")
+    existing_list = ShoppingList.objects.create(name="Existing")
+    existing_list.members.add(user)
+    client = create_authenticated_client(user)
+    body = ndjson(
+        {"type": "list", "id": "groceries", "name": "Groceries"},
+        {"type": "member", "shopping_list": "groceries", "name": "Other"},
+        {"type": "member", "shopping_list": "groceries", "email": user.email},
+        *(
+            {"type": "item", "shopping_list": "groceries", "name": f"Item {index}"}
+            for index in range(30)
+        ),
+        {"type": "item", "shopping_list": str(existing_list.pk), "name": "Milk"},
+    )
+
+    with mock.patch(
+        "shopping_list.api.importer.ShoppingDataImport.batch_size", 10
+    ), django_assert_max_num_queries(60):
+        response = client.post(
+            reverse("import-shopping-data") + "?members=true",
+            body,
+            content_type="application/x-ndjson",
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["created"] == {"lists": 1, "memberships": 2, "items": 31}
+    assert response.data["errors"] == []
+    assert response.data["rows_per_second"] > 0
+    groceries = ShoppingList.objects.get(name="Groceries")
+    assert set(groceries.members.all()) == {user, other_user}
+    assert groceries.shopping_items.count() == 30
+    assert existing_list.shopping_items.get().name == "Milk"
+    assert ChangeEvent.objects.filter(kind=feed.ITEM_CREATED).count() == 31
+
+
+@pytest.mark.django_db
+def test_import_reports_errors_by_line(create_user, create_authenticated_client):
+    user = create_user()
+    outsiders_list = ShoppingList.objects.create(name="Not mine")
+    client = create_authenticated_client(user)
+    body = ndjson(
+        {"type": "list", "id": "groceries", "name": "Groceries"},
+        "not json\n",
+        {"type": "recipe", "name": "Pancakes"},
+        {"type": "item", "shopping_list": "groceries", "name": "Milk"},
+        {"type": "item", "shopping_list": "groceries", "name": "Milk"},
+        {
+            "type": "item",
+            "shopping_list": "groceries",
+            "name": "Milk",
+            "purchased": True,
+        },
+        {"type": "item", "shopping_list": str(outsiders_list.pk), "name": "Eggs"},
+        {"type": "item", "shopping_list": "groceries"},
+        {"type": "member", "shopping_list": "groceries", "name": "Nobody"},
+        "\n",
+        {"type": "list", "id": "groceries", "name": "Again"},
+    )
+
+    response = client.post(
+        reverse("import-shopping-data") + "?members=true",
+        body,
+        content_type="application/x-ndjson",
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["created"] == {"lists": 1, "memberships": 1, "items": 2}
+    assert [
+        (error["line"], list(error["errors"])) for error in response.data["errors"]
+    ] == [
+        (2, ["non_field_errors"]),
+        (3, ["type"]),
+        (5, ["name"]),
+        (7, ["shopping_list"]),
+        (8, ["name"]),
+        (9, ["name"]),
+        (11, ["id"]),
+    ]
+    assert response.data["error_count"] == 7
+    assert not outsiders_list.shopping_items.exists()
+
+
+@pytest.mark.django_db
+def test_import_adds_members_only_when_asked(create_user, create_authenticated_client):
+    user = create_user()
+    User.objects.create_user("Other", "shared@example.com")
+    User.objects.create_user("Another", "shared@example.com")
+    client = create_authenticated_client(user)
+    body = ndjson(
+        {"type": "list", "id": "groceries", "name": "Groceries"},
+        {"type": "member", "shopping_list": "groceries", "name": "Other"},
+        {"type": "member", "shopping_list": "groceries", "email": "shared@example.com"},
+        {"type": "member", "shopping_list": "groceries"},
+    )
+    url = reverse("import-shopping-data")
+
+    ignored = client.post(url, body, content_type="application/x-ndjson")
+    imported = client.post(
+        url + "?members=true", body, content_type="application/x-ndjson"
+    )
+
+    assert ignored.data["created"] == {"lists": 1, "memberships": 1, "items": 0}
+    assert ignored.data["errors"] == []
+    assert imported.data["created"] == {"lists": 1, "memberships": 2, "items": 0}
+    assert [
+        (error["line"], list(error["errors"])) for error in imported.data["errors"]
+    ] == [(3, ["email"]), (4, ["non_field_errors"])]
+
+
+@pytest.mark.django_db
+def test_export_can_be_imported(create_user, create_authenticated_client):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = ShoppingList.objects.create(name="Groceries")
+    shopping_list.members.add(user)
+    ShoppingItem.objects.create(
+        shopping_list=shopping_list, name="Milk", purchased=False
+    )
+    export = b"".join(client.get(reverse("export-shopping-data")).streaming_content)
+
+    response = client.post(
+        reverse("import-shopping-data"), export, content_type="application/x-ndjson"
+    )
+
+    assert response.data["created"] == {"lists": 1, "memberships": 1, "items": 1}
+    assert response.data["errors"] == []
+    assert ShoppingItem.objects.filter(name="Milk").count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != "sqlite", reason="SQLite pragmas")
+def test_sqlite_connections_are_tuned(settings):
+    settings.SHOPPING_LIST_SQLITE_PRAGMAS = {
+        **settings.SHOPPING_LIST_SQLITE_PRAGMAS,
+        "busy_timeout": 1234,
+        "cache_size": None,
+    }
+
+    def pragma(name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    database.configure_connection(connection)
+
+    assert pragma("busy_timeout") == 1234
+    # NORMAL
+    assert pragma("synchronous") == 1
+    assert pragma("cache_size") == -64 * 1024
+
+
+def test_asgi_application_keeps_no_persistent_database_connections():
+    def conn_max_age(module, **environ):
+        environ = {**os.environ, **environ}
+        environ.pop("DJANGO_SERVER_INTERFACE", None)
+        return subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import {module}; from django.conf import settings; "
+                "print(settings.DATABASES['default']['CONN_MAX_AGE'])",
+            ],
+            env=environ,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    assert conn_max_age("core.asgi", CONN_MAX_AGE="60") == "0"
+    assert conn_max_age("core.asgi", ASGI_CONN_MAX_AGE="5") == "5"
+    assert conn_max_age("core.wsgi", CONN_MAX_AGE="60") == "60"
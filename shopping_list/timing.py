@@ -0,0 +1,81 @@
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("shopping_list_request_timer", default=None)
+
+FINGERPRINT_PATTERNS = [
+    # String and number literals.
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # IN lists differ in length with the number of values.
+    (re.compile(r"\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)"), "IN (...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(sql):
+    """
+    Returns `sql` with its values replaced by placeholders, so queries that only
+    differ in their parameters have the same fingerprint.
+    """
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+
+    return sql.strip()
+
+
+class RequestTimer:
+    """
+    Queries, their cumulative time and the duration of named phases of a request.
+
+    Installed with `connection.execute_wrapper(timer)` it counts every query,
+    and `phase()` adds the time spent in a block to the current request's timer.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = defaultdict(float)
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """
+    Adds the time spent in the block to the `name` phase of the current request.
+    """
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.phases[name] += time.perf_counter() - started
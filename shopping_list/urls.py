@@ -3,10 +3,21 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework import routers
 from rest_framework.authtoken.views import obtain_auth_token
 
+from shopping_list.api.async_views import (
+    AsyncChangeFeed,
+    AsyncListAddShoppingItem,
+    AsyncListAddShoppingList,
+    AsyncSearchShoppingItems,
+    AsyncShoppingItemDetail,
+    AsyncShoppingListDetail,
+)
 from shopping_list.api.views import (
+    ExportShoppingData,
+    ImportShoppingData,
     ListAddShoppingItem,
     ListAddShoppingList,
     SearchShoppingItems,
+    ShoppingItemChanges,
     ShoppingItemDetail,
     ShoppingListAddMembers,
     ShoppingListDetail,
@@ -16,6 +27,9 @@ from shopping_list.api.views import (
 urlpatterns = [
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
     path("api-token-auth/", obtain_auth_token, name="api_token_auth"),
+    path("api/changes/", ShoppingItemChanges.as_view(), name="shopping-item-changes"),
+    path("api/export/", ExportShoppingData.as_view(), name="export-shopping-data"),
+    path("api/import/", ImportShoppingData.as_view(), name="import-shopping-data"),
     path(
         "api/search-shopping-items/",
         SearchShoppingItems.as_view(),
@@ -49,6 +63,32 @@ urlpatterns = [
         ShoppingItemDetail.as_view(),
         name="shopping-item-detail",
     ),
+    path("api/async/events/", AsyncChangeFeed.as_view(), name="async-change-feed"),
+    path(
+        "api/async/search-shopping-items/",
+        AsyncSearchShoppingItems.as_view(),
+        name="async-search-shopping-items",
+    ),
+    path(
+        "api/async/shopping-lists/",
+        AsyncListAddShoppingList.as_view(),
+        name="async-all-shopping-lists",
+    ),
+    path(
+        "api/async/shopping-lists/<uuid:pk>/",
+        AsyncShoppingListDetail.as_view(),
+        name="async-shopping-list-detail",
+    ),
+    path(
+        "api/async/shopping-lists/<uuid:pk>/shopping-items/",
+        AsyncListAddShoppingItem.as_view(),
+        name="async-list-add-shopping-item",
+    ),
+    path(
+        "api/async/shopping-lists/<uuid:pk>/shopping-items/<uuid:item_pk>/",
+        AsyncShoppingItemDetail.as_view(),
+        name="async-shopping-item-detail",
+    ),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/docs/",